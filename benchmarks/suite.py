@@ -0,0 +1,316 @@
+"""Benchmarks for factor resolution against synthetic tox configs.
+
+The suite generates tox configs of increasing size, then times the factor
+resolution functions and the `tox_configure` hook against them. Results may be
+saved to a baseline file, and compared against a previously saved baseline.
+
+The `startup` benchmark instead times a plain tox call (i.e., `tox -e foo`, for
+an env without commands) in a fresh interpreter, with and without the plugin
+loaded. It also fails if the plain call imports more of the plugin than needed
+to add its options.
+
+Run the suite from the repository root with:
+
+    $ python -m benchmarks --save baseline.json
+    $ python -m benchmarks --compare baseline.json
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+from collections import OrderedDict
+from timeit import default_timer
+
+import tox
+from py.iniconfig import IniConfig
+from tox.config import _split_env as split_env
+
+from tox_factor import factor
+from tox_factor.factor import get_declared_envs, get_tox_section, iter_envlist, match_envs
+from tox_factor.hooks import tox_addoption, tox_configure
+
+
+def axis(prefix, size):
+    return '{prefix}{{{values}}}'.format(
+        prefix=prefix, values=','.join(str(i) for i in range(size)))
+
+
+# Each scenario is a tox config, along with the factors to resolve against it.
+SCENARIOS = OrderedDict([
+    ('envlist-10', (
+        '[tox]\nenvlist = {py}-{django}\n'.format(
+            py=axis('py', 2), django=axis('django', 5)),
+        ['py1'],
+    )),
+    ('envlist-1k', (
+        '[tox]\nenvlist = {py}-{django}-{cache}\n'.format(
+            py=axis('py', 10), django=axis('django', 10), cache=axis('cache', 10)),
+        ['py1', 'django2-cache3'],
+    )),
+    ('envlist-100k', (
+        '[tox]\nenvlist = {py}-{django}-{cache}\n'.format(
+            py=axis('py', 100), django=axis('django', 100), cache=axis('cache', 10)),
+        ['py1', 'django2-cache3'],
+    )),
+    ('sections-1k', (
+        '[tox]\nenvlist = {py}-{django}\n{sections}'.format(
+            py=axis('py', 10), django=axis('django', 10),
+            sections=''.join('[testenv:lint{i}]\n'.format(i=i) for i in range(1000))),
+        ['py1', 'lint500'],
+    )),
+    ('brace-groups-8x4', (
+        '[tox]\nenvlist = {groups}\n'.format(
+            groups='-'.join(axis('f{i}_'.format(i=i), 4) for i in range(8))),
+        ['f0_1-f7_3'],
+    )),
+])
+
+# The name of the startup benchmark, which may be run along with the scenarios.
+STARTUP = 'startup'
+
+# The plugin's modules that are imported by a plain tox call, i.e., the modules
+# needed to add the plugin's options.
+STARTUP_MODULES = [
+    'tox_factor.compat', 'tox_factor.history', 'tox_factor.hooks',
+    'tox_factor.shard', 'tox_factor.timing',
+]
+
+# The config of the startup benchmark, with an env that runs without commands.
+STARTUP_INI = """
+[tox]
+skipsdist = true
+envlist = py{36,37}
+
+[testenv:foo]
+skip_install = true
+"""
+
+# Runs `tox -e foo` in a fresh interpreter, then prints the plugin's imported
+# modules. The plugin is blocked from loading when the first argument is 'without'.
+STARTUP_SCRIPT = """
+import sys
+
+import pluggy
+
+if sys.argv[1] == 'without':
+    load_setuptools_entrypoints = pluggy.PluginManager.load_setuptools_entrypoints
+
+    def load_without_plugin(self, *args, **kwargs):
+        self.set_blocked('factor')
+        return load_setuptools_entrypoints(self, *args, **kwargs)
+
+    pluggy.PluginManager.load_setuptools_entrypoints = load_without_plugin
+
+from tox.session import main
+
+try:
+    main(['-c', sys.argv[2], '-e', 'foo'])
+except SystemExit as exception:
+    if exception.code:
+        raise
+
+print(' '.join(sorted(name for name in sys.modules if name.startswith('tox_factor.'))))
+"""
+
+
+def timeit(func, repeat):
+    """Time the best of several calls to a function.
+
+    Args:
+        func: The function to call.
+        repeat: The number of calls.
+
+    Returns:
+        The shortest call duration, in seconds.
+    """
+    durations = []
+    for _ in range(repeat):
+        start = default_timer()
+        func()
+        durations.append(default_timer() - start)
+
+    return min(durations)
+
+
+def make_config(ini, factors, toxworkdir):
+    # A minimal stand-in for the tox config, as parsing the full tox config
+    # would mostly benchmark tox itself. The plugin's options are defaulted.
+    parser = argparse.ArgumentParser()
+    tox_addoption(parser)
+    option = parser.parse_args([])
+    option.env = None
+    option.factor = list(factors)
+
+    return argparse.Namespace(option=option, _cfg=ini, toxworkdir=toxworkdir)
+
+
+def run_scenario(temp_dir, ini_contents, factors, repeat):
+    ini_path = os.path.join(temp_dir, 'tox.ini')
+    toxworkdir = os.path.join(temp_dir, '.tox')
+
+    with open(ini_path, 'w') as ini_file:
+        ini_file.write(ini_contents)
+
+    ini = IniConfig(ini_path)
+    envlist = get_tox_section(ini).get('envlist', '')
+    declared_envs = get_declared_envs(ini)
+
+    def expand_envlist():
+        # Time the expansion itself, rather than the memoized result.
+        factor.expanded_envlists.clear()
+        list(factor.expand_envlist(envlist))
+
+    def configure():
+        tox_configure(make_config(ini, factors, toxworkdir))
+
+    def get_envlist_cold():
+        # The cached index, as shared by the queries of `-f` and `--factor-changed`.
+        shutil.rmtree(toxworkdir, ignore_errors=True)
+        factor.get_envlist(ini, factors, cache_dir=toxworkdir)
+
+    def get_envlist_warm():
+        factor.get_envlist(ini, factors, cache_dir=toxworkdir)
+
+    return OrderedDict([
+        ('split_env[tox]', timeit(lambda: split_env(envlist), repeat)),
+        ('expand_envlist', timeit(expand_envlist, repeat)),
+        ('get_declared_envs', timeit(lambda: get_declared_envs(ini), repeat)),
+        ('match_envs', timeit(lambda: match_envs(declared_envs, factors), repeat)),
+        ('iter_envlist', timeit(lambda: list(iter_envlist(ini, factors)), repeat)),
+        ('tox_configure', timeit(configure, repeat)),
+        ('get_envlist[cold cache]', timeit(get_envlist_cold, repeat)),
+        ('get_envlist[warm cache]', timeit(get_envlist_warm, repeat)),
+    ])
+
+
+def run_startup(temp_dir, repeat):
+    ini_path = os.path.join(temp_dir, 'tox.ini')
+
+    with open(ini_path, 'w') as ini_file:
+        ini_file.write(STARTUP_INI)
+
+    def startup(plugin):
+        return lambda: subprocess.check_output(
+            [sys.executable, '-c', STARTUP_SCRIPT, plugin, ini_path], cwd=temp_dir)
+
+    # The first call creates the env, which is then reused by the timed calls.
+    output = startup('with')().decode('utf-8')
+    modules = output.splitlines()[-1].split()
+    if modules != STARTUP_MODULES:
+        raise RuntimeError('tox -e foo imported the plugin modules: {modules}'.format(
+            modules=', '.join(modules)))
+
+    return OrderedDict([
+        ('tox -e foo[without plugin]', timeit(startup('without'), repeat)),
+        ('tox -e foo[with plugin]', timeit(startup('with'), repeat)),
+    ])
+
+
+def run(scenarios, repeat):
+    """Run the benchmark scenarios.
+
+    Args:
+        scenarios: The names of the scenarios to run.
+        repeat: The number of times to repeat each benchmark.
+
+    Returns:
+        The mapping of benchmark names to their durations, in seconds.
+    """
+    results = OrderedDict()
+
+    for name in scenarios:
+        temp_dir = tempfile.mkdtemp()
+
+        try:
+            if name == STARTUP:
+                timings = run_startup(temp_dir, repeat)
+            else:
+                ini_contents, factors = SCENARIOS[name]
+                timings = run_scenario(temp_dir, ini_contents, factors, repeat)
+        finally:
+            shutil.rmtree(temp_dir)
+
+        for bench, duration in timings.items():
+            results['{name}/{bench}'.format(name=name, bench=bench)] = duration
+
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Compare the results against a baseline.
+
+    Args:
+        results: The mapping of benchmark names to durations.
+        baseline: The baseline mapping of benchmark names to durations.
+        threshold: The ratio above which a benchmark is considered a regression.
+
+    Returns:
+        The list of report lines, and the list of regressed benchmark names.
+    """
+    width = max(len(name) for name in results)
+    lines, regressions = [], []
+
+    for name, duration in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            ratio = ''
+        else:
+            ratio = '{ratio:.2f}x'.format(ratio=duration / previous)
+            if duration / previous > threshold:
+                regressions.append(name)
+                ratio += ' (regression)'
+
+        lines.append('{name:<{width}}  {duration:>10.3f}ms  {ratio}'.format(
+            name=name, width=width, duration=duration * 1000, ratio=ratio,
+        ).rstrip())
+
+    return lines, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks')
+    parser.add_argument(
+        'scenarios', nargs='*', metavar='SCENARIO',
+        help='the scenarios to run (default: all). One of: {names}.'.format(
+            names=', '.join(list(SCENARIOS) + [STARTUP])))
+    parser.add_argument(
+        '--repeat', type=int, default=5,
+        help='the number of times to repeat each benchmark (default: 5).')
+    parser.add_argument(
+        '--save', metavar='PATH',
+        help='save the results to a baseline file.')
+    parser.add_argument(
+        '--compare', metavar='PATH',
+        help='compare the results against a baseline file.')
+    parser.add_argument(
+        '--threshold', type=float, default=1.25,
+        help='the slowdown ratio that fails the comparison (default: 1.25).')
+    args = parser.parse_args(argv)
+
+    for name in args.scenarios:
+        if name not in SCENARIOS and name != STARTUP:
+            parser.error('unknown scenario: {name}'.format(name=name))
+
+    results = run(args.scenarios or list(SCENARIOS) + [STARTUP], args.repeat)
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)['results']
+
+    lines, regressions = compare(results, baseline, args.threshold)
+    print('\n'.join(lines))
+
+    if args.save:
+        with open(args.save, 'w') as baseline_file:
+            json.dump({
+                'python': platform.python_version(),
+                'tox': tox.__version__,
+                'results': results,
+            }, baseline_file, indent=2)
+
+    return 1 if regressions else 0
@@ -0,0 +1,179 @@
+import hashlib
+import json
+import os
+import tempfile
+
+import tox
+
+from .compat import makedirs, replace
+from .factor import get_env_declarations
+from .incremental import IncrementalIndex, Segment, join_segments
+
+# Bump when the layout of the cache file changes.
+CACHE_VERSION = 4
+
+
+def get_cache_dir(config):
+    """Get the directory that holds the plugin's cache files.
+
+    Args:
+        config: The tox config passed to the `tox_configure` hook.
+
+    Returns:
+        The cache directory path, located inside the tox work dir.
+    """
+    return os.path.join(str(config.toxworkdir), '.tox-factor')
+
+
+def get_cache_path(cache_dir, ini_path):
+    """Get the cache file path for the given tox config file.
+
+    Multiple tox configs may share the same work dir, so each config file gets
+    its own cache file, named after its absolute path.
+
+    Args:
+        cache_dir: The plugin's cache directory.
+        ini_path: The path of the tox config file.
+
+    Returns:
+        The path of the cache file.
+    """
+    ini_path = os.path.abspath(ini_path)
+    name = hashlib.sha1(ini_path.encode('utf-8')).hexdigest()[:16]
+
+    return os.path.join(cache_dir, 'declared-envs-{name}.json'.format(name=name))
+
+
+def get_config_digest(ini):
+    """Get the digest that a cache entry must match to be considered valid.
+
+    The digest covers the parts of the config that declare envs (see
+    `get_env_declarations`), along with the tox and cache versions. Edits to the
+    rest of the config keep the cache valid.
+
+    Args:
+        ini: The parsed tox ini config object.
+
+    Returns:
+        The hex digest string.
+    """
+    digest = hashlib.sha1()
+    digest.update('{version}:{tox}:'.format(
+        version=CACHE_VERSION, tox=tox.__version__,
+    ).encode('utf-8'))
+    digest.update(json.dumps(get_env_declarations(ini)).encode('utf-8'))
+
+    return digest.hexdigest()
+
+
+def load_declared_envs(ini, cache_dir):
+    """Get the factor index of the declared envs, using the cache when valid.
+
+    The cache stores the env names of each envlist entry (and of the sections)
+    along with their factor postings, so that a cache hit skips both envlist
+    expansion and indexing. On a cache miss, the cached segments are reused by
+    an `IncrementalIndex`, so that only the envlist entries that have changed
+    are expanded, and the updated segments are written to the cache. Errors
+    reading or writing the cache are not fatal, and simply fall back to
+    computing the index.
+
+    Args:
+        ini: The parsed tox ini config object.
+        cache_dir: The plugin's cache directory.
+
+    Returns:
+        The `FactorIndex` of the declared envs.
+    """
+    digest = get_config_digest(ini)
+    cache_path = get_cache_path(cache_dir, ini.path)
+    cached = read_cache(cache_path)
+
+    if cached is not None and cached.get('digest') == digest:
+        segments = [
+            load_segment(cached['segments'][entry]) for entry in cached['entries']
+        ]
+        segments.append(load_segment(cached['sections']))
+
+        return join_segments(segments, cached['defaults'])
+
+    segments = None
+    if cached is not None and cached.get('version') == CACHE_VERSION:
+        segments = dict(
+            (entry, load_segment(data)) for entry, data in cached['segments'].items()
+        )
+
+    incremental = IncrementalIndex(segments)
+    index = incremental.update(ini)
+    entries, _ = incremental.declarations
+
+    write_cache(cache_path, {
+        'version': CACHE_VERSION,
+        'path': os.path.abspath(ini.path),
+        'digest': digest,
+        'entries': list(entries),
+        'segments': dict(
+            (entry, dump_segment(segment))
+            for entry, segment in incremental.segments.items()
+        ),
+        'sections': dump_segment(incremental.sections),
+        'defaults': index.defaults,
+    })
+
+    return index
+
+
+def load_segment(data):
+    env_names, postings = data
+
+    return Segment(env_names, postings)
+
+
+def dump_segment(segment):
+    return [segment.env_names, segment.postings]
+
+
+def read_cache(cache_path):
+    """Read a cache file.
+
+    Args:
+        cache_path: The path of the cache file.
+
+    Returns:
+        The cached data, or `None` if the file is missing or invalid.
+    """
+    try:
+        with open(cache_path) as cache_file:
+            data = json.load(cache_file)
+    except (EnvironmentError, ValueError):
+        return None
+
+    if not isinstance(data, dict):
+        return None
+
+    return data
+
+
+def write_cache(cache_path, data):
+    """Atomically write a cache file, ignoring any errors.
+
+    Args:
+        cache_path: The path of the cache file.
+        data: The JSON-serializable data to cache.
+    """
+    cache_dir = os.path.dirname(cache_path)
+
+    try:
+        makedirs(cache_dir)
+
+        fd, temp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+    except EnvironmentError:
+        return
+
+    try:
+        # `json.dumps` uses the C encoder, which `json.dump` does not.
+        with os.fdopen(fd, 'w') as temp_file:
+            temp_file.write(json.dumps(data))
+
+        replace(temp_path, cache_path)
+    except EnvironmentError:
+        os.remove(temp_path)
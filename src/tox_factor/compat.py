@@ -1,6 +1,38 @@
+import errno
+import os
+
+try:
+    from sys import intern
+except ImportError:  # pragma: no cover
+    from __builtin__ import intern as intern_str
+
+    def intern(string):
+        # Python 2 can't intern `unicode` strings (e.g., those loaded from JSON),
+        # which are returned as-is.
+        return intern_str(string) if isinstance(string, str) else string
+
+try:
+    from itertools import imap
+except ImportError:  # pragma: no cover
+    imap = map
+
 try:
     from tox.config.parallel import ENV_VAR_KEY_PUBLIC as TOX_PARALLEL_ENV
 except ImportError:  # pragma: no cover
     from tox.config.parallel import ENV_VAR_KEY as TOX_PARALLEL_ENV
 
-__all__ = ['TOX_PARALLEL_ENV']
+# Python 2 does not provide an atomic, overwriting rename.
+replace = getattr(os, 'replace', os.rename)
+
+
+def makedirs(path):
+    # Python 2 does not support `exist_ok`. The directory may also be created
+    # concurrently, e.g., by the envs of a parallel run.
+    try:
+        os.makedirs(path)
+    except OSError as exception:
+        if exception.errno != errno.EEXIST or not os.path.isdir(path):
+            raise
+
+
+__all__ = ['TOX_PARALLEL_ENV', 'imap', 'intern', 'makedirs', 'replace']
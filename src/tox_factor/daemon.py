@@ -0,0 +1,344 @@
+import argparse
+import errno
+import hashlib
+import json
+import os
+import signal
+import socket
+import sys
+import threading
+
+try:
+    import socketserver
+except ImportError:  # pragma: no cover
+    import SocketServer as socketserver
+
+UNIX_SOCKETS_AVAILABLE = hasattr(socket, 'AF_UNIX')
+
+# The socket file, which is located in the tox work dir by default. The name
+# is formatted with the hash of the config path. See `get_socket_path`.
+SOCKET_NAME = 'resolver-{name}.sock'
+
+# The number of seconds that the client waits on the resolver.
+CLIENT_TIMEOUT = 5.0
+
+
+def get_socket_path(ini_path):
+    """Get the default resolver socket path for the given tox config file.
+
+    Multiple tox configs may share the same work dir (e.g., `tox.ini` and
+    `setup.cfg`), so each config file gets its own socket, named after its
+    absolute path. See `tox_factor.cache.get_cache_path`.
+
+    Args:
+        ini_path: The path of the tox config file.
+
+    Returns:
+        The socket path, located in the default tox work dir of the config.
+    """
+    ini_path = os.path.abspath(ini_path)
+    name = hashlib.sha1(ini_path.encode('utf-8')).hexdigest()[:16]
+
+    return os.path.join(
+        os.path.dirname(ini_path), '.tox', '.tox-factor', SOCKET_NAME.format(name=name))
+
+
+def get_signature(ini_path):
+    """Get the stat signature of the tox config file, which changes on edits.
+
+    Args:
+        ini_path: The path of the tox config file.
+
+    Returns:
+        A tuple of the file's modification time, size, and inode.
+    """
+    stat = os.stat(ini_path)
+
+    return stat.st_mtime, stat.st_size, stat.st_ino
+
+
+class Resolver(object):
+    """Resolves factor queries against the declared envs of a tox config.
+
+    The config is parsed and indexed once, and the index is kept in memory. The
+    config file is checked before each query, and is reloaded if it changed
+    since it was loaded, so queries always reflect the current config. Reloads
+    only expand the envlist entries that changed. See `IncrementalIndex`.
+    Queries may be made from several threads.
+
+    Args:
+        ini_path: The path of the tox config file.
+
+    Attributes:
+        ini_path: The absolute path of the tox config file.
+        index: The `FactorIndex` of the declared envs, or `None` until loaded.
+    """
+
+    def __init__(self, ini_path):
+        from .incremental import IncrementalIndex
+
+        self.ini_path = os.path.abspath(ini_path)
+        self.index = None
+        self.signature = None
+        self.incremental = IncrementalIndex()
+        self.lock = threading.Lock()
+
+    def load(self):
+        """Load the index of the declared envs, if the config has changed.
+
+        Returns:
+            The `FactorIndex` of the declared envs.
+        """
+        from py.iniconfig import IniConfig
+
+        # The signature is taken before parsing, so that an edit made while
+        # parsing is picked up by the next query.
+        signature = get_signature(self.ini_path)
+        if signature != self.signature:
+            self.index = self.incremental.update(IniConfig(self.ini_path))
+            self.signature = signature
+
+        return self.index
+
+    def match(self, factors):
+        """Get the declared env names that match the factors.
+
+        As with `tox -x`, if only excluded factors are given, they're applied to
+        the default envlist. See `tox_factor.factor.FactorIndex`.
+
+        Args:
+            factors: The list of factor arguments, which may be comma-separated
+                lists of factors. See `tox_factor.hooks.normalize_factors`.
+
+        Returns:
+            The list of matched env names.
+        """
+        from .factor import match_envs
+        from .hooks import normalize_factors
+
+        factors = normalize_factors(factors)
+
+        with self.lock:
+            return match_envs(self.load(), factors)
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    """Answers the JSON line requests of a client connection. See `query`."""
+
+    def handle(self):
+        for line in iter(self.rfile.readline, b''):
+            try:
+                request = json.loads(line.decode('utf-8'))
+            except ValueError:
+                response = {'error': 'the request is not valid JSON'}
+            else:
+                response = self.server.respond(request)
+            self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+
+class ResolverServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Serves the queries of a `Resolver` over a Unix socket.
+
+    Each connection may send any number of requests, which are JSON objects on
+    separate lines. Each request is answered with a line of JSON. e.g.,
+
+        >>> {"config": "/path/to/tox.ini", "factors": ["py37", "lint"]}
+        {"envs": ["py37-django20", "py37-django21", "lint"]}
+
+    Errors, such as invalid factor patterns, malformed requests, or a request
+    for another config, are answered with an `error` message instead of the `envs`.
+
+    Args:
+        resolver: The `Resolver` to serve.
+        socket_path: The path of the socket to listen on.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, resolver, socket_path):
+        self.resolver = resolver
+        socketserver.UnixStreamServer.__init__(self, socket_path, RequestHandler)
+
+    def respond(self, request):
+        import tox
+
+        if not isinstance(request, dict):
+            return {'error': 'the request is not a JSON object'}
+
+        if request.get('config') != self.resolver.ini_path:
+            return {'error': 'the resolver serves {path}, not {config}'.format(
+                path=self.resolver.ini_path, config=request.get('config'))}
+
+        # JSON strings are loaded as `unicode` on Python 2.
+        factors = request.get('factors')
+        if not isinstance(factors, list) or not all(
+                isinstance(factor, type(u'')) for factor in factors):
+            return {'error': 'the request factors are not a list of strings'}
+
+        try:
+            return {'envs': self.resolver.match(factors)}
+        except (tox.exception.ConfigError, EnvironmentError, ValueError) as exception:
+            return {'error': str(exception)}
+
+
+def serve(ini_path, socket_path=None):
+    """Run a resolver for the tox config, until interrupted.
+
+    The config is loaded before the socket accepts connections, so that the
+    first query is answered from memory. The socket file is removed on exit.
+    A `RuntimeError` is raised if another resolver is listening on the socket.
+
+    Args:
+        ini_path: The path of the tox config file.
+        socket_path: The path of the socket to listen on. This defaults to the
+            socket in the tox work dir. See `get_socket_path`.
+    """
+    resolver = Resolver(ini_path)
+    resolver.load()
+
+    socket_path = socket_path or get_socket_path(ini_path)
+    prepare_socket_path(socket_path)
+
+    server = ResolverServer(resolver, socket_path)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        os.remove(socket_path)
+
+
+def prepare_socket_path(socket_path):
+    from .compat import makedirs
+
+    try:
+        connect(socket_path).close()
+    except EnvironmentError as exception:
+        # A socket file that's left behind by a resolver that didn't exit
+        # cleanly refuses connections, and is replaced.
+        if exception.errno == errno.ECONNREFUSED:
+            os.remove(socket_path)
+    else:
+        raise RuntimeError('A resolver is already listening on {path}.'.format(
+            path=socket_path))
+
+    socket_dir = os.path.dirname(socket_path)
+    makedirs(socket_dir)
+
+
+def connect(socket_path):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(CLIENT_TIMEOUT)
+
+    try:
+        sock.connect(socket_path)
+    except EnvironmentError:
+        sock.close()
+        raise
+
+    return sock
+
+
+def query(socket_path, ini_path, factors):
+    """Query a running resolver for the env names that match the factors.
+
+    Args:
+        socket_path: The path of the resolver's socket.
+        ini_path: The path of the tox config file.
+        factors: The list of factor arguments. See `Resolver.match`.
+
+    Returns:
+        The list of matched env names.
+
+    Raises:
+        EnvironmentError: If the resolver closed the connection without an
+            answer. Errors connecting to the resolver are also raised.
+        ConfigError: If the resolver couldn't answer the query.
+    """
+    request = {'config': os.path.abspath(ini_path), 'factors': list(factors)}
+
+    sock = connect(socket_path)
+    try:
+        sock.sendall(json.dumps(request).encode('utf-8') + b'\n')
+        stream = sock.makefile('rb')
+        line = stream.readline()
+        stream.close()
+    finally:
+        sock.close()
+
+    if not line:
+        raise EnvironmentError(errno.ECONNRESET, 'The resolver closed the connection.')
+
+    response = json.loads(line.decode('utf-8'))
+    if 'error' in response:
+        import tox
+
+        raise tox.exception.ConfigError(response['error'])
+
+    return response['envs']
+
+
+def resolve(ini_path, factors, socket_path=None):
+    """Get the env names that match the factors, from a resolver if one is running.
+
+    The query is answered by the resolver listening on the socket, if there is
+    one. Otherwise, the config is resolved in the current process, so callers
+    don't need to know whether a resolver is running.
+
+        >>> resolve('tox.ini', ['py37,lint'])
+        ['py37-django20', 'py37-django21', 'lint']
+
+    Args:
+        ini_path: The path of the tox config file.
+        factors: The list of factor arguments. See `Resolver.match`.
+        socket_path: The path of the resolver's socket. This defaults to the
+            socket in the tox work dir. See `get_socket_path`.
+
+    Returns:
+        The list of matched env names.
+    """
+    if UNIX_SOCKETS_AVAILABLE:
+        try:
+            return query(socket_path or get_socket_path(ini_path), ini_path, factors)
+        except EnvironmentError:
+            pass
+
+    return Resolver(ini_path).match(factors)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m tox_factor.daemon',
+        description='Resolve the envs of a tox config that match factors.')
+    parser.add_argument(
+        'command', choices=['serve', 'query'],
+        help='serve queries on the socket, or run a query.')
+    parser.add_argument(
+        '-c', dest='config', default='tox.ini',
+        help='the tox config file (default: tox.ini).')
+    parser.add_argument(
+        '-f', '--factor', action='append', default=[],
+        help='the factors to query (as with tox -f).')
+    parser.add_argument(
+        '--socket', help='the socket path (default: in the tox work dir).')
+    args = parser.parse_args(argv)
+
+    if args.command == 'serve':
+        # Stop on SIGTERM as on SIGINT, so that the socket file is removed.
+        signal.signal(signal.SIGTERM, interrupt)
+        try:
+            serve(args.config, args.socket)
+        except KeyboardInterrupt:
+            pass
+        return
+
+    for env_name in resolve(args.config, args.factor, args.socket):
+        sys.stdout.write(env_name + '\n')
+
+
+def interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+if __name__ == '__main__':  # pragma: no cover
+    main()
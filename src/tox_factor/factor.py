@@ -1,22 +1,487 @@
-from tox.config import _split_env as split_env
+import bisect
+import fnmatch
+import itertools
+import re
+from collections import OrderedDict
 
+from .compat import imap, intern
+from .timing import record, timed
 
-def get_envlist(ini, factors):
+# Glob characters, which make a factor a pattern. See `is_pattern`.
+GLOB_CHARACTERS = frozenset('*?[')
+
+# The prefix of excluded factors. See `split_exclusions`.
+EXCLUDE_PREFIX = '!'
+
+# The sources of declared envs.
+ENVLIST = 'envlist'
+SECTION = 'section'
+
+# The tokens of the envlist syntax. See `split_envlist` and `parse_entry`.
+BRACE_PATTERN = re.compile(r'[{}]')
+SEPARATOR_PATTERN = re.compile(r'[{,]')
+RANGE_PATTERN = re.compile(r'(\d+)\.\.(\d+)\Z')
+WHITESPACE_PATTERN = re.compile(r'\s+')
+
+# The memoized expansions of raw envlist strings, in least recently used order,
+# and their maximum number. See `expand_envlist`.
+expanded_envlists = OrderedDict()
+EXPANDED_ENVLISTS_SIZE = 4
+
+# The number of env names that are expanded at once, between yields.
+EXPAND_CHUNK_SIZE = 1024
+
+# The maximum number of factor decompositions to cache. See `decompose`.
+DECOMPOSITION_CACHE_SIZE = 65536
+
+
+def get_envlist(ini, factors, cache_dir=None):
     """Get the list of env names from the tox config that match the factors.
 
     See `match_envs` for more details on env name matching.
 
+    Without a cache dir, the envlist entries are matched as templates, so that
+    only the matching envs are expanded (see `iter_envlist`). With a cache dir,
+    the index of the declared envs is loaded from the cache instead, which is
+    reused by the other queries of the run (e.g., `--factor-changed`).
+
     Args:
         ini: The parsed tox ini config. This should be the `_cfg` attribute of
             the `config` passed to the `tox_configure` hook.
         factors: The list of env factors to match against.
+        cache_dir: The optional directory used to cache the declared envs
+            across runs. See `tox_factor.cache` for more details.
 
     Returns:
         The list of env names from the tox config that match the given factors.
     """
-    declared_envs = get_declared_envs(ini)
+    if cache_dir is None:
+        with timed('match_envs'):
+            return list(iter_envlist(ini, factors))
+
+    index = load_index(ini, cache_dir)
+
+    with timed('match_envs'):
+        return match_envs(index, factors)
+
+
+def get_envlists(ini, queries, cache_dir=None):
+    """Get the list of env names from the tox config for each of the queries.
+
+    The config is only parsed and indexed once for all of the queries. See
+    `match_many` for more details.
+
+        >>> get_envlists(ini, [['py36'], ['py37'], ['lint', 'isort']])
+        [['py36-django20', ...], ['py37-django20', ...], ['lint', 'isort']]
+
+    Args:
+        ini: The parsed tox ini config. See `get_envlist`.
+        queries: The list of queries, each a list of env factors.
+        cache_dir: The optional cache directory. See `get_envlist`.
+
+    Returns:
+        The list of matched env names for each query, in query order.
+    """
+    index = load_index(ini, cache_dir)
+
+    with timed('match_envs'):
+        return match_many(index, queries)
+
+
+def load_index(ini, cache_dir=None):
+    """Load the `FactorIndex` of the envs declared by the tox config.
+
+    Args:
+        ini: The parsed tox ini config. See `get_envlist`.
+        cache_dir: The optional cache directory. See `get_envlist`.
+
+    Returns:
+        The `FactorIndex` of the declared envs.
+    """
+    with timed('load_declared_envs'):
+        if cache_dir is not None:
+            from .cache import load_declared_envs
+            index = load_declared_envs(ini, cache_dir)
+        else:
+            index = collect_declared_envs(ini).index()
+
+    record('declared_envs', len(index))
+
+    return index
+
+
+def iter_envlist(ini, factors):
+    """Lazily generate the env names from the tox config that match the factors.
+
+    This is equivalent to matching the index of the declared envs, except that
+    generative envlist entries are matched as `EnvTemplate`s, without expanding
+    their full product. The envs declared by sections are indexed as usual.
+
+    Args:
+        ini: The parsed tox ini config object.
+        factors: The list of env factors to match against.
+
+    Yields:
+        The matching env names, in declaration order.
+    """
+    templates = get_envlist_templates(ini)
+    record('envlist_templates', len(templates))
+
+    for template in templates:
+        for env_name in template.match(factors):
+            yield env_name
+
+    # Only exclusions, which are applied to the default envlist. See `FactorIndex`.
+    includes, excludes = split_exclusions(factors)
+    if templates and excludes and not includes:
+        return
+
+    section_envs = [
+        env_name for env_name in get_section_envs(ini)
+        if not any(env_name in template for template in templates)
+    ]
+
+    for env_name in FactorIndex(section_envs).match(factors):
+        yield env_name
+
+
+def get_envlist_templates(ini):
+    """Get the unexpanded entries of the tox config's envlist.
+
+    Args:
+        ini: The parsed tox ini config object.
+
+    Returns:
+        The list of `EnvTemplate`s, in envlist order.
+    """
+    envlist = get_tox_section(ini).get('envlist', '')
+
+    return [EnvTemplate(entry) for entry in split_envlist(envlist)]
+
+
+def get_tox_section_name(ini):
+    """Get the name of the main tox section of the tox config.
+
+    Args:
+        ini: The parsed tox ini config object.
+
+    Returns:
+        The tox section name, which is 'tox:tox' for setup.cfg files.
+    """
+    return 'tox:tox' if ini.path.endswith('setup.cfg') else 'tox'
+
+
+def get_tox_section(ini):
+    """Get the main tox section of the tox config.
+
+    Args:
+        ini: The parsed tox ini config object.
+
+    Returns:
+        The tox section, or an empty dict if it's not present.
+    """
+    return ini.sections.get(get_tox_section_name(ini), {})
+
+
+def get_section_envs(ini):
+    """Get the env names declared by `testenv:` sections, in config order.
+
+    Args:
+        ini: The parsed tox ini config object.
+
+    Returns:
+        The list of section env names.
+    """
+    return [
+        section[8:] for section in sorted(ini.sections, key=ini.lineof)
+        if section.startswith('testenv:')
+    ]
+
+
+def get_env_declarations(ini):
+    """Get the parts of the tox config that declare envs.
+
+    The declared envs only depend on the envlist entries and the names of the
+    `testenv:` sections, so other changes to the config (e.g., editing the
+    commands of a section) don't change the declared envs.
+
+    Args:
+        ini: The parsed tox ini config object.
+
+    Returns:
+        A tuple of the unexpanded envlist entries, and the section env names,
+        both in config order.
+    """
+    envlist = get_tox_section(ini).get('envlist', [])
+
+    return tuple(split_envlist(envlist)), tuple(get_section_envs(ini))
+
+
+def expand_envlist(envlist, extended=False):
+    """Lazily expand the envlist into its env names.
+
+    This is a native implementation of `tox.config._split_env`, and produces the
+    same env names as tox for any envlist.
+
+    With `extended`, brace groups may also be nested, and may be numeric ranges.
+    e.g.,
+
+        >>> list(expand_envlist('py{27,3{6,7}}-django{1..2}', extended=True))
+        ['py27-django1', 'py27-django2', 'py36-django1', ...]
+
+    tox 3 itself doesn't support these extensions, and expands the same envlist
+    differently (e.g., `a{1..3}` is the env `a1..3`). The plugin resolves the
+    envs that tox runs, so the extensions are never used to resolve factors.
+
+    The expansion of a raw envlist string is memoized once it's complete, so
+    the envlist is only parsed once per run. Only the most recently expanded
+    envlists are kept (see `EXPANDED_ENVLISTS_SIZE`), as long-lived processes
+    (e.g., the resolver) may expand many different envlists.
+
+    Args:
+        envlist: The raw envlist string, or a list of envlist strings.
+        extended: Whether to expand nested brace groups and numeric ranges.
+
+    Yields:
+        The env names, in envlist order.
+    """
+    key = (envlist, extended)
+    memoize = not isinstance(envlist, list)
+
+    # Reinserting the expansion marks it as the most recently used.
+    memoized = expanded_envlists.pop(key, None) if memoize else None
+    if memoized is not None:
+        expanded_envlists[key] = memoized
+        for env_name in memoized:
+            yield env_name
+        return
+
+    env_names = []
+    for entry in split_envlist(envlist, extended):
+        variants = expand_entry(entry, extended)
+
+        # Expanding in chunks keeps the generator lazy, without paying for a
+        # generator step per env name while expanding.
+        chunk = list(itertools.islice(variants, EXPAND_CHUNK_SIZE))
+        while chunk:
+            env_names.extend(chunk)
+            for env_name in chunk:
+                yield env_name
+            chunk = list(itertools.islice(variants, EXPAND_CHUNK_SIZE))
+
+    if memoize:
+        if len(expanded_envlists) >= EXPANDED_ENVLISTS_SIZE:
+            expanded_envlists.popitem(last=False)
+        expanded_envlists[key] = tuple(env_names)
+
+
+def split_envlist(envlist, extended=False):
+    """Lazily split the envlist into its unexpanded entries.
+
+    Comments are stripped, lines are joined, then the envlist is split on the
+    commas outside of brace groups. This is a single pass over the envlist.
+
+        >>> list(split_envlist('py{36,37}-django20, lint  # comment'))
+        ['py{36,37}-django20', 'lint']
+
+    Args:
+        envlist: The raw envlist string, or a list of envlist strings. As with
+            tox, comments are not stripped from the strings of a list.
+        extended: Whether brace groups may be nested. See `expand_envlist`.
+
+    Yields:
+        The envlist entries, in envlist order.
+    """
+    if envlist is None:
+        return
+
+    if not isinstance(envlist, list):
+        lines = [line.split('#', 1)[0].strip() for line in envlist.split('\n')]
+        envlist = [','.join(line for line in lines if line)]
+
+    for text in envlist:
+        groups = find_brace_groups(text, extended)
+
+        for start, stop in split_alternatives(text, groups, 0, len(text)):
+            if start < stop:
+                yield text[start:stop].strip()
+
+
+def expand_entry(entry, extended=False):
+    """Lazily expand an envlist entry into its env names.
+
+    Args:
+        entry: The envlist entry. See `split_envlist`.
+        extended: Whether to expand nested brace groups and numeric ranges.
+            See `expand_envlist`.
+
+    Returns:
+        The iterator of env names, in envlist order.
+    """
+    return imap(''.join, itertools.product(*parse_entry(entry, extended)))
+
+
+def parse_entry(entry, extended=False):
+    """Parse an envlist entry into the parts that are combined into env names.
+
+    Parts alternate between literals and brace groups, each as a list of their
+    alternatives. Whitespace is removed. With `extended`, nested groups and
+    numeric ranges are expanded into their alternatives. e.g.,
+
+        >>> parse_entry('py{27,3{6,7}}-django{1..2}', extended=True)
+        [['py'], ['27', '36', '37'], ['-django'], ['1', '2'], ['']]
+
+    Args:
+        entry: The envlist entry.
+        extended: Whether to expand nested brace groups and numeric ranges.
+            See `expand_envlist`.
+
+    Returns:
+        The list of parts, each a list of alternatives.
+    """
+    groups = find_brace_groups(entry, extended)
+
+    return parse_parts(entry, groups, 0, len(entry), extended)
+
+
+def find_brace_groups(text, extended=False):
+    """Find the brace groups of an envlist string.
+
+    As with tox, a group runs from an opening brace to the next closing brace,
+    and empty braces are not a group. Any opening braces within the group are
+    part of its content.
+
+    With `extended`, each opening brace is instead paired with its matching
+    closing brace, so that groups may be nested. An opening brace without a
+    match is paired with the next closing brace.
+
+    Args:
+        text: The envlist string.
+        extended: Whether brace groups may be nested.
+
+    Returns:
+        The mapping of opening brace positions to closing brace positions.
+    """
+    if not extended:
+        return find_tox_brace_groups(text)
+
+    groups, opened, closed = {}, [], []
+
+    for match in BRACE_PATTERN.finditer(text):
+        position = match.start()
+        if text[position] == '{':
+            opened.append(position)
+        else:
+            closed.append(position)
+            if opened:
+                groups[opened.pop()] = position
+
+    for position in opened:
+        index = bisect.bisect(closed, position)
+        if index < len(closed):
+            groups[position] = closed[index]
+
+    return dict(
+        (start, stop) for start, stop in groups.items() if stop > start + 1
+    )
+
+
+def find_tox_brace_groups(text):
+    groups = {}
+
+    position = text.find('{')
+    while position != -1:
+        end = text.find('}', position + 1)
+        if end == -1:
+            break
+
+        if end > position + 1:
+            groups[position] = end
+            position = text.find('{', end + 1)
+        else:
+            position = text.find('{', position + 1)
 
-    return match_envs(declared_envs, factors)
+    return groups
+
+
+def split_alternatives(text, groups, start, stop):
+    position = start
+    while True:
+        match = SEPARATOR_PATTERN.search(text, position, stop)
+        if match is None:
+            yield start, stop
+            return
+
+        position = match.start()
+        if text[position] == '{':
+            end = groups.get(position, stop)
+            position = end + 1 if end < stop else position + 1
+        else:
+            yield start, position
+            start = position = position + 1
+
+
+def parse_parts(text, groups, start, stop, extended):
+    parts = []
+
+    literal = start
+    position = text.find('{', start, stop)
+    while position != -1:
+        end = groups.get(position, stop)
+        if end < stop:
+            parts.append([WHITESPACE_PATTERN.sub('', text[literal:position])])
+            parts.append(parse_alternatives(text, groups, position + 1, end, extended))
+            literal = end + 1
+            position = text.find('{', literal, stop)
+        else:
+            position = text.find('{', position + 1, stop)
+
+    parts.append([WHITESPACE_PATTERN.sub('', text[literal:stop])])
+
+    return parts
+
+
+def parse_alternatives(text, groups, start, stop, extended):
+    content = text[start:stop]
+
+    if not extended or '{' not in content:
+        content = WHITESPACE_PATTERN.sub('', content)
+        match = RANGE_PATTERN.match(content) if extended else None
+        if match is not None:
+            return expand_range(*match.groups())
+        return content.split(',')
+
+    return [
+        ''.join(variant)
+        for alternative in split_alternatives(text, groups, start, stop)
+        for variant in itertools.product(
+            *parse_parts(text, groups, alternative[0], alternative[1], extended))
+    ]
+
+
+def expand_range(first, last):
+    """Expand a numeric range, including both of its ends.
+
+    As with shell brace expansion, a range may count down, and numbers are
+    zero-padded to the same width if either end has a leading zero.
+
+        >>> expand_range('08', '10')
+        ['08', '09', '10']
+
+    Args:
+        first: The first number of the range.
+        last: The last number of the range.
+
+    Returns:
+        The list of numbers in the range, as strings.
+    """
+    step = 1 if int(first) <= int(last) else -1
+    numbers = range(int(first), int(last) + step, step)
+
+    padded = any(len(end) > 1 and end.startswith('0') for end in (first, last))
+    width = max(len(first), len(last)) if padded else 0
+
+    return [str(number).zfill(width) for number in numbers]
 
 
 def get_declared_envs(ini):
@@ -34,23 +499,54 @@ def get_declared_envs(ini):
     Returns:
         The list of env names defined in the tox config.
     """
-    tox_section_name = 'tox:tox' if ini.path.endswith('setup.cfg') else 'tox'
-    tox_section = ini.sections.get(tox_section_name, {})
-    envlist = split_env(tox_section.get('envlist', []))
+    with timed('get_declared_envs'):
+        with timed('expand_envlist'):
+            envlist = list(expand_envlist(get_tox_section(ini).get('envlist', [])))
 
-    # Add additional envs that are declared as sections in the ini
-    section_envs = [
-        section[8:] for section in sorted(ini.sections, key=ini.lineof)
-        if section.startswith('testenv:')
-    ]
+        # Add additional envs that are declared as sections in the ini
+        declared = set(envlist)
+        section_envs = get_section_envs(ini)
+
+        return envlist + [env for env in section_envs if env not in declared]
+
+
+def collect_declared_envs(ini):
+    """Get the registry of declared envs from the tox ini.
 
-    return envlist + [env for env in section_envs if env not in envlist]
+    See `get_declared_envs` for details on which envs are declared, and their
+    order. Each `DeclaredEnv` also records its factors and where it's declared.
+
+    Args:
+        ini: The parsed tox ini config object.
+
+    Returns:
+        The `DeclaredEnvs` registry.
+    """
+    with timed('get_declared_envs'):
+        tox_section_name = get_tox_section_name(ini)
+        with timed('expand_envlist'):
+            envlist = expand_envlist(get_tox_section(ini).get('envlist', []))
+
+        lineno = ini.lineof(tox_section_name, 'envlist')
+        declared_envs = DeclaredEnvs(
+            DeclaredEnv(env_name, ENVLIST, lineno) for env_name in envlist)
+
+        # Add additional envs that are declared as sections in the ini
+        for section in sorted(ini.sections, key=ini.lineof):
+            env_name = section[8:]
+            if section.startswith('testenv:') and env_name not in declared_envs:
+                declared_envs.add(DeclaredEnv(env_name, SECTION, ini.lineof(section)))
+
+        return declared_envs
 
 
 def match_envs(env_names, factors):
     """Determine the subset of env names that match any of the given factors.
 
-    See `env_matches` for more detail on env name matching behavior.
+    See `env_matches` for more detail on env name matching behavior. The env
+    names may also be provided as a `DeclaredEnvs` registry, or a prebuilt
+    `FactorIndex`, which avoids the cost of indexing the names when matching
+    repeatedly.
 
         >>> envlist = [
         >>>     'py36-django20', 'py36-django21',
@@ -59,17 +555,53 @@ def match_envs(env_names, factors):
         >>> match_envs(envlist, ['py37', 'django21'])
         ['py36-django21', 'py37-django20', 'py37-django21']
 
+    Factors prefixed with `!` exclude the envs that match them, even if the
+    envs match another factor. If only excluded factors are given, all other
+    envs of the default envlist are matched, which for a list of env names is
+    the whole list. See `split_exclusions` and `FactorIndex` for more details.
+
+        >>> match_envs(envlist, ['py37', '!django21'])
+        ['py37-django20']
+
     Args:
-        env_names: The list of env names to check.
+        env_names: The list of env names (or `DeclaredEnvs`/`FactorIndex`).
         factors: The list of env factors to match against.
 
     Returns:
         The list of matched env names.
     """
-    return [
-        name for name in env_names
-        if any(env_matches(name, factor) for factor in factors)
-    ]
+    return get_index(env_names).match(factors)
+
+
+def match_many(env_names, queries):
+    """Determine the subset of env names that match each of the queries.
+
+    This is equivalent to calling `match_envs` for each query, except that the
+    env names are only indexed once, the patterns of all of the queries are
+    expanded at once, and factors shared between queries are only looked up
+    once.
+
+        >>> match_many(envlist, [['py36'], ['py37'], ['django21', '!py36']])
+        [['py36-django20', 'py36-django21'],
+         ['py37-django20', 'py37-django21'],
+         ['py37-django21']]
+
+    Args:
+        env_names: The list of env names (or `DeclaredEnvs`/`FactorIndex`).
+        queries: The list of queries, each a list of env factors.
+
+    Returns:
+        The list of matched env names for each query, in query order.
+    """
+    return get_index(env_names).match_many(queries)
+
+
+def get_index(env_names):
+    if isinstance(env_names, DeclaredEnvs):
+        return env_names.index()
+    if isinstance(env_names, FactorIndex):
+        return env_names
+    return FactorIndex(env_names)
 
 
 def env_matches(env_name, factor):
@@ -90,6 +622,12 @@ def env_matches(env_name, factor):
         >>> env_matches('py37-django21-redis', 'py37-redis')
         True
 
+    Each of the dash-delimited factors may also be a glob or regex pattern. See
+    `is_pattern` for more details.
+
+        >>> env_matches('py37-django21-redis', 'django2*-redis')
+        True
+
     Args:
         env_name: The tox test env name.
         factor: The env factor to match against.
@@ -97,7 +635,651 @@ def env_matches(env_name, factor):
     Returns:
         Whether the name matches the given factor(s).
     """
-    env_factors = env_name.split('-')
-    factors = factor.split('-')
+    env_factors = decompose(env_name)
+    factors = decompose(factor)
+
+    if not any(is_pattern(f) for f in factors):
+        return factors <= env_factors
+
+    return all(
+        any(compile_pattern(f).match(env_factor) for env_factor in env_factors)
+        if is_pattern(f) else f in env_factors
+        for f in factors
+    )
+
+
+def split_exclusions(factors):
+    """Split the factors into the included and the excluded factors.
+
+    Excluded factors are prefixed with `!`, which is removed. e.g.,
+
+        >>> split_exclusions(['py37', '!django21', '!py36-redis'])
+        (['py37'], ['django21', 'py36-redis'])
+
+    Args:
+        factors: The list of env factors.
+
+    Returns:
+        A tuple of the list of included factors and the list of excluded factors.
+    """
+    includes, excludes = [], []
+    for factor in factors:
+        if factor.startswith(EXCLUDE_PREFIX):
+            excludes.append(factor[len(EXCLUDE_PREFIX):])
+        else:
+            includes.append(factor)
+
+    return includes, excludes
+
+
+class DecompositionCache(object):
+    """A bounded LRU cache of the factor decompositions of names.
+
+    A decomposition is the frozenset of a name's dash-delimited factors, which
+    are interned. Env names and factor expressions are decomposed repeatedly
+    when matching, so caching them avoids splitting the names and allocating
+    new sets in the matching loops.
+
+    Args:
+        maxsize: The maximum number of cached decompositions. The least recently
+            used decomposition is evicted when the cache is full.
+    """
+
+    def __init__(self, maxsize=DECOMPOSITION_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def decompose(self, name):
+        """Get the decomposition of a name, from the cache if possible.
+
+        Args:
+            name: The env name or factor expression.
+
+        Returns:
+            The frozenset of the name's factors.
+        """
+        try:
+            # Reinserting the entry marks it as the most recently used.
+            factors = self.entries.pop(name)
+        except KeyError:
+            self.misses += 1
+            factors = frozenset(map(intern, name.split('-')))
+
+            if len(self.entries) >= self.maxsize:
+                self.entries.popitem(last=False)
+        else:
+            self.hits += 1
+
+        self.entries[name] = factors
+
+        return factors
+
+    def stats(self):
+        """Get the cache statistics.
+
+        Returns:
+            The mapping of `hits`, `misses`, `size`, and `maxsize` to their values.
+        """
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self.entries),
+            'maxsize': self.maxsize,
+        }
+
+    def clear(self):
+        """Clear the cached decompositions and reset the statistics."""
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+# The shared decomposition cache, used by `decompose`.
+decompositions = DecompositionCache()
+
+
+def decompose(name):
+    """Get the frozenset of a name's factors, using the shared LRU cache.
+
+        >>> decompose('py37-django21') == frozenset(['py37', 'django21'])
+        True
+
+    See `DecompositionCache` for more details.
+
+    Args:
+        name: The env name or factor expression.
+
+    Returns:
+        The frozenset of the name's dash-delimited factors.
+    """
+    return decompositions.decompose(name)
+
+
+def get_decomposition_stats():
+    """Get the hit/miss statistics of the shared decomposition cache.
+
+    Returns:
+        The statistics. See `DecompositionCache.stats`.
+    """
+    return decompositions.stats()
+
+
+def clear_decompositions():
+    """Clear the shared decomposition cache."""
+    decompositions.clear()
+
+
+def is_pattern(factor):
+    """Determine if a single factor is a pattern, rather than an exact factor.
+
+    Patterns are either globs, such as `django2*`, or regexes delimited by
+    slashes, such as `/py3\\d/`. Patterns match whole factors, so `/py3/` does
+    not match `py37`. Note that patterns may not contain commas or dashes, as
+    these delimit factors.
+
+    Args:
+        factor: The single factor (i.e., without dashes).
+
+    Returns:
+        Whether the factor is a pattern.
+    """
+    return is_regex(factor) or not GLOB_CHARACTERS.isdisjoint(factor)
+
+
+def is_regex(factor):
+    return len(factor) > 2 and factor.startswith('/') and factor.endswith('/')
+
+
+def translate_pattern(factor):
+    """Translate a pattern factor into a regular expression.
+
+    Args:
+        factor: The pattern factor. See `is_pattern`.
+
+    Returns:
+        The regular expression string, which matches the whole factor.
+    """
+    if is_regex(factor):
+        return '(?:{regex})\\Z'.format(regex=factor[1:-1])
+
+    return fnmatch.translate(factor)
+
+
+def compile_pattern(factor):
+    """Compile a pattern factor. See `translate_pattern`.
+
+    Args:
+        factor: The pattern factor.
+
+    Returns:
+        The compiled regular expression.
+    """
+    return re.compile(translate_pattern(factor))
+
+
+class PatternMatcher(object):
+    """Matches several pattern factors at once, against a factor vocabulary.
+
+    The glob patterns are compiled into a single combined regex, so that
+    factors which don't match any glob are rejected in a single pass. Only the
+    remaining factors are tested against the individual globs. Regex patterns
+    are always tested individually, as combining them would change their
+    meaning (e.g., the numbering of groups, which backreferences rely on).
+
+        >>> matcher = PatternMatcher(['py3*', 'django2*'])
+        >>> matcher.expand(['py27', 'py37', 'django20', 'django111'])
+        {'py3*': ['py37'], 'django2*': ['django20']}
+
+    Args:
+        patterns: The list of pattern factors.
+    """
+
+    def __init__(self, patterns):
+        self.patterns = list(patterns)
+        self.globs = [
+            (pattern, compile_pattern(pattern))
+            for pattern in self.patterns if not is_regex(pattern)
+        ]
+        self.regexes = [
+            (pattern, compile_pattern(pattern))
+            for pattern in self.patterns if is_regex(pattern)
+        ]
+        self.combined = re.compile('|'.join(
+            '(?:{regex})'.format(regex=translate_pattern(pattern))
+            for pattern, _ in self.globs
+        ))
+
+    def expand(self, vocabulary):
+        """Expand each pattern into the factors of the vocabulary it matches.
+
+        Args:
+            vocabulary: The distinct factors to match against.
+
+        Returns:
+            The mapping of each pattern to its list of matching factors.
+        """
+        expanded = dict((pattern, []) for pattern in self.patterns)
+        if not self.patterns:
+            return expanded
+
+        for factor in vocabulary:
+            if self.globs and self.combined.match(factor):
+                for pattern, compiled in self.globs:
+                    if compiled.match(factor):
+                        expanded[pattern].append(factor)
+
+            for pattern, compiled in self.regexes:
+                if compiled.match(factor):
+                    expanded[pattern].append(factor)
+
+        return expanded
+
+
+class DeclaredEnv(object):
+    """A declared env, along with its factors and declaration.
+
+    The env name and factors are interned, as large generative envlists produce
+    many envs sharing the same factors.
+
+    Attributes:
+        name: The env name.
+        factors: The tuple of the env name's dash-delimited factors.
+        source: Where the env is declared, either `ENVLIST` or `SECTION`.
+        lineno: The line number of the declaration, or `None` if unknown. For
+            envlist envs, this is the line of the `envlist` setting.
+    """
+
+    __slots__ = ('name', 'factors', 'source', 'lineno')
+
+    def __init__(self, name, source, lineno=None):
+        self.name = intern(name)
+        self.factors = tuple(map(intern, name.split('-')))
+        self.source = source
+        self.lineno = lineno
+
+    def __repr__(self):
+        return '<DeclaredEnv {name!r} ({source}:{lineno})>'.format(
+            name=self.name, source=self.source, lineno=self.lineno)
+
+
+class DeclaredEnvs(object):
+    """An ordered registry of `DeclaredEnv`s, with constant-time name lookups.
+
+    Iterating over the registry yields the `DeclaredEnv`s in declaration order.
+    Note that the envlist may declare the same env more than once, in which
+    case looking up the name returns its first declaration.
+
+    Args:
+        envs: The optional initial `DeclaredEnv`s.
+    """
+
+    def __init__(self, envs=()):
+        self.envs = list(envs)
+
+        # Reversed, so that the first declaration of a name takes precedence.
+        self.by_name = dict((env.name, env) for env in reversed(self.envs))
+
+    def __len__(self):
+        return len(self.envs)
+
+    def __iter__(self):
+        return iter(self.envs)
+
+    def __contains__(self, env_name):
+        return env_name in self.by_name
+
+    def __getitem__(self, env_name):
+        return self.by_name[env_name]
+
+    def add(self, env):
+        self.envs.append(env)
+        self.by_name.setdefault(env.name, env)
+
+    def names(self):
+        """Get the declared env names.
+
+        Returns:
+            The list of env names, in declaration order.
+        """
+        return [env.name for env in self.envs]
+
+    def index(self):
+        """Build a `FactorIndex` from the envs' precomputed factors.
+
+        Returns:
+            The `FactorIndex` of the declared envs.
+        """
+        postings = {}
+        for position, env in enumerate(self.envs):
+            for factor in set(env.factors):
+                postings.setdefault(factor, []).append(position)
+
+        # The envlist envs are declared first, and are the default envlist.
+        envlist = sum(1 for env in self.envs if env.source == ENVLIST)
+
+        return FactorIndex(self.names(), postings, envlist or None)
+
+
+class FactorIndex(object):
+    """An inverted index of env factors to the env names that contain them.
+
+    Each factor maps to a posting list of env positions, in declaration order.
+    Matching a factor then only visits the envs in its shortest posting list,
+    instead of splitting and comparing every env name.
+
+        >>> index = FactorIndex(['py36-django20', 'py37-django20', 'lint'])
+        >>> index.match(['py37', 'lint'])
+        ['py37-django20', 'lint']
+
+    As with `tox -x`, queries with only excluded factors are applied to the
+    default envlist, which tox runs when no envs are given. For declared envs,
+    this is the envs of the envlist, or all of the envs if the config doesn't
+    have an envlist. The envs of the default envlist are indexed first.
+
+    Args:
+        env_names: The list of env names to index.
+        postings: The optional, prebuilt mapping of factors to env positions
+            (e.g., loaded from a cache). Otherwise, the env names are indexed.
+        defaults: The optional number of leading env names that make up the
+            default envlist. Defaults to all of the env names.
+    """
+
+    def __init__(self, env_names, postings=None, defaults=None):
+        self.env_names = list(env_names)
+        self.defaults = len(self.env_names) if defaults is None else defaults
+
+        if postings is None:
+            postings = {}
+            for position, name in enumerate(self.env_names):
+                for factor in set(name.split('-')):
+                    postings.setdefault(factor, []).append(position)
+
+        self.postings = postings
+
+    def __len__(self):
+        return len(self.env_names)
+
+    def positions(self, factor, expanded=None):
+        """Get the positions of the envs that match the given factor.
+
+        Args:
+            factor: The env factor to match against. As with `env_matches`,
+                this may consist of multiple dash-delimited factors, which may
+                also be patterns.
+            expanded: The optional mapping of the factor's patterns to the
+                indexed factors they match. See `expand_patterns`.
+
+        Returns:
+            The ordered list of matching env positions.
+        """
+        factors = decompose(factor)
+        if expanded is None:
+            expanded = self.expand_patterns([factor])
+
+        postings = []
+        for f in factors:
+            if f in expanded:
+                postings.append(self.union(expanded[f]))
+            else:
+                postings.append(self.postings.get(f, []))
+
+        shortest = min(postings, key=len)
+
+        if len(postings) == 1:
+            return shortest
+
+        # Only the candidates from the shortest posting list are checked.
+        alternatives = [
+            frozenset(expanded[f]) if f in expanded else frozenset([f])
+            for f in factors
+        ]
+
+        return [
+            position for position in shortest
+            if self.has_factors(position, alternatives)
+        ]
+
+    def has_factors(self, position, alternatives):
+        env_factors = decompose(self.env_names[position])
+
+        return all(not env_factors.isdisjoint(alts) for alts in alternatives)
+
+    def union(self, factors):
+        """Get the positions of the envs that contain any of the given factors.
+
+        Args:
+            factors: The list of single factors.
+
+        Returns:
+            The ordered list of env positions.
+        """
+        if len(factors) == 1:
+            return self.postings.get(factors[0], [])
+
+        return sorted(set(itertools.chain.from_iterable(
+            self.postings.get(f, []) for f in factors
+        )))
+
+    def expand_patterns(self, factors):
+        """Expand the patterns of the given factors against the indexed factors.
+
+        The patterns of all of the factors are matched at once, with a single
+        `PatternMatcher`, so the cost depends on the number of distinct indexed
+        factors rather than the number of envs.
+
+        Args:
+            factors: The list of env factors.
+
+        Returns:
+            The mapping of each pattern to its list of matching indexed factors.
+        """
+        patterns = set(
+            f for factor in factors for f in factor.split('-') if is_pattern(f)
+        )
+        if not patterns:
+            return {}
+
+        return PatternMatcher(sorted(patterns)).expand(self.postings)
+
+    def match(self, factors):
+        """Get the env names that match any of the given factors.
+
+        The positions of the excluded factors are subtracted from the positions
+        of the included factors. If there are only excluded factors, they are
+        subtracted from the envs of the default envlist. See `split_exclusions`.
+
+        Args:
+            factors: The list of env factors to match against.
+
+        Returns:
+            The list of matched env names, in their indexed order.
+        """
+        return self.match_many([factors])[0]
+
+    def match_many(self, queries):
+        """Get the env names that match each of the queries.
+
+        The patterns of all of the queries are expanded at once, and the
+        positions of each distinct factor are only looked up once.
+
+        Args:
+            queries: The list of queries, each a list of env factors.
+
+        Returns:
+            The list of matched env names for each query, in query order.
+        """
+        queries = [split_exclusions(factors) for factors in queries]
+        expanded = self.expand_patterns([
+            factor for includes, excludes in queries for factor in includes + excludes
+        ])
+
+        positions = {}
+        for includes, excludes in queries:
+            for factor in includes + excludes:
+                if factor not in positions:
+                    positions[factor] = self.positions(factor, expanded)
+
+        return [
+            self.select(positions, includes, excludes)
+            for includes, excludes in queries
+        ]
+
+    def select(self, positions, includes, excludes):
+        if includes or not excludes:
+            matched = set()
+            for factor in includes:
+                matched.update(positions[factor])
+        else:
+            matched = set(range(self.defaults))
+
+        for factor in excludes:
+            if not matched:
+                break
+            matched.difference_update(positions[factor])
+
+        return [self.env_names[position] for position in sorted(matched)]
+
+
+class EnvTemplate(object):
+    """A generative envlist entry, such as `py{36,37}-django{20,21}`.
+
+    The entry is split into its dash-delimited factor slots, each with the list
+    of values it may produce. e.g., `py{36,37}-django{20,21}` has the slots
+    `['py36', 'py37']` and `['django20', 'django21']`. Factors can then be
+    matched per slot, pruning slots that can't satisfy the factor, instead of
+    checking every env name in the expanded product.
+
+    Entries whose group alternatives contain a dash (e.g., `py37{,-cov}`) do not
+    have fixed slots, and are matched by expanding the entry instead. Pattern
+    factors are also matched by expanding the entry.
+
+        >>> template = EnvTemplate('py{36,37}-django{20,21}')
+        >>> list(template.match(['py37']))
+        ['py37-django20', 'py37-django21']
+
+    Args:
+        template: The envlist entry.
+        extended: Whether to expand nested brace groups and numeric ranges.
+            See `expand_envlist`.
+    """
+
+    def __init__(self, template, extended=False):
+        self.template = template
+
+        self.parts = parse_entry(template, extended)
+        self.slot_parts = self._get_slot_parts(self.parts)
+
+        if self.slot_parts is not None:
+            self.slots = [
+                [''.join(variant) for variant in itertools.product(*slot)]
+                for slot in self.slot_parts
+            ]
+            self.slot_values = [frozenset(values) for values in self.slots]
+        else:
+            self.slots = None
+            self.slot_values = None
+            self.env_names = frozenset(self)
+
+    def __repr__(self):
+        return '<EnvTemplate {template!r}>'.format(template=self.template)
+
+    def __iter__(self):
+        return (''.join(variant) for variant in itertools.product(*self.parts))
+
+    def __contains__(self, env_name):
+        if self.slots is None:
+            return env_name in self.env_names
+
+        factors = env_name.split('-')
+
+        return len(factors) == len(self.slots) and all(
+            factor in values for factor, values in zip(factors, self.slot_values)
+        )
+
+    @staticmethod
+    def _get_slot_parts(parts):
+        slots = [[]]
+
+        for index, alternatives in enumerate(parts):
+            # Even tokens are literals, odd tokens are brace groups.
+            if index % 2 == 0:
+                pieces = alternatives[0].split('-')
+                slots[-1].append([pieces[0]])
+                slots.extend([[piece]] for piece in pieces[1:])
+
+            elif any('-' in alternative for alternative in alternatives):
+                return None
+
+            else:
+                slots[-1].append(alternatives)
+
+        return slots
+
+    def match(self, factors):
+        """Lazily generate the env names that match any of the given factors.
+
+        Excluded factors are checked against the env names that match the
+        included factors, as with `FactorIndex.match`.
+
+        Args:
+            factors: The list of env factors to match against.
+
+        Yields:
+            The matching env names, in expansion order.
+        """
+        includes, excludes = split_exclusions(factors)
+        if includes or not excludes:
+            env_names = self._match_factors(includes)
+        else:
+            env_names = iter(self)
+
+        for env_name in env_names:
+            if not any(env_matches(env_name, factor) for factor in excludes):
+                yield env_name
+
+    def _match_factors(self, factors):
+        if self.slots is None or any(
+                is_pattern(f) for factor in factors for f in factor.split('-')):
+            for env_name in self:
+                if any(env_matches(env_name, factor) for factor in factors):
+                    yield env_name
+            return
+
+        # The factors that each slot, along with the slots after it, may produce.
+        available = [frozenset()]
+        for values in reversed(self.slot_values):
+            available.insert(0, available[0] | values)
+
+        # Prune the factors that no combination of slots could produce.
+        needs = [decompose(factor) for factor in factors]
+        needs = [need for need in needs if need <= available[0]]
+
+        for env_factors in self._match_slots(0, needs, available):
+            yield '-'.join(env_factors)
+
+    def _match_slots(self, index, needs, available):
+        if not needs:
+            return
+
+        if not all(needs):
+            # A factor has been fully satisfied, so all remaining combos match.
+            for variant in itertools.product(*self.slots[index:]):
+                yield variant
+            return
+
+        if index == len(self.slots):
+            return
+
+        for value in self.slots[index]:
+            remaining = [
+                need - {value} for need in needs
+                if need - {value} <= available[index + 1]
+            ]
 
-    return set(factors).issubset(set(env_factors))
+            for variant in self._match_slots(index + 1, remaining, available):
+                yield (value, ) + variant
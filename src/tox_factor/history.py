@@ -0,0 +1,136 @@
+import os
+from timeit import default_timer
+
+from .compat import makedirs
+from .shard import get_weights
+
+# The weight of the latest run, when updating an env's average duration.
+SMOOTHING = 0.5
+
+ORDERS = ('declared', 'longest')
+
+
+def get_history_path(cache_dir):
+    """Get the path of the runtime history database.
+
+    Args:
+        cache_dir: The plugin's cache directory. See `tox_factor.cache`.
+
+    Returns:
+        The database path.
+    """
+    return os.path.join(cache_dir, 'history.sqlite')
+
+
+class RuntimeHistory(object):
+    """A local store of env runtimes, backed by SQLite.
+
+    Each env's duration is an exponential moving average of its recent runs.
+    SQLite handles the locking, as envs may be recorded concurrently by the
+    subprocesses of a parallel tox run.
+
+    Args:
+        path: The path of the SQLite database.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def connect(self):
+        import sqlite3
+
+        cache_dir = os.path.dirname(self.path)
+        makedirs(cache_dir)
+
+        connection = sqlite3.connect(self.path, timeout=30)
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS runtimes ('
+            '    env TEXT PRIMARY KEY,'
+            '    duration REAL NOT NULL,'
+            '    runs INTEGER NOT NULL'
+            ')')
+
+        return connection
+
+    def record(self, env_name, duration):
+        """Record the duration of an env run.
+
+        Args:
+            env_name: The env name.
+            duration: The duration of the run, in seconds.
+        """
+        connection = self.connect()
+        try:
+            with connection:
+                connection.execute(
+                    'UPDATE runtimes SET '
+                    '    duration = duration * ? + ? * ?, runs = runs + 1 '
+                    'WHERE env = ?',
+                    (1 - SMOOTHING, SMOOTHING, duration, env_name))
+                connection.execute(
+                    'INSERT OR IGNORE INTO runtimes (env, duration, runs) '
+                    'VALUES (?, ?, 1)',
+                    (env_name, duration))
+        finally:
+            connection.close()
+
+    def durations(self):
+        """Get the recorded env durations.
+
+        Returns:
+            The mapping of env names to their average duration, in seconds.
+            This is empty if no history has been recorded.
+        """
+        if not os.path.exists(self.path):
+            return {}
+
+        connection = self.connect()
+        try:
+            return dict(connection.execute('SELECT env, duration FROM runtimes'))
+        finally:
+            connection.close()
+
+
+class RuntimeRecorder(object):
+    """Times env runs, recording their durations to a `RuntimeHistory`.
+
+    Errors writing to the history are ignored, so they never fail a tox run.
+    """
+
+    def __init__(self):
+        self.started = {}
+
+    def start(self, env_name):
+        self.started[env_name] = default_timer()
+
+    def stop(self, env_name, history):
+        import sqlite3
+
+        start = self.started.pop(env_name, None)
+        if start is None:
+            return
+
+        try:
+            history.record(env_name, default_timer() - start)
+        except (sqlite3.Error, EnvironmentError):
+            pass
+
+
+def order_longest_first(env_names, durations):
+    """Order envs by their duration, longest first.
+
+    Starting the longest envs first reduces the total wall time of a parallel
+    run (i.e., longest processing time scheduling). Envs without a recorded
+    duration are weighted as per `tox_factor.shard.get_weights`. Envs of equal
+    duration keep their relative order.
+
+    Args:
+        env_names: The list of env names.
+        durations: The mapping of env names to their durations.
+
+    Returns:
+        The ordered list of env names.
+    """
+    weights = get_weights(env_names, durations)
+
+    return sorted(env_names, key=lambda name: -weights[name])
@@ -1,9 +1,20 @@
 import os
+import re
+import sys
 
 import tox
+from tox import reporter
 
+# tox imports every plugin on startup, so only the modules needed to add the
+# options are imported here. The other modules are imported when they're used,
+# so that tox calls that don't use the plugin's options don't pay for them.
+from . import history, timing
 from .compat import TOX_PARALLEL_ENV
-from .factor import get_envlist
+from .shard import parse_shard
+
+# Times the test commands of each env, for the runtime history. See the
+# `tox_runtest_pre` and `tox_runtest_post` hooks.
+recorder = history.RuntimeRecorder()
 
 
 def normalize_factors(factors):
@@ -16,12 +27,23 @@ def normalize_factors(factors):
         >>> normalize_factors(['py37', 'lint,isort'])
         ['py37', 'lint', 'isort']
 
+    Factors may also contain glob or regex patterns (e.g., `django2*` or
+    `/py3\\d/`), which are validated here. See `tox_factor.factor.is_pattern`.
+    As regex patterns may not contain commas or dashes, a regex that's split
+    by them (e.g., `/py3\\d{1,2}/`) is rejected, rather than being matched as
+    exact factors. Excluded factors (e.g., `!py27`) keep their prefix.
+
     Args:
         factors: A list of comma-separated factor strings.
 
     Returns:
         The list flattened, individual factors.
+
+    Raises:
+        ConfigError: If a factor contains an invalid regex pattern.
     """
+    from .factor import EXCLUDE_PREFIX, compile_pattern, is_pattern
+
     assert isinstance(factors, list), (
         'Expected `factors` list to be a list, got `{cls}`.'
         .format(cls=type(factors).__name__))
@@ -33,38 +55,363 @@ def normalize_factors(factors):
     ]
 
     # Remove empty strings
-    return [f for f in flattened if f]
+    flattened = [f for f in flattened if f]
+
+    for factor in flattened:
+        for f in factor.lstrip(EXCLUDE_PREFIX).split('-'):
+            if f.startswith('/') != f.endswith('/'):
+                raise tox.exception.ConfigError(
+                    'invalid factor pattern {pattern!r}: regex patterns may not '
+                    'contain commas or dashes'.format(pattern=f))
+
+            if is_pattern(f):
+                try:
+                    compile_pattern(f)
+                except re.error as exception:
+                    raise tox.exception.ConfigError(
+                        'invalid factor pattern {pattern!r}: {error}'
+                        .format(pattern=f, error=exception))
+
+    return flattened
+
+
+def get_timing_format(config):
+    """Get the timing report format requested by the option or env var.
+
+    The `TOXFACTOR_PROFILE` env var may be set to 'json' for a JSON report,
+    while any other non-empty value (other than '0') enables the text report.
+
+    Args:
+        config: The tox config.
+
+    Returns:
+        The timing report format, or `None` if timing is not enabled.
+    """
+    fmt = config.option.factor_timing
+    if fmt in timing.FORMATS:
+        return fmt
+
+    envvar = os.environ.get('TOXFACTOR_PROFILE', '')
+    if envvar in timing.FORMATS:
+        return envvar
+
+    return 'text' if envvar not in ('', '0') else None
 
 
 @tox.hookimpl
 def tox_addoption(parser):
     parser.add_argument(  # pragma: no cover
         '-f', '--factor', action='append',
-        help='work against environments that match the given factors.')
+        help='work against environments that match the given factors. '
+             'Factors prefixed with "!" exclude the matching environments.')
+    parser.add_argument(  # pragma: no cover
+        '-x', '--exclude-factor', action='append',
+        help='exclude the environments that match the given factors.')
+    parser.add_argument(  # pragma: no cover
+        '--factor-changed', metavar='REF',
+        help='only work against the environments with factors affected by the '
+             'changes since the given git ref. See the [tox-factor] section.')
+    parser.add_argument(  # pragma: no cover
+        '--factor-json', action='store_true',
+        help='print each declared environment, its factors, and how it matched '
+             'the factors as JSON lines, then exit.')
+    parser.add_argument(  # pragma: no cover
+        '--factor-matrix', metavar='AXIS',
+        help='print the environments grouped by their value of the given '
+             'factor axis (e.g., py) as a JSON object, then exit.')
+    parser.add_argument(  # pragma: no cover
+        '--factor-timing', nargs='?', const='text', choices=timing.FORMATS,
+        help='report the time spent resolving factors, as text or json.')
+    parser.add_argument(  # pragma: no cover
+        '--factor-shard', metavar='i/N', type=parse_shard,
+        help='only work against the i-th of N shards of the environments.')
+    parser.add_argument(  # pragma: no cover
+        '--factor-durations', metavar='PATH',
+        help='a JSON file of environment durations, used to balance shards.')
+    parser.add_argument(  # pragma: no cover
+        '--factor-order', choices=history.ORDERS, default='declared',
+        help='the order of the environments. "longest" runs the environments '
+             'with the longest recorded runtime first, and records their '
+             'runtimes (default: declared).')
+    parser.add_argument(  # pragma: no cover
+        '--factor-skip-verified', action='store_true',
+        help='skip the environments whose latest run passed with the same '
+             'config and sources. Runs are recorded with this option.')
+    parser.add_argument(  # pragma: no cover
+        '--factor-wheelhouse', action='store_true',
+        help='build the wheels for environments with identical dependencies '
+             'once, and install the dependencies from the shared wheels.')
 
 
 @tox.hookimpl
 def tox_configure(config):
     # Run on the main tox process but not in the parallelized subprocesses,
     # where the subprocess has been delegated a specific TOX_PARALLEL_ENV.
-    if TOX_PARALLEL_ENV in os.environ:
-        return
+    # Do not match factors when tox env is specified either.
+    delegated = TOX_PARALLEL_ENV in os.environ
+    given = delegated or 'TOXENV' in os.environ or config.option.env
+    if not given:
+        configure_selection(config)
 
-    # Do not match factors when tox env is specified
-    if 'TOXENV' in os.environ or config.option.env:
-        return
+    if config.option.factor_wheelhouse and not delegated:
+        report_wheelhouse_groups(config)
 
+    # The listings describe the selected envs, even if they were given with
+    # `-e` or TOXENV, so that tools can rely on the listing being the output.
+    if config.option.factor_json or config.option.factor_matrix:
+        write_listing(config)
+        sys.exit(0)
+
+
+def configure_selection(config):
     # Append behavior does not override default. Set default here instead.
     # See: https://bugs.python.org/issue16399
     envvar = os.environ.get('TOXFACTOR')
     if not config.option.factor and envvar:
         config.option.factor = [envvar]
 
-    if config.option.factor:
-        factors = normalize_factors(config.option.factor)
-        config.envlist = get_envlist(config._cfg, factors)
+    factored = bool(config.option.factor or config.option.exclude_factor)
+    if factored:
+        configure_envlist(config)
+
+    if config.option.factor_changed:
+        configure_changed(config, factored)
+
+    if config.option.factor_shard:
+        configure_shard(config)
+
+    if config.option.factor_skip_verified:
+        configure_verified(config)
+
+    if config.option.factor_order == 'longest':
+        configure_order(config)
+
+
+def get_factors(config):
+    from .factor import EXCLUDE_PREFIX
+
+    factors = normalize_factors(config.option.factor or [])
+    factors.extend(
+        EXCLUDE_PREFIX + factor
+        for factor in normalize_factors(config.option.exclude_factor or []))
+
+    return factors
+
+
+def configure_envlist(config):
+    timing_format = get_timing_format(config)
+
+    with timing.profile(enabled=timing_format is not None) as timer:
+        resolve_envlist(config)
+
+    if timer is not None:
+        sys.stderr.write(timer.report(timing_format))
+
+
+def get_index_cache_dir(config):
+    from .cache import get_cache_dir
+
+    # Matching the envlist templates is faster than loading the cached index of
+    # the declared envs, which is only used when the run queries the declared
+    # envs twice, i.e., for both the factor options and `--factor-changed`.
+    factored = config.option.factor or config.option.exclude_factor
+    if factored and config.option.factor_changed:
+        return get_cache_dir(config)
+
+    return None
+
+
+def resolve_envlist(config):
+    from .factor import EXCLUDE_PREFIX, get_envlist, match_envs
+
+    with timing.timed('normalize_factors'):
+        factors = get_factors(config)
+
+    if any(not factor.startswith(EXCLUDE_PREFIX) for factor in factors):
+        config.envlist = get_envlist(
+            config._cfg, factors, cache_dir=get_index_cache_dir(config))
+    else:
+        # Only exclusions, which are applied to the default envlist.
+        with timing.timed('match_envs'):
+            config.envlist = match_envs(config.envlist, factors)
+
+    timing.record('factors', len(factors))
+    timing.record('matched_envs', len(config.envlist))
+
+    # TEMP: setting config.envlist_default fixes tox -l usage (and by
+    # extension, the test suite). The longterm fix is to add a new option
+    # to tox (e.g., tox -ls) that lists the selected envs (config.envlist).
+    config.envlist_default = config.envlist
+
+
+def configure_changed(config, factored):
+    from . import impact
+    from .factor import get_envlist
+
+    toxinidir = str(config.toxinidir)
+    workdir = os.path.relpath(str(config.toxworkdir), toxinidir)
+
+    paths = impact.get_changed_paths(config.option.factor_changed, toxinidir, workdir)
+    mapping = impact.get_path_factors(config._cfg)
+    factors = impact.get_affected_factors(paths, mapping)
+
+    if factors is None:
+        reporter.verbosity1('tox-factor: changes not mapped to factors, '
+                            'keeping all envs')
+        return
+
+    factors = normalize_factors(factors)
+    reporter.verbosity1('tox-factor: changed factors: {factors}'.format(
+        factors=', '.join(factors) or '(none)'))
+
+    envlist = []
+    if factors:
+        envlist = get_envlist(config._cfg, factors, cache_dir=get_index_cache_dir(config))
+
+    # Combined with the factor options, only the envs selected by both are kept.
+    if factored:
+        selected = set(envlist)
+        envlist = [env_name for env_name in config.envlist if env_name in selected]
+
+    config.envlist = envlist
+    config.envlist_default = config.envlist
+
+
+def write_listing(config):
+    from . import listing
+
+    if config.option.factor_matrix:
+        from .matrix import get_job_matrix
+
+        axis = config.option.factor_matrix
+        groups = get_job_matrix(config._cfg, config.envlist, axis)
+        listing.write_json(groups, sys.stdout)
+
+        grouped = set(env for envs in groups.values() for env in envs)
+        ungrouped = [env for env in config.envlist if env not in grouped]
+        if ungrouped:
+            sys.stderr.write('tox-factor: envs without a value for the {axis!r} axis are '
+                             'not in the matrix: {envs}\n'.format(
+                                 axis=axis, envs=', '.join(ungrouped)))
+        return
+
+    records = listing.iter_env_records(config._cfg, get_factors(config), config.envlist)
+
+    listing.write_json_lines(records, sys.stdout)
+
+
+def configure_shard(config):
+    from .shard import load_durations, select_shard
+
+    index, count = config.option.factor_shard
+
+    durations = None
+    if config.option.factor_durations:
+        durations = load_durations(config.option.factor_durations)
+
+    config.envlist = select_shard(config.envlist, index, count, durations)
+    config.envlist_default = config.envlist
+
+
+def configure_verified(config):
+    import sqlite3
+
+    from . import verified
+
+    fingerprints = verified.get_fingerprints(config, config.envlist)
+    if fingerprints is None:
+        sys.stderr.write('tox-factor: the sources could not be fingerprinted (not a '
+                         'git repository?), so no verified envs are skipped\n')
+        return
+
+    try:
+        passed = get_verified_runs(config).fingerprints()
+    except (sqlite3.Error, EnvironmentError):
+        passed = {}
+
+    envlist, skipped = verified.split_verified(config.envlist, fingerprints, passed)
+    config.envlist = envlist
+    config.envlist_default = config.envlist
+
+    if skipped:
+        sys.stderr.write(
+            'tox-factor: skipping {count} env(s) that passed with the same inputs: '
+            '{envs}\n'.format(count=len(skipped), envs=', '.join(skipped)))
+
+
+def configure_order(config):
+    import sqlite3
+
+    try:
+        durations = get_history(config).durations()
+    except (sqlite3.Error, EnvironmentError):
+        durations = {}
+
+    config.envlist = history.order_longest_first(config.envlist, durations)
+    config.envlist_default = config.envlist
+
+
+def report_wheelhouse_groups(config):
+    from . import wheelhouse
+
+    # Shares the run id with the subprocesses of a parallel run, so that they
+    # build each wheelhouse at most once.
+    wheelhouse.get_run_id()
+
+    groups = wheelhouse.group_envs(config, config.envlist)
+
+    for fingerprint, env_names in groups.items():
+        reporter.verbosity1('tox-factor: wheelhouse {fingerprint}: {envs}'.format(
+            fingerprint=fingerprint, envs=', '.join(env_names)))
+
+
+@tox.hookimpl
+def tox_testenv_install_deps(venv, action):
+    config = venv.envconfig.config
+    if not config.option.factor_wheelhouse:
+        return None
+
+    from . import wheelhouse
+    from .cache import get_cache_dir
+
+    return wheelhouse.install_deps(venv, action, get_cache_dir(config))
+
+
+# Env runs are only recorded when the options that use the records are given,
+# so that other runs have no side effects.
+@tox.hookimpl
+def tox_runtest_pre(venv):
+    config = venv.envconfig.config
+    if config.option.factor_order == 'longest':
+        recorder.start(venv.name)
+
+    if config.option.factor_skip_verified:
+        from .verified import verified_recorder
+
+        verified_recorder.start(config, venv.name)
+
+
+@tox.hookimpl
+def tox_runtest_post(venv):
+    config = venv.envconfig.config
+    if config.option.factor_order == 'longest':
+        recorder.stop(venv.name, get_history(config))
+
+    if config.option.factor_skip_verified:
+        from .verified import verified_recorder
+
+        runs = get_verified_runs(config)
+        verified_recorder.stop(venv.name, venv.status == 0, runs)
+
+
+def get_history(config):
+    from .cache import get_cache_dir
+
+    return history.RuntimeHistory(history.get_history_path(get_cache_dir(config)))
+
+
+def get_verified_runs(config):
+    from .cache import get_cache_dir
+    from .verified import VerifiedRuns, get_verified_path
 
-        # TEMP: setting config.envlist_default fixes tox -l usage (and by
-        # extension, the test suite). The longterm fix is to add a new option
-        # to tox (e.g., tox -ls) that lists the selected envs (config.envlist).
-        config.envlist_default = config.envlist
+    return VerifiedRuns(get_verified_path(get_cache_dir(config)))
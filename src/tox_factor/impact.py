@@ -0,0 +1,133 @@
+import fnmatch
+import os
+import subprocess
+from collections import OrderedDict
+
+import tox
+
+# The config section that maps changed paths to the factors they affect.
+SECTION = 'tox-factor'
+
+# Separates the path glob from its factors, in each line of the `paths` key.
+ARROW = '->'
+
+
+def get_path_factors(ini):
+    """Get the mapping of path globs to factors from the `[tox-factor]` section.
+
+    Each line of the `paths` key maps a path glob to a comma-separated list of
+    factors. Globs are relative to the tox config's directory, and follow the
+    `fnmatch` rules, so `*` also matches across directories. Paths may map to
+    no factors, for files that don't affect any env (e.g., documentation).
+
+        [tox-factor]
+        paths =
+            src/cache/** -> redis,memcached
+            docs/** ->
+
+    Args:
+        ini: The parsed tox ini config object.
+
+    Returns:
+        The ordered list of tuples of a path glob and its list of factors.
+
+    Raises:
+        ConfigError: If a line is missing its `->` separator.
+    """
+    paths = ini.sections.get(SECTION, {}).get('paths', '')
+    mapping = []
+
+    for line in paths.split('\n'):
+        line = line.split('#', 1)[0].strip()
+        if not line:
+            continue
+
+        if ARROW not in line:
+            raise tox.exception.ConfigError(
+                'invalid [{section}] path mapping {line!r}, expected '
+                '"<glob> {arrow} <factors>".'
+                .format(section=SECTION, line=line, arrow=ARROW))
+
+        glob, factors = line.split(ARROW, 1)
+        factors = [f.strip() for f in factors.split(',')]
+        mapping.append((glob.strip(), [f for f in factors if f]))
+
+    return mapping
+
+
+def get_changed_paths(base, cwd, exclude=None):
+    """Get the paths changed since the merge base of the given ref and `HEAD`.
+
+    Both committed and uncommitted changes are included. Paths are relative to
+    the given directory, and changes outside of it are ignored. Renamed files
+    are listed by both their old and new paths.
+
+    Args:
+        base: The base git ref (e.g., 'origin/master').
+        cwd: The directory to run git in, which is usually the tox config's.
+        exclude: The optional path (relative to the directory) of files that
+            are ignored, such as the tox work dir, which isn't always ignored
+            by git.
+
+    Returns:
+        The sorted list of changed paths.
+
+    Raises:
+        ConfigError: If git fails, e.g., if the ref doesn't exist.
+    """
+    try:
+        merge_base = git(['merge-base', base, 'HEAD'], cwd).strip()
+        changed = git(
+            ['diff', '--name-only', '--no-renames', '--relative', merge_base], cwd)
+        untracked = git(['ls-files', '--others', '--exclude-standard'], cwd)
+    except (subprocess.CalledProcessError, EnvironmentError) as exception:
+        raise tox.exception.ConfigError(
+            'could not diff against {base!r}: {error}'.format(base=base, error=exception))
+
+    paths = set(changed.splitlines()) | set(untracked.splitlines())
+    if exclude is not None:
+        prefix = os.path.join(exclude, '')
+        paths = set(path for path in paths if not path.startswith(prefix))
+
+    return sorted(paths)
+
+
+def git(args, cwd):
+    output = subprocess.check_output(['git'] + args, cwd=cwd, stderr=subprocess.STDOUT)
+
+    return output.decode('utf-8')
+
+
+def get_affected_factors(paths, mapping):
+    """Get the factors affected by the changed paths.
+
+    Each path is matched against every glob of the mapping, and affects the
+    factors of all of the globs it matches.
+
+        >>> get_affected_factors(['src/cache/redis.py'], [
+        >>>     ('src/cache/*', ['redis', 'memcached']),
+        >>>     ('docs/*', []),
+        >>> ])
+        ['redis', 'memcached']
+
+    Args:
+        paths: The list of changed paths.
+        mapping: The list of path globs and their factors. See `get_path_factors`.
+
+    Returns:
+        The list of affected factors, in mapping order, or `None` if a path is
+        not matched by any glob. As the impact of such a path is unknown, it
+        should be assumed to affect every env.
+    """
+    affected = set()
+    for path in paths:
+        matched = [factors for glob, factors in mapping if fnmatch.fnmatch(path, glob)]
+        if not matched:
+            return None
+
+        for factors in matched:
+            affected.update(factors)
+
+    ordered = OrderedDict.fromkeys(f for _, factors in mapping for f in factors)
+
+    return [factor for factor in ordered if factor in affected]
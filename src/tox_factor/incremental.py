@@ -0,0 +1,134 @@
+from .factor import FactorIndex, expand_entry, get_env_declarations
+from .timing import record, timed
+
+
+class Segment(object):
+    """The env names of an envlist entry (or of the sections), with their postings.
+
+    The postings map each factor to the positions of the env names within the
+    segment. See `FactorIndex`.
+
+    Args:
+        env_names: The iterable of env names.
+        postings: The optional, prebuilt postings of the env names (e.g., loaded
+            from a cache). Otherwise, the env names are indexed.
+    """
+
+    __slots__ = ('env_names', 'postings')
+
+    def __init__(self, env_names, postings=None):
+        self.env_names = tuple(env_names)
+
+        if postings is None:
+            postings = {}
+            for position, name in enumerate(self.env_names):
+                for factor in set(name.split('-')):
+                    postings.setdefault(factor, []).append(position)
+
+        self.postings = postings
+
+
+class IncrementalIndex(object):
+    """Keeps the `FactorIndex` of a changing tox config up to date.
+
+    The declared envs are split into a segment per envlist entry, followed by a
+    segment for the envs that are only declared by sections. When the config is
+    updated, only the envlist entries that are new since the last update are
+    expanded and indexed. The index is then reassembled from the segments, by
+    offsetting their postings. If the env declarations haven't changed at all
+    (e.g., only the commands of a section were edited), the current index is
+    kept as is.
+
+    The updated index is identical to the index of the `DeclaredEnvs` of the
+    config, as built by `collect_declared_envs`.
+
+        >>> incremental = IncrementalIndex()
+        >>> index = incremental.update(IniConfig('tox.ini'))
+        >>> # ... tox.ini is edited ...
+        >>> index = incremental.update(IniConfig('tox.ini'))
+
+    Args:
+        segments: The optional mapping of envlist entries to their `Segment`s,
+            which are reused by the first update (e.g., loaded from a cache).
+
+    Attributes:
+        index: The current `FactorIndex`, or `None` until updated.
+        segments: The mapping of the current envlist entries to their `Segment`s.
+        sections: The `Segment` of the envs that are only declared by sections,
+            or `None` until updated.
+    """
+
+    def __init__(self, segments=None):
+        self.index = None
+        self.declarations = None
+        self.segments = dict(segments or {})
+        self.sections = None
+
+    def update(self, ini):
+        """Update the index for the current state of the tox config.
+
+        Args:
+            ini: The parsed tox ini config object.
+
+        Returns:
+            The updated `FactorIndex`.
+        """
+        declarations = get_env_declarations(ini)
+        if declarations == self.declarations:
+            return self.index
+
+        entries, section_envs = declarations
+
+        # Segments of entries that were removed from the envlist are dropped.
+        segments = {}
+        with timed('expand_envlist'):
+            for entry in entries:
+                if entry not in segments:
+                    segment = self.segments.get(entry)
+                    segments[entry] = segment or Segment(expand_entry(entry))
+
+        # As with `collect_declared_envs`, sections only declare the envs that
+        # aren't in the envlist.
+        declared = set()
+        for segment in segments.values():
+            declared.update(segment.env_names)
+
+        sections = Segment(env for env in section_envs if env not in declared)
+
+        # The envlist envs are the default envlist, unless there are none.
+        envlist = [segments[entry] for entry in entries]
+        defaults = sum(len(segment.env_names) for segment in envlist) or None
+
+        self.index = join_segments(envlist + [sections], defaults)
+        self.declarations = declarations
+        self.segments = segments
+        self.sections = sections
+
+        record('declared_envs', len(self.index))
+
+        return self.index
+
+
+def join_segments(segments, defaults=None):
+    """Join the segments into a `FactorIndex` of all their env names.
+
+    Args:
+        segments: The list of `Segment`s, in declaration order.
+        defaults: The optional number of leading env names that make up the
+            default envlist. See `FactorIndex`.
+
+    Returns:
+        The `FactorIndex`.
+    """
+    env_names, postings = [], {}
+
+    for segment in segments:
+        offset = len(env_names)
+        env_names.extend(segment.env_names)
+
+        for factor, positions in segment.postings.items():
+            if offset:
+                positions = [position + offset for position in positions]
+            postings.setdefault(factor, []).extend(positions)
+
+    return FactorIndex(env_names, postings, defaults)
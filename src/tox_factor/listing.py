@@ -0,0 +1,83 @@
+import json
+
+from .factor import collect_declared_envs, split_exclusions
+
+
+def iter_env_records(ini, factors, selected):
+    """Generate a record of each declared env, and how it was resolved.
+
+    Each record contains the env's name, its factors, where it's declared, the
+    requested factors (and excluded factors) that matched it, and whether it
+    was finally selected. e.g.,
+
+        {
+            "env": "py37-django21",
+            "factors": ["py37", "django21"],
+            "source": "envlist",
+            "lineno": 3,
+            "matched": ["py37"],
+            "excluded": [],
+            "selected": true
+        }
+
+    The factors are matched against the index of the declared envs once, so
+    records are generated in a single pass over the envs. An env declared more
+    than once only produces a record for its first declaration.
+
+    Args:
+        ini: The parsed tox ini config object.
+        factors: The list of requested env factors.
+        selected: The list of selected env names.
+
+    Yields:
+        The env records, in declaration order.
+    """
+    declared_envs = collect_declared_envs(ini)
+    includes, excludes = split_exclusions(factors)
+    index = declared_envs.index()
+    expanded = index.expand_patterns(includes + excludes)
+
+    includes = [(f, frozenset(index.positions(f, expanded))) for f in includes]
+    excludes = [(f, frozenset(index.positions(f, expanded))) for f in excludes]
+    selected = frozenset(selected)
+
+    for position, env in enumerate(declared_envs):
+        if declared_envs[env.name] is not env:
+            continue
+
+        yield {
+            'env': env.name,
+            'factors': list(env.factors),
+            'source': env.source,
+            'lineno': env.lineno,
+            'matched': [f for f, positions in includes if position in positions],
+            'excluded': [f for f, positions in excludes if position in positions],
+            'selected': env.name in selected,
+        }
+
+
+def write_json_lines(records, stream):
+    """Write the records to the stream as JSON lines (one JSON object per line).
+
+    Each record is written as soon as it's generated, so consumers can process
+    large envlists incrementally.
+
+    Args:
+        records: The iterable of records.
+        stream: The file to write to.
+    """
+    for record in records:
+        stream.write(json.dumps(record, sort_keys=True) + '\n')
+
+    stream.flush()
+
+
+def write_json(obj, stream):
+    """Write the object to the stream as a single line of JSON.
+
+    Args:
+        obj: The JSON serializable object. Mappings keep their order.
+        stream: The file to write to.
+    """
+    stream.write(json.dumps(obj) + '\n')
+    stream.flush()
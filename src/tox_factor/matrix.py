@@ -0,0 +1,343 @@
+import binascii
+import itertools
+import re
+from collections import OrderedDict
+
+import tox
+
+from .factor import decompose, get_declared_envs, get_envlist_templates
+
+# Codes are stored as bytes, where 0 marks envs without a value for the axis.
+MAX_AXIS_VALUES = 255
+
+# The trailing version of a slot's name, which is ignored when naming axes and
+# comparing the shapes of templates (e.g., `django30` and `django{20,21}`).
+VERSION_PATTERN = re.compile(r'[\d.]*\Z')
+
+
+def get_matrix(ini):
+    """Get the `FactorMatrix` of the envs declared by the tox config.
+
+    Args:
+        ini: The parsed tox ini config object.
+
+    Returns:
+        The `FactorMatrix` of the declared envs, with the axes inferred from
+        the envlist. See `infer_axes`. Axes with more than `MAX_AXIS_VALUES`
+        values are not included.
+    """
+    axes = infer_axes(get_envlist_templates(ini))
+
+    return FactorMatrix(get_declared_envs(ini), limit_axes(axes))
+
+
+def get_job_matrix(ini, env_names, axis):
+    """Group the env names by their value of an axis, e.g., for CI job matrices.
+
+    The axes are inferred from the envlist (see `infer_axes`), so the config is
+    only resolved once, regardless of the number of axis values. e.g.,
+
+        >>> get_job_matrix(ini, ['py36-redis', 'py37-redis', 'lint'], 'py')
+        OrderedDict([('py36', ['py36-redis']), ('py37', ['py37-redis'])])
+
+    Values without any of the envs, and envs without a value for the axis, are
+    not included.
+
+    Args:
+        ini: The parsed tox ini config object.
+        env_names: The list of env names to group.
+        axis: The axis name.
+
+    Returns:
+        The ordered mapping of the axis values to their env names.
+
+    Raises:
+        ConfigError: If the envlist doesn't define the axis, or if the axis has
+            more than `MAX_AXIS_VALUES` values.
+    """
+    axes = infer_axes(get_envlist_templates(ini))
+    if axis not in axes:
+        raise tox.exception.ConfigError(
+            'unknown factor axis {axis!r}, expected one of: {axes}'
+            .format(axis=axis, axes=', '.join(axes) or '(none)'))
+
+    if len(axes[axis]) > MAX_AXIS_VALUES:
+        raise tox.exception.ConfigError(
+            'factor axis {axis!r} has {count} values, but at most {limit} are '
+            'supported'.format(axis=axis, count=len(axes[axis]), limit=MAX_AXIS_VALUES))
+
+    groups = FactorMatrix(env_names, limit_axes(axes)).group_by(axis)
+
+    return OrderedDict((value, envs) for value, envs in groups.items() if envs)
+
+
+def infer_axes(templates):
+    """Infer the factor axes from the brace groups of the envlist templates.
+
+    Each dash-delimited slot of a template that contains a brace group is an
+    axis. The axis is named after the slot's leading literal, without a trailing
+    version (e.g., 'py' for both `py{36,37}` and `py3{8,9}`), or after the slot's
+    position if there is none (e.g., 'axis2' for `{redis,memcached}` in the third
+    slot). Axes of the same name are merged across templates, except that
+    positional axes are only merged across templates of the same shape (see
+    `get_shape`). The positional axes of each other shape are numbered in envlist
+    order (e.g., 'axis2.1').
+
+    Literal slots with a version (e.g., `django30`) add their value to the axis
+    of the same name, while other literal slots (e.g., `lint`) only do so if a
+    brace group declares the axis. e.g.,
+
+        >>> infer_axes([
+        >>>     EnvTemplate('py{36,37}-django{20,21}-{redis,memcached}'),
+        >>>     EnvTemplate('py38-django30-{redis,memcached}'),
+        >>>     EnvTemplate('lint'),
+        >>> ])
+        OrderedDict([
+            ('py', ['py36', 'py37', 'py38']),
+            ('django', ['django20', 'django21', 'django30']),
+            ('axis2', ['redis', 'memcached']),
+        ])
+
+    Templates without fixed slots (see `EnvTemplate`) don't define axes.
+
+    Args:
+        templates: The list of `EnvTemplate`s.
+
+    Returns:
+        The ordered mapping of axis names to their values, in envlist order.
+    """
+    axes, declared, shapes = OrderedDict(), set(), {}
+
+    for template in templates:
+        if template.slot_parts is None:
+            continue
+
+        shape = get_shape(template)
+        for index, (name, parts, values) in enumerate(
+                zip(shape, template.slot_parts, template.slots)):
+            # Slots without a brace group consist of a single literal part.
+            if len(parts) > 1:
+                if not name:
+                    name = get_positional_name(index, shape, shapes)
+                declared.add(name)
+            elif not name:
+                continue
+            elif name != parts[0][0]:
+                declared.add(name)
+
+            axis = axes.setdefault(name, OrderedDict())
+            axis.update((value, None) for value in values)
+
+    return OrderedDict(
+        (name, list(values)) for name, values in axes.items() if name in declared
+    )
+
+
+def get_positional_name(index, shape, shapes):
+    name = 'axis{index}'.format(index=index)
+    named = shapes.setdefault(name, [])
+    if shape not in named:
+        named.append(shape)
+    if named.index(shape):
+        name = '{name}.{number}'.format(name=name, number=named.index(shape))
+
+    return name
+
+
+def get_shape(template):
+    """Get the shape of a template, which identifies what each of its slots are.
+
+    Each slot is identified by its leading literal, without a trailing version,
+    so that `py{36,37}-django30-{redis,memcached}` has the same shape as
+    `py37-django{20,21}-{redis,mysql}`, i.e., `('py', 'django', '')`.
+
+    Args:
+        template: The `EnvTemplate`, which should have fixed slots.
+
+    Returns:
+        The tuple of slot names.
+    """
+    return tuple(VERSION_PATTERN.sub('', parts[0][0]) for parts in template.slot_parts)
+
+
+def limit_axes(axes):
+    return OrderedDict(
+        (name, values) for name, values in axes.items()
+        if len(values) <= MAX_AXIS_VALUES
+    )
+
+
+class FactorMatrix(object):
+    """A columnar matrix of envs by their factor axes.
+
+    Each axis is a column, which holds a small integer code per env. The codes
+    number the axis values from 1, while 0 marks envs without a value for the
+    axis (e.g., `lint`). Envs are coded by looking up each of their factors, so
+    envs that are not generated by a template (e.g., section envs) are coded as
+    well. A factor that belongs to several axes is coded for the first one.
+
+    Columns are stored as bytes, so selections are computed a column at a time
+    by translating codes to a bit per env, and combining the bits with integer
+    operations, rather than by comparing each env's factors.
+
+        >>> matrix = FactorMatrix(env_names, axes)
+        >>> matrix.select(['py37'], exclude=['redis'])
+        ['py37-django20-memcached', 'py37-django21-memcached']
+
+        >>> matrix.group_by('django', ['py37'])
+        OrderedDict([('django20', ['py37-django20-redis', ...]), ...])
+
+    Args:
+        env_names: The list of env names.
+        axes: The ordered mapping of axis names to their values. See `infer_axes`.
+
+    Attributes:
+        env_names: The list of env names, which are the matrix rows.
+        axes: The ordered mapping of axis names to their tuples of values. A
+            value's code is its index in the tuple, plus one.
+        columns: The ordered mapping of axis names to their `bytearray` of codes,
+            with one code per env.
+    """
+
+    def __init__(self, env_names, axes):
+        self.env_names = list(env_names)
+        self.axes = OrderedDict((name, tuple(values)) for name, values in axes.items())
+
+        self.codes = {}
+        for name, values in self.axes.items():
+            for code, value in enumerate(values, 1):
+                self.codes.setdefault(value, (name, code))
+
+        self.columns = OrderedDict(
+            (name, bytearray(len(self.env_names))) for name in self.axes
+        )
+        for position, env_name in enumerate(self.env_names):
+            for factor in decompose(env_name):
+                if factor in self.codes:
+                    name, code = self.codes[factor]
+                    self.columns[name][position] = code
+
+    def __len__(self):
+        return len(self.env_names)
+
+    def axis_of(self, factor):
+        """Get the axis of a factor.
+
+        Args:
+            factor: The factor, which should be an axis value.
+
+        Returns:
+            The axis name.
+
+        Raises:
+            ValueError: If the factor isn't a value of any axis.
+        """
+        try:
+            return self.codes[factor][0]
+        except KeyError:
+            raise ValueError(
+                '{factor!r} is not a value of any axis.'.format(factor=factor))
+
+    def row(self, env_name):
+        """Get the axis values of an env.
+
+        Args:
+            env_name: The env name.
+
+        Returns:
+            The ordered mapping of axis names to the env's values. Axes that the
+            env doesn't have a value for are omitted.
+        """
+        position = self.env_names.index(env_name)
+
+        return OrderedDict(
+            (name, self.axes[name][column[position] - 1])
+            for name, column in self.columns.items() if column[position]
+        )
+
+    def mask(self, factors):
+        """Get the bitmask of the envs that have any of the given axis values.
+
+        Args:
+            factors: The list of factors, which should all be axis values.
+
+        Returns:
+            The bitmask, as an integer with one byte per env (0 or 1), where the
+            first env is the most significant byte.
+        """
+        tables = OrderedDict()
+        for factor in factors:
+            name = self.axis_of(factor)
+            tables.setdefault(name, bytearray(256))[self.codes[factor][1]] = 1
+
+        mask = 0
+        for name, table in tables.items():
+            mask |= self._to_int(self.columns[name].translate(bytes(table)))
+
+        return mask
+
+    def select(self, factors=(), exclude=()):
+        """Select the envs by their axis values.
+
+        Factors of the same axis are alternatives, while each axis of the given
+        factors must be matched. e.g., `['py36', 'py37', 'redis']` selects the
+        envs with either python version that use redis. Envs with any of the
+        excluded values are not selected.
+
+        Args:
+            factors: The list of required factors, which should be axis values.
+                If empty, all envs are selected, before exclusions.
+            exclude: The list of excluded factors, which should be axis values.
+
+        Returns:
+            The list of selected env names, in matrix order.
+        """
+        return self._select(self._get_mask(factors, exclude))
+
+    def group_by(self, axis, factors=(), exclude=()):
+        """Group the selected envs by their value of the given axis.
+
+        Args:
+            axis: The axis name.
+            factors: The list of required factors. See `select`.
+            exclude: The list of excluded factors. See `select`.
+
+        Returns:
+            The ordered mapping of the axis values to their selected env names.
+            Envs without a value for the axis are not included.
+        """
+        mask = self._get_mask(factors, exclude)
+
+        return OrderedDict(
+            (value, self._select(mask & self.mask([value])))
+            for value in self.axes[axis]
+        )
+
+    def _get_mask(self, factors, exclude):
+        mask = self._to_int(bytearray(b'\x01') * len(self.env_names))
+
+        factors_by_axis = OrderedDict()
+        for factor in factors:
+            factors_by_axis.setdefault(self.axis_of(factor), []).append(factor)
+
+        for axis_factors in factors_by_axis.values():
+            mask &= self.mask(axis_factors)
+
+        if exclude:
+            mask &= ~self.mask(exclude)
+
+        return mask
+
+    def _select(self, mask):
+        size = len(self.env_names)
+        if not size:
+            return []
+
+        selected = bytearray(binascii.unhexlify('{mask:0{width}x}'.format(
+            mask=mask, width=size * 2)))
+
+        return list(itertools.compress(self.env_names, selected))
+
+    @staticmethod
+    def _to_int(mask):
+        return int(binascii.hexlify(mask), 16) if mask else 0
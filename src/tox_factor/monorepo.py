@@ -0,0 +1,148 @@
+import argparse
+import json
+import multiprocessing
+import os
+import re
+import sys
+from collections import OrderedDict
+
+# The config files that tox reads, in order of precedence.
+TOX_INI = 'tox.ini'
+SETUP_CFG = 'setup.cfg'
+
+# setup.cfg files are only tox configs if they have a `[tox:tox]` section.
+SETUP_CFG_SECTION = re.compile(r'^\[tox:tox\]\s*$', re.MULTILINE)
+
+
+def find_configs(root):
+    """Find the tox configs in the directory tree.
+
+    As with tox, a directory's `tox.ini` takes precedence over its `setup.cfg`,
+    which is only a tox config if it has a `[tox:tox]` section. Hidden
+    directories (e.g., `.git` or `.tox`) are not searched.
+
+    Args:
+        root: The root directory of the tree.
+
+    Returns:
+        The sorted list of config paths.
+    """
+    configs = []
+
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [name for name in dirnames if not name.startswith('.')]
+
+        setup_cfg = os.path.join(dirpath, SETUP_CFG)
+        if TOX_INI in filenames:
+            configs.append(os.path.join(dirpath, TOX_INI))
+        elif SETUP_CFG in filenames and is_tox_setup_cfg(setup_cfg):
+            configs.append(setup_cfg)
+
+    return sorted(configs)
+
+
+def is_tox_setup_cfg(path):
+    try:
+        with open(path) as setup_cfg:
+            return SETUP_CFG_SECTION.search(setup_cfg.read()) is not None
+    except EnvironmentError:
+        return False
+
+
+def resolve_config(task):
+    """Get the env names of a tox config that match the factors.
+
+    The declared envs are cached in the config's default tox work dir, as with
+    the plugin. Errors reading the config are returned, rather than raised, so
+    that one broken config doesn't prevent resolving the others.
+
+    Args:
+        task: A tuple of the config path and the list of normalized factors.
+
+    Returns:
+        The config's result, with either the matched `envs` or an `error`.
+    """
+    from py.iniconfig import IniConfig, ParseError
+
+    from .factor import get_envlist
+
+    path, factors = task
+    config_dir = os.path.dirname(os.path.abspath(path))
+    cache_dir = os.path.join(config_dir, '.tox', '.tox-factor')
+
+    try:
+        return {'envs': get_envlist(IniConfig(path), factors, cache_dir=cache_dir)}
+    except (ParseError, EnvironmentError) as exception:
+        return {'error': str(exception)}
+
+
+def resolve_configs(configs, factors, processes=None):
+    """Get the env names of each tox config that match the factors.
+
+    The configs are resolved concurrently by a pool of worker processes, within
+    a single call. A single config is resolved in the current process, as the
+    pool wouldn't pay for itself. e.g.,
+
+        >>> resolve_configs(find_configs('.'), ['py37'])
+        OrderedDict([
+            ('./api/tox.ini', {'envs': ['py37-django20', 'py37-django21']}),
+            ('./cli/setup.cfg', {'envs': ['py37']}),
+            ('./web/tox.ini', {'error': '...'}),
+        ])
+
+    As with `tox -x`, if only excluded factors are given, they're applied to the
+    default envlist of each config. See `tox_factor.factor.FactorIndex`.
+
+    Args:
+        configs: The list of config paths. See `find_configs`.
+        factors: The list of factor arguments, which may be comma-separated
+            lists of factors. See `tox_factor.hooks.normalize_factors`.
+        processes: The number of worker processes. This defaults to the
+            number of CPUs, but is never more than the number of configs.
+
+    Returns:
+        The ordered mapping of the config paths to their results, in the order
+        of the configs. See `resolve_config`.
+    """
+    from .hooks import normalize_factors
+
+    factors = normalize_factors(factors)
+    tasks = [(config, factors) for config in configs]
+
+    processes = min(processes or multiprocessing.cpu_count(), len(tasks))
+    if processes <= 1:
+        return OrderedDict(zip(configs, map(resolve_config, tasks)))
+
+    pool = multiprocessing.Pool(processes)
+    try:
+        results = pool.map(resolve_config, tasks, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+
+    return OrderedDict(zip(configs, results))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m tox_factor.monorepo',
+        description='Resolve the envs that match factors, for each of the tox '
+                    'configs in a directory tree, as JSON.')
+    parser.add_argument(
+        'root', nargs='?', default='.',
+        help='the root directory to search for tox configs (default: .).')
+    parser.add_argument(
+        '-f', '--factor', action='append', default=[],
+        help='the factors to match (as with tox -f).')
+    parser.add_argument(
+        '-j', '--processes', type=int,
+        help='the number of worker processes (default: the number of CPUs).')
+    args = parser.parse_args(argv)
+
+    results = resolve_configs(find_configs(args.root), args.factor, args.processes)
+
+    sys.stdout.write(json.dumps(results, indent=2) + '\n')
+
+
+if __name__ == '__main__':  # pragma: no cover
+    main()
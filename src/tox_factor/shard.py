@@ -0,0 +1,150 @@
+import argparse
+import heapq
+import json
+import numbers
+
+import tox
+
+
+def parse_shard(spec):
+    """Parse a shard spec of the form 'i/N' into its index and count.
+
+    Shards are numbered from 1 to N. e.g.,
+
+        >>> parse_shard('2/3')
+        (2, 3)
+
+    Args:
+        spec: The shard spec string.
+
+    Returns:
+        A tuple of the shard index and the shard count.
+
+    Raises:
+        ArgumentTypeError: If the spec is malformed.
+    """
+    try:
+        index, count = [int(part) for part in spec.split('/')]
+    except ValueError:
+        index, count = 0, 0
+
+    if not 1 <= index <= count:
+        raise argparse.ArgumentTypeError(
+            'invalid shard {spec!r}, expected i/N with 1 <= i <= N.'
+            .format(spec=spec))
+
+    return index, count
+
+
+def load_durations(path):
+    """Load the per-env durations from a JSON file.
+
+    The file should contain a JSON object, mapping env names to durations.
+    Durations are non-negative numbers, in any unit.
+
+    Args:
+        path: The path of the durations file.
+
+    Returns:
+        The mapping of env names to their durations.
+
+    Raises:
+        ConfigError: If the file can't be read, or isn't a valid mapping of env
+            names to durations.
+    """
+    try:
+        with open(path) as durations_file:
+            durations = json.load(durations_file)
+    except (EnvironmentError, ValueError) as exception:
+        raise tox.exception.ConfigError(
+            'could not load the durations from {path!r}: {error}'
+            .format(path=path, error=exception))
+
+    if not isinstance(durations, dict):
+        raise tox.exception.ConfigError(
+            'expected the durations in {path!r} to be a JSON object, got {type}'
+            .format(path=path, type=type(durations).__name__))
+
+    for name, duration in sorted(durations.items()):
+        if not is_duration(duration):
+            raise tox.exception.ConfigError(
+                'expected the duration of {name!r} in {path!r} to be a '
+                'non-negative number, got {duration!r}'
+                .format(name=name, path=path, duration=duration))
+
+    return durations
+
+
+def is_duration(value):
+    # bool is a subclass of int, but isn't a duration.
+    if isinstance(value, bool) or not isinstance(value, numbers.Real):
+        return False
+
+    return value >= 0
+
+
+def get_weights(env_names, durations):
+    """Get the weight of each env, from its duration.
+
+    Envs without a known duration are weighted with the mean of the known
+    durations, or 1 if no durations are known.
+
+    Args:
+        env_names: The list of env names.
+        durations: The mapping of env names to their durations.
+
+    Returns:
+        The mapping of env names to their weights.
+    """
+    known = [durations[name] for name in env_names if name in durations]
+    default = float(sum(known)) / len(known) if known else 1.0
+
+    return dict((name, durations.get(name, default)) for name in env_names)
+
+
+def assign_shards(env_names, count, durations=None):
+    """Assign each env to one of several shards, balancing their total duration.
+
+    Envs are assigned longest-first to the shard with the least total duration.
+    Envs are weighted as per `get_weights`, so without any durations, the shards
+    are balanced by env count.
+    Ties are broken by env name and shard number, so the assignment is stable
+    for a given set of envs and durations, regardless of the envs' order.
+
+    Args:
+        env_names: The list of env names to assign.
+        count: The number of shards.
+        durations: The optional mapping of env names to their durations.
+
+    Returns:
+        The mapping of env names to shard indexes, numbered from 1.
+    """
+    weights = get_weights(env_names, durations or {})
+    shards = [(0.0, shard) for shard in range(1, count + 1)]
+    assignments = {}
+
+    for name in sorted(weights, key=lambda name: (-weights[name], name)):
+        total, shard = heapq.heappop(shards)
+        heapq.heappush(shards, (total + weights[name], shard))
+        assignments[name] = shard
+
+    return assignments
+
+
+def select_shard(env_names, index, count, durations=None):
+    """Get the env names assigned to the given shard.
+
+    See `assign_shards` for details on how envs are assigned.
+
+    Args:
+        env_names: The list of env names.
+        index: The shard index, numbered from 1.
+        count: The number of shards.
+        durations: The optional mapping of env names to their durations.
+
+    Returns:
+        The list of env names in the shard, in their original order.
+    """
+    assignments = assign_shards(env_names, count, durations)
+
+    return [name for name in env_names if assignments[name] == index]
@@ -6,8 +6,10 @@ from textwrap import dedent
 from unittest import TestCase
 
 from py.iniconfig import IniConfig
+from tox.config import parseconfig
 
 from tox_factor.compat import TOX_PARALLEL_ENV
+from tox_factor.worker import FORK_AVAILABLE, get_pool
 
 
 class ToxTestCase(TestCase):
@@ -20,6 +22,17 @@ class ToxTestCase(TestCase):
     the config, and `.tox_envlist()`, which is useful for testing the expected
     env list.
 
+    By default, `.tox_envlist()` calls `tox -l` in a subprocess. When setting
+    `in_process`, the config is instead parsed in the test process by tox's
+    config API (with the installed plugin hooks active), which avoids the cost
+    of starting tox for every call. The same test cases can run in either mode
+    by subclassing the test case and setting `in_process`.
+
+    Calls to tox are served by a shared pool of warm tox worker processes (see
+    `tox_factor.worker.WorkerPool`), which avoids the cost of starting tox in a
+    new interpreter for every call. This may be disabled with `use_workers`, and
+    is not available on Windows.
+
     Note that the test case doesn't change the working directory or environment.
 
     Attributes:
@@ -35,6 +48,10 @@ class ToxTestCase(TestCase):
             module.
         setup_filepath: The full path of the temporary setup module. This is
             generated during the test case class setup.
+        in_process: Whether `.tox_envlist()` parses the tox config in-process,
+            instead of calling tox in a subprocess. This defaults to `False`.
+        use_workers: Whether tox calls are served by the shared worker pool.
+            This defaults to `True` on platforms that support forking.
     """
 
     ini_contents = None
@@ -42,6 +59,10 @@ class ToxTestCase(TestCase):
 
     setup_contents = None
 
+    in_process = False
+
+    use_workers = FORK_AVAILABLE
+
     @classmethod
     def setUpClass(cls):
         super(ToxTestCase, cls).setUpClass()
@@ -80,6 +101,9 @@ class ToxTestCase(TestCase):
         env = os.environ.copy()
         env.pop(TOX_PARALLEL_ENV, None)
 
+        if self.use_workers and arguments[:1] == ['tox']:
+            return get_pool().call(arguments[1:], env)
+
         proc = subprocess.Popen(
             arguments, stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env)
         stdout, stderr = proc.communicate()
@@ -91,8 +115,24 @@ class ToxTestCase(TestCase):
 
         return self._tox_call(base + arguments)
 
+    def tox_config(self, arguments=None):
+        arguments = arguments if arguments else []
+
+        # As with `_tox_call`, the config is parsed without TOX_PARALLEL_ENV.
+        parallel_env = os.environ.pop(TOX_PARALLEL_ENV, None)
+        try:
+            return parseconfig(['-c', self.ini_filepath] + arguments)
+        finally:
+            if parallel_env is not None:
+                os.environ[TOX_PARALLEL_ENV] = parallel_env
+
     def tox_envlist(self, arguments=None):
         arguments = arguments if arguments else []
+
+        if self.in_process:
+            # `tox -l` lists the default envlist
+            return list(self.tox_config(['-l'] + arguments).envlist_default)
+
         returncode, stdout, stderr = self.tox_call(['-l'] + arguments)
 
         self.assertEqual(returncode, 0, stderr)
@@ -0,0 +1,117 @@
+import json
+from collections import OrderedDict
+from contextlib import contextmanager
+from timeit import default_timer
+
+FORMATS = ('text', 'json')
+
+# The timer of the active profile, if any. See `profile`.
+active_timer = None
+
+
+class Timer(object):
+    """Accumulates the wall time and counts recorded during factor resolution.
+
+    Attributes:
+        timings: The mapping of stage names to their total wall time, in seconds.
+        counts: The mapping of count names to their values.
+    """
+
+    def __init__(self):
+        self.timings = OrderedDict()
+        self.counts = OrderedDict()
+
+    @contextmanager
+    def time(self, name):
+        start = default_timer()
+        try:
+            yield
+        finally:
+            elapsed = default_timer() - start
+            self.timings[name] = self.timings.get(name, 0) + elapsed
+
+    def count(self, name, value):
+        self.counts[name] = value
+
+    def report(self, fmt='text'):
+        """Format the recorded timings and counts.
+
+        Args:
+            fmt: The report format, either 'text' or 'json'.
+
+        Returns:
+            The formatted report.
+        """
+        if fmt == 'json':
+            return json.dumps({
+                'timings': self.timings,
+                'counts': self.counts,
+            }) + '\n'
+
+        width = max([len(name) for name in list(self.timings) + list(self.counts)] + [0])
+        lines = ['tox-factor timing:']
+        lines.extend(
+            '  {name:<{width}}  {value:.3f}ms'.format(
+                name=name, width=width, value=value * 1000)
+            for name, value in self.timings.items()
+        )
+        lines.extend(
+            '  {name:<{width}}  {value}'.format(name=name, width=width, value=value)
+            for name, value in self.counts.items()
+        )
+
+        return '\n'.join(lines) + '\n'
+
+
+@contextmanager
+def profile(enabled=True):
+    """Activate a `Timer` for the duration of the context.
+
+    While active, calls to `timed` and `record` are recorded by the timer.
+
+    Args:
+        enabled: Whether to activate the timer. If disabled, `None` is yielded.
+
+    Yields:
+        The active `Timer`, or `None` if not enabled.
+    """
+    global active_timer
+
+    if not enabled:
+        yield None
+        return
+
+    previous, active_timer = active_timer, Timer()
+    try:
+        yield active_timer
+    finally:
+        active_timer = previous
+
+
+@contextmanager
+def timed(name):
+    """Time the context with the active timer, if any.
+
+    Args:
+        name: The name of the timed stage.
+
+    Yields:
+        Nothing.
+    """
+    if active_timer is None:
+        yield
+        return
+
+    with active_timer.time(name):
+        yield
+
+
+def record(name, value):
+    """Record a count with the active timer, if any.
+
+    Args:
+        name: The name of the count.
+        value: The count value.
+    """
+    if active_timer is not None:
+        active_timer.count(name, value)
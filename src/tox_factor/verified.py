@@ -0,0 +1,322 @@
+import hashlib
+import json
+import os
+import subprocess
+
+from .compat import makedirs
+
+# The env config attributes that affect the outcome of an env's run. Missing
+# attributes (e.g., of other tox versions) are ignored.
+ENV_ATTRIBUTES = (
+    'basepython', 'deps', 'commands_pre', 'commands', 'commands_post', 'changedir',
+    'extras', 'install_command', 'usedevelop', 'skip_install', 'pip_pre',
+    'sitepackages', 'alwayscopy', 'platform', 'ignore_errors', 'ignore_outcome',
+    'whitelist_externals', 'allowlist_externals',
+)
+
+# The prefix of tox's own environment variables, which tox sets while running.
+TOX_PREFIX = 'TOX_'
+
+# The memoized source digests, by directory. See `get_source_digest`.
+source_digests = {}
+
+
+def get_verified_path(cache_dir):
+    """Get the path of the database of passed env runs.
+
+    Args:
+        cache_dir: The plugin's cache directory. See `tox_factor.cache`.
+
+    Returns:
+        The database path.
+    """
+    return os.path.join(cache_dir, 'verified.sqlite')
+
+
+def get_fingerprints(config, env_names, memoized=True):
+    """Get the fingerprints of the inputs of the envs.
+
+    See `get_env_fingerprint` for the inputs of an env. The sources are those
+    under the tox config's directory. See `get_source_digest`.
+
+    Args:
+        config: The tox config.
+        env_names: The list of env names.
+        memoized: Whether the memoized source digest may be used. See
+            `get_source_digest`.
+
+    Returns:
+        The mapping of env names to their fingerprints, or `None` if the sources
+        can't be fingerprinted (e.g., outside of a git repository). Envs without
+        an env config are not included.
+    """
+    toxinidir = str(config.toxinidir)
+    workdir = os.path.relpath(str(config.toxworkdir), toxinidir)
+
+    source_digest = get_source_digest(toxinidir, exclude=workdir, memoized=memoized)
+    if source_digest is None:
+        return None
+
+    return dict(
+        (name, get_env_fingerprint(config.envconfigs[name], source_digest))
+        for name in env_names if name in config.envconfigs
+    )
+
+
+def get_env_fingerprint(envconfig, source_digest):
+    """Get the fingerprint of the inputs of an env's run.
+
+    The inputs are the env's config (see `ENV_ATTRIBUTES`), its resolved
+    `setenv` values, the values of its `passenv` variables, and the sources.
+    The `PYTHONHASHSEED` chosen by tox is not included, as it's random for
+    each run by default, and neither are tox's own `TOX_*` variables.
+
+    Note that tox rewrites the commands of an env when running them, so the
+    fingerprint must be taken before the env's run. See `VerifiedRecorder`.
+
+    Args:
+        envconfig: The tox env config.
+        source_digest: The digest of the sources. See `get_source_digest`.
+
+    Returns:
+        The fingerprint.
+    """
+    hashseed = envconfig.config.hashseed
+    setenv = dict(
+        (name, value) for name, value in envconfig.setenv.items()
+        if not (name == 'PYTHONHASHSEED' and value == hashseed)
+    )
+    passenv = dict(
+        (name, os.environ.get(name)) for name in envconfig.passenv
+        if not name.startswith(TOX_PREFIX)
+    )
+
+    attributes = dict(
+        (name, getattr(envconfig, name)) for name in ENV_ATTRIBUTES
+        if hasattr(envconfig, name)
+    )
+
+    digest = hashlib.sha1()
+    digest.update(json.dumps(
+        [envconfig.envname, attributes, setenv, passenv, source_digest],
+        sort_keys=True, default=str,
+    ).encode('utf-8'))
+
+    return digest.hexdigest()
+
+
+def get_source_digest(cwd, exclude=None, memoized=True):
+    """Get the digest of the source files under the directory.
+
+    The sources are the files that are tracked by git, along with the untracked
+    files that aren't ignored. Tracked files are identified by git's hashes of
+    their contents, and only the files that were changed since they were staged,
+    and the untracked files, are hashed here. Digests are memoized by directory,
+    so that the sources are only hashed once per process, unless the sources may
+    have changed since (e.g., by the runs of earlier envs).
+
+    Args:
+        cwd: The directory of the sources.
+        exclude: The optional path (relative to the directory) of files that
+            are never sources, e.g., the tox work dir.
+        memoized: Whether the memoized digest may be used. Otherwise, the sources
+            are hashed again, and the memoized digest is updated.
+
+    Returns:
+        The hex digest string, or `None` if git fails (e.g., if the directory
+        isn't in a git repository).
+    """
+    key = (cwd, exclude)
+    if not memoized or key not in source_digests:
+        try:
+            source_digests[key] = hash_sources(cwd, exclude)
+        except (subprocess.CalledProcessError, EnvironmentError):
+            source_digests[key] = None
+
+    return source_digests[key]
+
+
+def hash_sources(cwd, exclude):
+    hashes = {}
+    for entry in git(['ls-files', '--stage', '-z'], cwd):
+        # Each entry is: <mode> <object> <stage>\t<path>
+        info, path = entry.split('\t', 1)
+        hashes[path] = info.split(' ')[1]
+
+    changed = git(['ls-files', '--modified', '-z'], cwd)
+    untracked = git(['ls-files', '--others', '--exclude-standard', '-z'], cwd)
+    for path in changed + untracked:
+        hashes[path] = hash_file(os.path.join(cwd, path))
+
+    if exclude is not None:
+        prefix = os.path.join(exclude, '')
+        hashes = dict(
+            (path, value) for path, value in hashes.items()
+            if not path.startswith(prefix)
+        )
+
+    digest = hashlib.sha1()
+    for path in sorted(hashes):
+        entry = '{path}\0{value}\0'.format(path=path, value=hashes[path])
+        digest.update(entry.encode('utf-8'))
+
+    return digest.hexdigest()
+
+
+def hash_file(path):
+    # The same hash as git's, so that unchanged files match their staged hash.
+    try:
+        with open(path, 'rb') as source:
+            contents = source.read()
+    except EnvironmentError:
+        return 'missing'
+
+    digest = hashlib.sha1('blob {size}\0'.format(size=len(contents)).encode('utf-8'))
+    digest.update(contents)
+
+    return digest.hexdigest()
+
+
+def git(args, cwd):
+    output = subprocess.check_output(['git'] + args, cwd=cwd, stderr=subprocess.STDOUT)
+
+    return [path for path in output.decode('utf-8').split('\0') if path]
+
+
+class VerifiedRuns(object):
+    """A local store of the input fingerprints of passed env runs, backed by SQLite.
+
+    Only the latest run of each env is kept, so an env that failed since it
+    passed is no longer verified.
+
+    Args:
+        path: The path of the SQLite database.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def connect(self):
+        import sqlite3
+
+        cache_dir = os.path.dirname(self.path)
+        makedirs(cache_dir)
+
+        connection = sqlite3.connect(self.path, timeout=30)
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS verified ('
+            '    env TEXT PRIMARY KEY,'
+            '    fingerprint TEXT NOT NULL'
+            ')')
+
+        return connection
+
+    def record(self, env_name, fingerprint):
+        """Record that an env run passed.
+
+        Args:
+            env_name: The env name.
+            fingerprint: The fingerprint of the run's inputs.
+        """
+        connection = self.connect()
+        try:
+            with connection:
+                connection.execute(
+                    'INSERT OR REPLACE INTO verified (env, fingerprint) VALUES (?, ?)',
+                    (env_name, fingerprint))
+        finally:
+            connection.close()
+
+    def forget(self, env_name):
+        """Forget the passed run of an env, e.g., as its latest run failed.
+
+        Args:
+            env_name: The env name.
+        """
+        if not os.path.exists(self.path):
+            return
+
+        connection = self.connect()
+        try:
+            with connection:
+                connection.execute('DELETE FROM verified WHERE env = ?', (env_name,))
+        finally:
+            connection.close()
+
+    def fingerprints(self):
+        """Get the input fingerprints of the passed env runs.
+
+        Returns:
+            The mapping of env names to their fingerprints. This is empty if no
+            runs have been recorded.
+        """
+        if not os.path.exists(self.path):
+            return {}
+
+        connection = self.connect()
+        try:
+            return dict(connection.execute('SELECT env, fingerprint FROM verified'))
+        finally:
+            connection.close()
+
+
+class VerifiedRecorder(object):
+    """Records the passed env runs, by the fingerprint of their inputs.
+
+    The fingerprint is taken when the env's run starts, as the sources and env
+    config may be changed by the run itself. The sources are hashed again for
+    each env, as the runs of earlier envs may have changed them since the config
+    was loaded. Errors writing to the database are ignored, so they never fail
+    a tox run.
+    """
+
+    def __init__(self):
+        self.started = {}
+
+    def start(self, config, env_name):
+        fingerprints = get_fingerprints(config, [env_name], memoized=False) or {}
+        self.started[env_name] = fingerprints.get(env_name)
+
+    def stop(self, env_name, passed, runs):
+        import sqlite3
+
+        fingerprint = self.started.pop(env_name, None)
+
+        try:
+            if not passed:
+                # The env is no longer verified, even if the run wasn't recorded.
+                runs.forget(env_name)
+            elif fingerprint is not None:
+                runs.record(env_name, fingerprint)
+        except (sqlite3.Error, EnvironmentError):
+            pass
+
+
+# Records the passed runs of the envs, for `--factor-skip-verified`.
+verified_recorder = VerifiedRecorder()
+
+
+def split_verified(env_names, fingerprints, verified):
+    """Split the envs into those that need to run, and those already verified.
+
+    An env is verified if its latest run passed with the same input fingerprint.
+
+    Args:
+        env_names: The list of env names.
+        fingerprints: The mapping of env names to their current fingerprints.
+        verified: The mapping of env names to the fingerprints of their passed
+            runs. See `VerifiedRuns.fingerprints`.
+
+    Returns:
+        A tuple of the list of envs to run, and the list of verified envs, both
+        in the order of the env names.
+    """
+    unverified, skipped = [], []
+    for name in env_names:
+        fingerprint = fingerprints.get(name)
+        if fingerprint is not None and verified.get(name) == fingerprint:
+            skipped.append(name)
+        else:
+            unverified.append(name)
+
+    return unverified, skipped
@@ -0,0 +1,258 @@
+import hashlib
+import json
+import os
+import uuid
+from collections import OrderedDict
+
+import tox
+from filelock import FileLock
+from packaging.requirements import InvalidRequirement, Requirement
+
+from .compat import makedirs
+
+# The operators of the specifiers that pin a requirement to a single version.
+PIN_OPERATORS = ('==', '===')
+
+# Identifies the current tox run. The main tox process sets it, and the
+# subprocesses of a parallel run inherit it. See `get_run_id`.
+RUN_ID_ENV = 'TOXFACTOR_RUN_ID'
+
+# The wheelhouse build states. See `build_wheelhouse`.
+COMPLETE = 'complete'
+FAILED = 'failed'
+
+
+def get_wheelhouse_dir(cache_dir, fingerprint):
+    """Get the wheelhouse directory for an install fingerprint.
+
+    Args:
+        cache_dir: The plugin's cache directory. See `tox_factor.cache`.
+        fingerprint: The install fingerprint.
+
+    Returns:
+        The wheelhouse directory path.
+    """
+    return os.path.join(cache_dir, 'wheelhouse', fingerprint)
+
+
+def get_install_fingerprint(envconfig):
+    """Get the fingerprint of the dependencies that an env installs.
+
+    Envs with the same fingerprint install the same dependencies with the same
+    interpreter and options, and can therefore share a wheelhouse. The contents
+    of referenced requirements files are included in the fingerprint.
+
+    Only envs whose dependencies are all pinned to a version (e.g., `six==1.12`)
+    are fingerprinted. The wheels of other dependencies (e.g., unpinned, local
+    path, editable, or VCS dependencies) could become stale, as a wheelhouse is
+    reused across runs.
+
+    Args:
+        envconfig: The tox env config.
+
+    Returns:
+        The fingerprint, or `None` if the env has no dependencies, if any of its
+        dependencies aren't pinned, or if any use a custom index server.
+    """
+    deps = envconfig.deps
+    if not deps or any(dep.indexserver is not None for dep in deps):
+        return None
+
+    config = envconfig.config
+    digest = hashlib.sha1()
+    digest.update(json.dumps([
+        envconfig.basepython,
+        bool(envconfig.pip_pre),
+        config.indexserver['default'].url,
+        sorted(dep.name for dep in deps),
+    ]).encode('utf-8'))
+
+    for dep in deps:
+        if not dep.name.startswith('-r'):
+            if not is_pinned(dep.name):
+                return None
+            continue
+
+        requirements = os.path.join(str(config.toxinidir), dep.name[2:].strip())
+        try:
+            with open(requirements, 'rb') as requirements_file:
+                contents = requirements_file.read()
+        except EnvironmentError:
+            return None
+
+        if not all(map(is_pinned, iter_requirement_lines(contents))):
+            return None
+        digest.update(contents)
+
+    return digest.hexdigest()[:16]
+
+
+def is_pinned(requirement):
+    """Determine if a requirement is pinned to a single version.
+
+        >>> is_pinned('django[bcrypt]==2.2; python_version >= "3"')
+        True
+
+        >>> is_pinned('django>=2.2')
+        False
+
+    Args:
+        requirement: The requirement string.
+
+    Returns:
+        Whether the requirement is pinned. Options (e.g., `-e`), local paths,
+        and URLs are never pinned.
+    """
+    if requirement.startswith('-'):
+        return False
+
+    try:
+        requirement = Requirement(requirement)
+    except InvalidRequirement:
+        return False
+
+    specifiers = list(requirement.specifier)
+
+    return requirement.url is None and len(specifiers) == 1 and (
+        specifiers[0].operator in PIN_OPERATORS and '*' not in specifiers[0].version
+    )
+
+
+def iter_requirement_lines(contents):
+    # Continued lines (e.g., with hashes) are yielded as-is, and aren't pinned.
+    for line in contents.decode('utf-8', 'replace').splitlines():
+        line = line.split(' #', 1)[0].strip()
+        if line and not line.startswith('#'):
+            yield line
+
+
+def group_envs(config, env_names):
+    """Group envs by their install fingerprint.
+
+    See `get_install_fingerprint` for more details.
+
+    Args:
+        config: The tox config.
+        env_names: The list of env names to group.
+
+    Returns:
+        The ordered mapping of fingerprints to their env names. Envs without a
+        fingerprint are not included.
+    """
+    groups = OrderedDict()
+    for name in env_names:
+        fingerprint = get_install_fingerprint(config.envconfigs[name])
+        if fingerprint is not None:
+            groups.setdefault(fingerprint, []).append(name)
+
+    return groups
+
+
+def get_run_id():
+    """Get the id of the current tox run, which is shared with its subprocesses.
+
+    Returns:
+        The run id.
+    """
+    if RUN_ID_ENV not in os.environ:
+        os.environ[RUN_ID_ENV] = uuid.uuid4().hex
+
+    return os.environ[RUN_ID_ENV]
+
+
+def build_wheelhouse(venv, action, wheelhouse_dir):
+    """Build the wheels for an env's dependencies, if not already built.
+
+    The wheels are built once per wheelhouse, using the env's own interpreter.
+    A lock prevents the envs of a parallel run from building the same
+    wheelhouse concurrently. A failed build is not retried by the other envs
+    of the same run, but is retried by later runs. A complete wheelhouse is
+    rebuilt when the env is recreated (i.e., `tox -r`), once per run.
+
+    Args:
+        venv: The tox virtual env.
+        action: The tox action for the dependency install.
+        wheelhouse_dir: The wheelhouse directory path.
+
+    Returns:
+        Whether the wheelhouse is available.
+    """
+    makedirs(wheelhouse_dir)
+
+    run_id = get_run_id()
+    state_path = os.path.join(wheelhouse_dir, '.state')
+
+    with FileLock(os.path.join(wheelhouse_dir, '.lock')):
+        state = read_state(state_path)
+        if needs_build(state, run_id, venv.envconfig.recreate):
+            clear_wheels(wheelhouse_dir)
+
+            envconfig = venv.envconfig
+            args = [str(envconfig.envpython), '-m', 'pip', 'wheel', '-w', wheelhouse_dir]
+            args.extend(venv._installopts(envconfig.config.indexserver['default'].url))
+            args.extend(dep.name for dep in envconfig.deps)
+
+            try:
+                action.popen(args, cwd=envconfig.config.toxinidir)
+            except tox.exception.InvocationError:
+                state = {'status': FAILED, 'run': run_id}
+            else:
+                state = {'status': COMPLETE, 'run': run_id}
+
+            with open(state_path, 'w') as state_file:
+                json.dump(state, state_file)
+
+    return state['status'] == COMPLETE
+
+
+def read_state(path):
+    try:
+        with open(path) as state_file:
+            return json.load(state_file)
+    except (EnvironmentError, ValueError):
+        return None
+
+
+def needs_build(state, run_id, recreate):
+    if state is None or state.get('status') not in (COMPLETE, FAILED):
+        return True
+
+    # Each wheelhouse is built at most once per run.
+    if state.get('run') == run_id:
+        return False
+
+    return state['status'] == FAILED or recreate
+
+
+def clear_wheels(wheelhouse_dir):
+    for name in os.listdir(wheelhouse_dir):
+        if name.endswith('.whl'):
+            os.remove(os.path.join(wheelhouse_dir, name))
+
+
+def install_deps(venv, action, cache_dir):
+    """Install an env's dependencies from its shared wheelhouse.
+
+    Args:
+        venv: The tox virtual env.
+        action: The tox action for the dependency install.
+        cache_dir: The plugin's cache directory. See `tox_factor.cache`.
+
+    Returns:
+        `True` if the dependencies were installed, or `None` if the env can't
+        use a wheelhouse, which defers to tox's default install.
+    """
+    fingerprint = get_install_fingerprint(venv.envconfig)
+    if fingerprint is None:
+        return None
+
+    wheelhouse_dir = get_wheelhouse_dir(cache_dir, fingerprint)
+    if not build_wheelhouse(venv, action, wheelhouse_dir):
+        return None
+
+    deps = venv.get_resolved_dependencies()
+    action.setactivity('installdeps', ', '.join(map(str, deps)))
+    venv._install(deps, extraopts=['--no-index', '--find-links', wheelhouse_dir],
+                  action=action)
+
+    return True
@@ -0,0 +1,211 @@
+import atexit
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import traceback
+
+try:
+    import queue
+except ImportError:  # pragma: no cover
+    import Queue as queue
+
+FORK_AVAILABLE = hasattr(os, 'fork')
+
+
+def run_tox(args):
+    """Run tox with the given arguments, in the current process.
+
+    Args:
+        args: The tox arguments, excluding the `tox` command.
+
+    Returns:
+        The tox exit code.
+    """
+    import tox
+
+    try:
+        tox.cmdline(args)
+    except SystemExit as exception:
+        if exception.code is None:
+            return 0
+        if isinstance(exception.code, int):
+            return exception.code
+        sys.stderr.write('{code}\n'.format(code=exception.code))
+        return 1
+
+    return 0
+
+
+def fork_call(request):
+    """Run a tox call in a forked child process.
+
+    Args:
+        request: The call request, with the `args`, `env`, and `cwd` to use.
+
+    Returns:
+        The call response, with the `returncode`, `stdout`, and `stderr`.
+    """
+    stdout, stderr = tempfile.TemporaryFile(), tempfile.TemporaryFile()
+    sys.stdout.flush()
+    sys.stderr.flush()
+
+    pid = os.fork()
+    if pid == 0:  # pragma: no cover
+        code = 1
+        try:
+            os.dup2(stdout.fileno(), 1)
+            os.dup2(stderr.fileno(), 2)
+            os.chdir(request['cwd'])
+            os.environ.clear()
+            os.environ.update(request['env'])
+            code = run_tox(request['args'])
+        except Exception:
+            traceback.print_exc()
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(code)
+
+    _, status = os.waitpid(pid, 0)
+    if os.WIFEXITED(status):
+        returncode = os.WEXITSTATUS(status)
+    else:
+        returncode = -os.WTERMSIG(status)
+
+    response = {'returncode': returncode}
+    for name, output in [('stdout', stdout), ('stderr', stderr)]:
+        output.seek(0)
+        response[name] = output.read().decode('utf-8', 'replace')
+        output.close()
+
+    return response
+
+
+def serve(requests, responses):
+    """Serve tox call requests until the requests stream is closed.
+
+    Args:
+        requests: The file to read JSON requests from, one per line.
+        responses: The file to write JSON responses to, one per line.
+    """
+    import tox  # noqa: F401 (the import is what warms up the worker)
+
+    for line in iter(requests.readline, ''):
+        responses.write(json.dumps(fork_call(json.loads(line))) + '\n')
+        responses.flush()
+
+
+class Worker(object):
+    """A warm tox worker process. See `serve`."""
+
+    def __init__(self):
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', 'tox_factor.worker'],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            universal_newlines=True)
+
+    def call(self, args, env, cwd):
+        request = {'args': args, 'env': env, 'cwd': cwd}
+        self.process.stdin.write(json.dumps(request) + '\n')
+        self.process.stdin.flush()
+
+        line = self.process.stdout.readline()
+        if not line:
+            raise RuntimeError('The tox worker exited unexpectedly.')
+
+        return json.loads(line)
+
+    def close(self):
+        self.process.stdin.close()
+        self.process.wait()
+
+
+class WorkerPool(object):
+    """A thread-safe pool of warm tox workers, which are started on demand.
+
+    Each worker imports tox once, then serves tox calls over its stdin/stdout.
+    Every call is run in a child process forked from the worker, with its own
+    argv, environment, working directory, and captured output. Calls therefore
+    can't leak state into later calls, but skip the cost of starting the
+    interpreter and importing tox. Concurrent calls are served by separate
+    workers, so independent test classes may call tox concurrently.
+
+    Note that forking is not available on Windows. See `FORK_AVAILABLE`.
+    """
+
+    def __init__(self):
+        self.idle = queue.Queue()
+        self.workers = []
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            worker = Worker()
+            with self.lock:
+                self.workers.append(worker)
+            return worker
+
+    def call(self, args, env, cwd=None):
+        """Call tox with a worker of the pool.
+
+        Args:
+            args: The tox arguments, excluding the `tox` command.
+            env: The environment variables for the call.
+            cwd: The working directory for the call. This defaults to the
+                current working directory.
+
+        Returns:
+            A tuple of the return code, stdout, and stderr of the call.
+
+        Raises:
+            Exception: Any error communicating with the worker, which is then
+                removed from the pool.
+        """
+        worker = self.acquire()
+        try:
+            response = worker.call(list(args), dict(env), cwd or os.getcwd())
+        except Exception:
+            worker.close()
+            with self.lock:
+                self.workers.remove(worker)
+            raise
+
+        self.idle.put(worker)
+
+        return response['returncode'], response['stdout'], response['stderr']
+
+    def close(self):
+        with self.lock:
+            workers, self.workers = self.workers, []
+
+        for worker in workers:
+            worker.close()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Get the shared worker pool, which is closed on exit.
+
+    Returns:
+        The shared `WorkerPool`.
+    """
+    global _pool
+
+    with _pool_lock:
+        if _pool is None:
+            _pool = WorkerPool()
+            atexit.register(_pool.close)
+
+    return _pool
+
+
+if __name__ == '__main__':  # pragma: no cover
+    serve(sys.stdin, sys.stdout)
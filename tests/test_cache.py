@@ -0,0 +1,121 @@
+import mock
+import os
+from textwrap import dedent
+
+from py.iniconfig import IniConfig
+
+from tox_factor import cache
+from tox_factor.factor import collect_declared_envs, expand_entry
+from tox_factor.test import ToxTestCase
+
+
+class LoadDeclaredEnvsTests(ToxTestCase):
+    ini_contents = """
+    [tox]
+    envlist = py{36,37}-django{20,21}
+
+    [testenv:lint]
+    """
+
+    def setUp(self):
+        self.cache_dir = os.path.join(self._temp_dir, '.tox', '.tox-factor')
+        self.cache_path = cache.get_cache_path(self.cache_dir, self.ini_filepath)
+
+    def tearDown(self):
+        if os.path.exists(self.cache_path):
+            os.remove(self.cache_path)
+
+    def test_miss(self):
+        index = cache.load_declared_envs(self.config, self.cache_dir)
+
+        self.assertEqual(index.env_names, [
+            'py36-django20', 'py36-django21', 'py37-django20', 'py37-django21',
+            'lint',
+        ])
+        self.assertEqual(index.postings['py37'], [2, 3])
+        self.assertTrue(os.path.exists(self.cache_path))
+
+    def test_hit(self):
+        expected = cache.load_declared_envs(self.config, self.cache_dir)
+
+        with mock.patch('tox_factor.cache.IncrementalIndex') as incremental:
+            result = cache.load_declared_envs(self.config, self.cache_dir)
+
+        incremental.assert_not_called()
+        self.assertEqual(result.env_names, expected.env_names)
+        self.assertEqual(result.postings, expected.postings)
+        self.assertEqual(result.defaults, 4)
+        self.assertEqual(result.match(['django21-py37']), ['py37-django21'])
+
+    def test_invalidation(self):
+        cache.load_declared_envs(self.config, self.cache_dir)
+
+        with open(self.ini_filepath) as ini_file:
+            contents = ini_file.read()
+
+        try:
+            with open(self.ini_filepath, 'a') as ini_file:
+                ini_file.write('[testenv:isort]\n')
+
+            config = IniConfig(self.ini_filepath)
+            index = cache.load_declared_envs(config, self.cache_dir)
+        finally:
+            with open(self.ini_filepath, 'w') as ini_file:
+                ini_file.write(contents)
+
+        self.assertEqual(index.env_names[-2:], ['lint', 'isort'])
+
+    def test_changed_entries(self):
+        # Only the envlist entries that aren't in the cache are expanded.
+        cache.load_declared_envs(self.config, self.cache_dir)
+        contents = dedent(self.ini_contents).replace(
+            'envlist = py{36,37}-django{20,21}',
+            'envlist = py{36,37}-django{20,21}, py38-django{30,31}',
+        )
+        config = IniConfig(self.ini_filepath, data=contents)
+
+        patch = mock.patch('tox_factor.incremental.expand_entry', wraps=expand_entry)
+        with patch as expand:
+            index = cache.load_declared_envs(config, self.cache_dir)
+
+        expand.assert_called_once_with('py38-django{30,31}')
+        expected = collect_declared_envs(config).index()
+        self.assertEqual(index.env_names, expected.env_names)
+        self.assertEqual(index.postings, expected.postings)
+        self.assertEqual(index.defaults, expected.defaults)
+
+        # The updated segments are cached.
+        with mock.patch('tox_factor.cache.IncrementalIndex') as incremental:
+            result = cache.load_declared_envs(config, self.cache_dir)
+
+        incremental.assert_not_called()
+        self.assertEqual(result.env_names, expected.env_names)
+        self.assertEqual(result.postings, expected.postings)
+
+    def test_unrelated_change(self):
+        expected = cache.load_declared_envs(self.config, self.cache_dir)
+        contents = dedent(self.ini_contents) + 'commands = flake8\n'
+        config = IniConfig(self.ini_filepath, data=contents)
+
+        with mock.patch('tox_factor.cache.IncrementalIndex') as incremental:
+            result = cache.load_declared_envs(config, self.cache_dir)
+
+        incremental.assert_not_called()
+        self.assertEqual(result.env_names, expected.env_names)
+
+    def test_corrupt_cache(self):
+        if not os.path.isdir(self.cache_dir):
+            os.makedirs(self.cache_dir)
+
+        with open(self.cache_path, 'w') as cache_file:
+            cache_file.write('{invalid')
+
+        index = cache.load_declared_envs(self.config, self.cache_dir)
+
+        self.assertEqual(len(index), 5)
+
+    def test_missing_config(self):
+        config = IniConfig(os.path.join(self._temp_dir, 'missing.ini'), data='')
+        index = cache.load_declared_envs(config, self.cache_dir)
+
+        self.assertEqual(index.env_names, [])
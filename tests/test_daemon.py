@@ -0,0 +1,211 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+import tox
+
+from tox_factor import daemon
+
+
+class ResolverTestCase(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.ini_path = os.path.join(self.temp_dir, 'tox.ini')
+        self.write_config('py{36,37}-django{20,21}')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def write_config(self, envlist):
+        with open(self.ini_path, 'w') as ini_file:
+            ini_file.write('[tox]\nenvlist = {envlist}\n\n[testenv:lint]\n'.format(
+                envlist=envlist))
+
+
+class GetSocketPathTests(unittest.TestCase):
+    def test_per_config(self):
+        # Configs in the same dir have their own sockets.
+        tox_ini = daemon.get_socket_path('/project/tox.ini')
+        setup_cfg = daemon.get_socket_path('/project/setup.cfg')
+
+        self.assertNotEqual(tox_ini, setup_cfg)
+        self.assertEqual(os.path.dirname(tox_ini), '/project/.tox/.tox-factor')
+        self.assertEqual(os.path.dirname(setup_cfg), '/project/.tox/.tox-factor')
+
+    def test_relative(self):
+        self.assertEqual(
+            daemon.get_socket_path('tox.ini'),
+            daemon.get_socket_path(os.path.abspath('tox.ini')),
+        )
+
+
+class ResolverTests(ResolverTestCase):
+    def test_match(self):
+        resolver = daemon.Resolver(self.ini_path)
+
+        self.assertEqual(
+            resolver.match(['py37,lint', '!django21']),
+            ['py37-django20', 'lint'],
+        )
+
+    def test_only_excluded_factors(self):
+        # As with `tox -x`, the section envs aren't in the default envlist.
+        resolver = daemon.Resolver(self.ini_path)
+
+        self.assertEqual(resolver.match(['!py36']), ['py37-django20', 'py37-django21'])
+
+    def test_loaded_once(self):
+        resolver = daemon.Resolver(self.ini_path)
+        index = resolver.load()
+
+        self.assertIs(resolver.load(), index)
+
+    def test_reload(self):
+        resolver = daemon.Resolver(self.ini_path)
+        resolver.match(['py37'])
+
+        self.write_config('py{37,38}-django{30,31}')
+
+        self.assertEqual(resolver.match(['py37']), ['py37-django30', 'py37-django31'])
+
+    def test_invalid_pattern(self):
+        resolver = daemon.Resolver(self.ini_path)
+
+        with self.assertRaises(tox.exception.ConfigError):
+            resolver.match(['/py3(/'])
+
+
+@unittest.skipUnless(daemon.UNIX_SOCKETS_AVAILABLE, 'requires unix sockets')
+class ResolverServerTests(ResolverTestCase):
+    def setUp(self):
+        super(ResolverServerTests, self).setUp()
+        self.socket_path = os.path.join(self.temp_dir, 'resolver.sock')
+
+    def start_server(self):
+        resolver = daemon.Resolver(self.ini_path)
+        server = daemon.ResolverServer(resolver, self.socket_path)
+
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+
+        self.addCleanup(thread.join)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        return resolver
+
+    def test_query(self):
+        self.start_server()
+
+        self.assertEqual(
+            daemon.query(self.socket_path, self.ini_path, ['py37']),
+            ['py37-django20', 'py37-django21'],
+        )
+
+    def test_query_reload(self):
+        self.start_server()
+        daemon.query(self.socket_path, self.ini_path, ['py37'])
+
+        self.write_config('py{37,38}-django30')
+
+        self.assertEqual(
+            daemon.query(self.socket_path, self.ini_path, ['py37']),
+            ['py37-django30'],
+        )
+
+    def test_query_error(self):
+        self.start_server()
+
+        with self.assertRaises(tox.exception.ConfigError):
+            daemon.query(self.socket_path, self.ini_path, ['/py3(/'])
+
+    def test_query_other_config(self):
+        self.start_server()
+
+        with self.assertRaises(tox.exception.ConfigError):
+            daemon.query(self.socket_path, 'other/tox.ini', ['py37'])
+
+    def send(self, data):
+        sock = daemon.connect(self.socket_path)
+        try:
+            sock.sendall(data + b'\n')
+            stream = sock.makefile('rb')
+            line = stream.readline()
+            stream.close()
+        finally:
+            sock.close()
+
+        return json.loads(line.decode('utf-8'))
+
+    def test_malformed_requests(self):
+        self.start_server()
+
+        for data, error in [
+            (b'{"config": ', 'the request is not valid JSON'),
+            (b'\xff', 'the request is not valid JSON'),
+            (b'["py37"]', 'the request is not a JSON object'),
+        ]:
+            self.assertEqual(self.send(data), {'error': error})
+
+        for factors in [None, 'py37', [37], {'py37': True}]:
+            request = {'config': self.ini_path, 'factors': factors}
+            if factors is None:
+                del request['factors']
+
+            self.assertEqual(self.send(json.dumps(request).encode('utf-8')), {
+                'error': 'the request factors are not a list of strings',
+            })
+
+        # The resolver still answers after malformed requests.
+        self.assertEqual(
+            daemon.query(self.socket_path, self.ini_path, ['py37']),
+            ['py37-django20', 'py37-django21'],
+        )
+
+    def test_resolve(self):
+        resolver = self.start_server()
+
+        self.assertEqual(
+            daemon.resolve(self.ini_path, ['py37'], self.socket_path),
+            ['py37-django20', 'py37-django21'],
+        )
+        self.assertIsNotNone(resolver.index)
+
+    def test_resolve_fallback(self):
+        self.assertEqual(
+            daemon.resolve(self.ini_path, ['py37'], self.socket_path),
+            ['py37-django20', 'py37-django21'],
+        )
+
+    def test_resolve_other_config(self):
+        # The resolver of tox.ini doesn't answer for setup.cfg in the same dir.
+        self.socket_path = daemon.get_socket_path(self.ini_path)
+        daemon.prepare_socket_path(self.socket_path)
+        self.start_server()
+
+        setup_cfg = os.path.join(self.temp_dir, 'setup.cfg')
+        with open(setup_cfg, 'w') as cfg_file:
+            cfg_file.write('[tox:tox]\nenvlist = py{27,37}\n')
+
+        self.assertEqual(daemon.resolve(setup_cfg, ['py37']), ['py37'])
+        self.assertEqual(
+            daemon.resolve(self.ini_path, ['py37']),
+            ['py37-django20', 'py37-django21'],
+        )
+
+    def test_prepare_stale_socket(self):
+        server = daemon.ResolverServer(daemon.Resolver(self.ini_path), self.socket_path)
+        server.server_close()
+
+        daemon.prepare_socket_path(self.socket_path)
+
+        self.assertFalse(os.path.exists(self.socket_path))
+
+    def test_prepare_running_socket(self):
+        self.start_server()
+
+        with self.assertRaises(RuntimeError):
+            daemon.prepare_socket_path(self.socket_path)
@@ -1,6 +1,14 @@
+import itertools
+import json
+import random
+import shutil
+import tempfile
 import unittest
 
+from tox.config import _split_env as split_env
+
 from tox_factor import factor
+from tox_factor.compat import intern
 from tox_factor.test import ToxTestCase
 
 
@@ -32,6 +40,371 @@ class GetEnvlistTests(ToxTestCase):
             ['py37-django20', 'py37-django21', 'lint'],
         )
 
+    def test_only_excluded_factors(self):
+        # As with `tox -x`, only the envs of the default envlist are filtered.
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+
+        for _ in range(2):
+            for envs_cache_dir in [None, cache_dir]:
+                self.assertEqual(
+                    factor.get_envlist(self.config, ['!py36'], cache_dir=envs_cache_dir),
+                    ['py37-django20', 'py37-django21'],
+                )
+
+
+class GetEnvlistSectionsTests(ToxTestCase):
+    ini_contents = """
+    [testenv:lint]
+    [testenv:isort]
+    """
+
+    def test_only_excluded_factors(self):
+        # Without an envlist, all of the envs are the default envlist.
+        self.assertEqual(factor.get_envlist(self.config, ['!lint']), ['isort'])
+        self.assertEqual(
+            factor.collect_declared_envs(self.config).index().match(['!lint']),
+            ['isort'],
+        )
+
+
+# get_envlists #################################################################
+class GetEnvlistsTests(ToxTestCase):
+    ini_contents = GetEnvlistTests.ini_contents
+
+    def test_queries(self):
+        self.assertEqual(
+            factor.get_envlists(self.config, [['py36'], ['py37', 'lint'], ['foo']]),
+            [
+                ['py36-django20', 'py36-django21'],
+                ['py37-django20', 'py37-django21', 'lint'],
+                [],
+            ],
+        )
+
+    def test_cache_dir(self):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+
+        for _ in range(2):
+            self.assertEqual(
+                factor.get_envlists(self.config, [['isort'], ['django21']], cache_dir),
+                [['isort'], ['py36-django21', 'py37-django21']],
+            )
+
+
+# iter_envlist #################################################################
+class IterEnvlistTests(ToxTestCase):
+    ini_contents = """
+    [tox]
+    envlist =
+        py{35,36,37}-django{20,21,22}-{redis,memcached}
+        py{36,37}{,-cov}
+        py37-django22-redis, lint  # duplicate
+        {docs,dist}
+
+    [testenv:py37-django20-redis]
+    [testenv:lint]
+    [testenv:isort]
+    [testenv:py38-django30]
+    """
+
+    queries = [
+        [],
+        ['foo'],
+        ['py37'],
+        ['py37-redis'],
+        ['redis-py37', 'django20'],
+        ['cov', 'memcached-py35-django21'],
+        ['py38', 'isort', 'lint'],
+        ['docs', 'py36-redis-django22'],
+        ['py3'],
+        ['py3*-cov', '/py3[56]/-django2[12]-redis'],
+        ['py37', '!redis'],
+        ['!py3*', '!docs'],
+        ['lint', 'isort', '!lint'],
+    ]
+
+    def test_equivalence(self):
+        declared_envs = factor.collect_declared_envs(self.config)
+
+        for factors in self.queries:
+            self.assertEqual(
+                list(factor.iter_envlist(self.config, factors)),
+                factor.match_envs(declared_envs, factors),
+            )
+
+    def test_get_envlist(self):
+        # Without a cache dir, get_envlist matches the templates.
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+
+        for factors in self.queries:
+            self.assertEqual(
+                factor.get_envlist(self.config, factors),
+                factor.get_envlist(self.config, factors, cache_dir=cache_dir),
+            )
+
+    def test_lazy(self):
+        envs = factor.iter_envlist(self.config, ['py37'])
+
+        self.assertEqual(next(envs), 'py37-django20-redis')
+
+
+class GetEnvlistToxSyntaxTests(ToxTestCase):
+    # Nested brace groups and numeric ranges aren't expanded, as tox doesn't.
+    ini_contents = """
+    [tox]
+    envlist = a{1..3}, py{27,3{6,7}}
+    """
+
+    def test_declared_envs(self):
+        self.assertEqual(
+            factor.get_declared_envs(self.config),
+            ['a1..3', 'py27}', 'py3{6}', 'py7}'],
+        )
+        self.assertEqual(
+            factor.collect_declared_envs(self.config).names(),
+            ['a1..3', 'py27}', 'py3{6}', 'py7}'],
+        )
+
+    def test_get_envlist(self):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+
+        for cache in [None, cache_dir]:
+            self.assertEqual(factor.get_envlist(self.config, ['a2'], cache), [])
+            self.assertEqual(factor.get_envlist(self.config, ['a1..3'], cache), ['a1..3'])
+
+
+# EnvTemplate ##################################################################
+class EnvTemplateTests(unittest.TestCase):
+
+    def test_slots(self):
+        template = factor.EnvTemplate('py{36, 37}-django{20,21}-{redis,memcached}')
+
+        self.assertEqual(template.slots, [
+            ['py36', 'py37'], ['django20', 'django21'], ['redis', 'memcached'],
+        ])
+
+    def test_dashed_alternatives(self):
+        template = factor.EnvTemplate('py{36,37}{,-cov}')
+
+        self.assertIsNone(template.slots)
+        self.assertEqual(list(template), ['py36', 'py36-cov', 'py37', 'py37-cov'])
+        self.assertEqual(list(template.match(['cov'])), ['py36-cov', 'py37-cov'])
+
+    def test_tox_syntax(self):
+        template = factor.EnvTemplate('py{27,3{6,7}}-django{1..2}')
+
+        self.assertEqual(list(template), [
+            'py27}-django1..2', 'py3{6}-django1..2', 'py7}-django1..2',
+        ])
+
+    def test_nested_groups(self):
+        template = factor.EnvTemplate('py{27,3{6,7}}-django{1..2}', extended=True)
+
+        self.assertEqual(template.slots, [
+            ['py27', 'py36', 'py37'], ['django1', 'django2'],
+        ])
+        self.assertEqual(list(template.match(['py36'])), ['py36-django1', 'py36-django2'])
+
+    def test_contains(self):
+        template = factor.EnvTemplate('py{36,37}-django{20,21}')
+
+        self.assertIn('py37-django20', template)
+        self.assertNotIn('py37', template)
+        self.assertNotIn('py38-django20', template)
+        self.assertNotIn('py37-django20-redis', template)
+
+    def test_match_order(self):
+        template = factor.EnvTemplate('py{35,36,37}-django{20,21}-{redis,memcached}')
+        queries = [['redis', 'py36-django21'], ['memcached'], ['django20-py37']]
+
+        for factors in queries:
+            self.assertEqual(
+                list(template.match(factors)),
+                factor.match_envs(list(template), factors),
+            )
+
+    def test_exclusions(self):
+        template = factor.EnvTemplate('py{36,37}-django{20,21}')
+
+        self.assertEqual(
+            list(template.match(['py37', '!django21'])),
+            ['py37-django20'],
+        )
+        self.assertEqual(
+            list(template.match(['!py37-django21'])),
+            ['py36-django20', 'py36-django21', 'py37-django20'],
+        )
+
+    def test_prune(self):
+        # Wide axes are not expanded when another slot can't match.
+        template = factor.EnvTemplate('py{%s}-django{%s}' % (
+            ','.join(str(i) for i in range(1000)),
+            ','.join(str(i) for i in range(1000)),
+        ))
+
+        self.assertEqual(list(template.match(['py3-foo'])), [])
+        self.assertEqual(
+            list(template.match(['django5-py7'])),
+            ['py7-django5'],
+        )
+
+
+# expand_envlist ###############################################################
+class ExpandEnvlistTests(unittest.TestCase):
+    def tearDown(self):
+        factor.expanded_envlists.clear()
+
+    def assertExpands(self, envlist, expected, extended=False):
+        self.assertEqual(list(factor.expand_envlist(envlist, extended)), expected)
+
+    def test_tox_equivalence(self):
+        envlists = [
+            None, '', [], ['py37,lint', 'py{36,37}'],
+            'py{36,37}-django{20,21}',
+            """
+            py{36, 37}-django{20,21}-{redis,memcached}  # comment
+            py37{,-cov}
+            # comment
+            lint, isort,,  docs
+            """,
+            'py{36,37,\n38}', 'py{}', 'py{ }', 'a{b', 'a}b', 'a{{b}', '{,}', 'a, ,b',
+            'a{1..3}', 'py{27,3{6,7}}-{a,b{1,2}}', 'a{{b},{c}}', 'a{b{c}}{d}',
+        ]
+
+        for envlist in envlists:
+            self.assertExpands(envlist, split_env(envlist))
+
+    def test_tox_differential(self):
+        # Random envlists, including nested braces and ranges, which tox
+        # doesn't expand.
+        rng = random.Random(0)
+        tokens = ['a', '1', '-', ',', ' ', '{', '}', '\n', '#', '..']
+
+        for _ in range(5000):
+            envlist = ''.join(rng.choice(tokens) for _ in range(rng.randint(0, 16)))
+            self.assertExpands(envlist, split_env(envlist))
+
+    def test_nested_groups(self):
+        self.assertExpands('py{27,3{6,7}}-{a,b{1,2}}', [
+            'py27-a', 'py27-b1', 'py27-b2',
+            'py36-a', 'py36-b1', 'py36-b2',
+            'py37-a', 'py37-b1', 'py37-b2',
+        ], extended=True)
+
+    def test_ranges(self):
+        self.assertExpands('py3{6..8}', ['py36', 'py37', 'py38'], extended=True)
+        self.assertExpands('v{3..1}', ['v3', 'v2', 'v1'], extended=True)
+        self.assertExpands('v{08..10}', ['v08', 'v09', 'v10'], extended=True)
+        self.assertExpands(
+            'py{2{6..7},3{ 7 .. 8 }}', ['py26', 'py27', 'py37', 'py38'], extended=True)
+
+    def test_lazy(self):
+        env_names = factor.expand_envlist('py{0..1000000}', extended=True)
+
+        self.assertEqual(next(env_names), 'py0')
+
+    def test_memoized(self):
+        envlist = 'py{36,37}-django{20,21}'
+        self.assertExpands(envlist, split_env(envlist))
+
+        self.assertEqual(
+            factor.expanded_envlists[envlist, False],
+            tuple(split_env(envlist)),
+        )
+
+        # The extended expansion is memoized separately.
+        self.assertExpands('a{1..2}', ['a1..2'])
+        self.assertExpands('a{1..2}', ['a1', 'a2'], extended=True)
+
+        # Partial expansions are not memoized.
+        next(factor.expand_envlist('py{36,37}'))
+        self.assertNotIn(('py{36,37}', False), factor.expanded_envlists)
+
+    def test_memoized_bounded(self):
+        envlists = ['py{{36,37}}-django{i}'.format(i=i) for i in range(10)]
+        for envlist in envlists:
+            list(factor.expand_envlist(envlist))
+
+        # The least recently expanded envlists are evicted.
+        self.assertEqual(
+            [envlist for envlist, _ in factor.expanded_envlists],
+            envlists[-factor.EXPANDED_ENVLISTS_SIZE:],
+        )
+
+        list(factor.expand_envlist(envlists[-4]))
+        list(factor.expand_envlist('lint'))
+        self.assertIn((envlists[-4], False), factor.expanded_envlists)
+        self.assertNotIn((envlists[-3], False), factor.expanded_envlists)
+
+
+class SplitEnvlistTests(unittest.TestCase):
+    def test_split(self):
+        self.assertEqual(
+            list(factor.split_envlist('py{36,37}-django{20,21}, lint  # comment\nisort')),
+            ['py{36,37}-django{20,21}', 'lint', 'isort'],
+        )
+
+    def test_nested(self):
+        self.assertEqual(
+            list(factor.split_envlist('a{b,{c}},{d,e}', extended=True)),
+            ['a{b,{c}}', '{d,e}'],
+        )
+        # As with tox, the group ends at the first closing brace.
+        self.assertEqual(
+            list(factor.split_envlist('a{b,{c}},{d,e}')),
+            ['a{b,{c}}', '{d,e}'],
+        )
+        self.assertEqual(
+            list(factor.split_envlist('a{b,{c},d}')),
+            ['a{b,{c}', 'd}'],
+        )
+
+
+class ParseEntryTests(unittest.TestCase):
+    def test_parse(self):
+        self.assertEqual(
+            factor.parse_entry('py{36, 37}-django {20,21}'),
+            [['py'], ['36', '37'], ['-django'], ['20', '21'], ['']],
+        )
+
+    def test_nested(self):
+        self.assertEqual(
+            factor.parse_entry('py{27,3{6..7}}', extended=True),
+            [['py'], ['27', '36', '37'], ['']],
+        )
+        self.assertEqual(
+            factor.parse_entry('py{27,3{6..7}}'),
+            [['py'], ['27', '3{6..7'], ['}']],
+        )
+
+
+class FindBraceGroupsTests(unittest.TestCase):
+    def test_tox(self):
+        # As with tox, groups end at the next closing brace.
+        self.assertEqual(factor.find_brace_groups('a{b{c}}{d}'), {1: 5, 7: 9})
+        self.assertEqual(factor.find_brace_groups('a{{b}'), {1: 4})
+        self.assertEqual(factor.find_brace_groups('a{b'), {})
+        self.assertEqual(factor.find_brace_groups('a{}{b}'), {3: 5})
+
+    def test_balanced(self):
+        self.assertEqual(
+            factor.find_brace_groups('a{b{c}}{d}', extended=True),
+            {1: 6, 3: 5, 7: 9},
+        )
+
+    def test_unbalanced(self):
+        # Unmatched braces are paired with the next closing brace.
+        self.assertEqual(factor.find_brace_groups('a{{b}', extended=True), {1: 4, 2: 4})
+        self.assertEqual(factor.find_brace_groups('a{b', extended=True), {})
+
+    def test_empty(self):
+        self.assertEqual(factor.find_brace_groups('a{}'), {})
+        self.assertEqual(factor.find_brace_groups('a{}', extended=True), {})
+
 
 # get_declared_envs ############################################################
 class GetDeclaredEnvsEnvlistTests(ToxTestCase):
@@ -89,6 +462,50 @@ class GetDeclaredEnvsCombinedTests(ToxTestCase):
         )
 
 
+# collect_declared_envs ########################################################
+class CollectDeclaredEnvsTests(ToxTestCase):
+    ini_contents = """
+    [tox]
+    envlist = py{27,37}-django111,lint
+
+    [testenv:lint]
+    [testenv:isort]
+    """
+
+    def test_result(self):
+        declared_envs = factor.collect_declared_envs(self.config)
+
+        self.assertEqual(
+            [(env.name, env.factors, env.source, env.lineno) for env in declared_envs],
+            [
+                ('py27-django111', ('py27', 'django111'), factor.ENVLIST, 3),
+                ('py37-django111', ('py37', 'django111'), factor.ENVLIST, 3),
+                ('lint', ('lint', ), factor.ENVLIST, 3),
+                ('isort', ('isort', ), factor.SECTION, 6),
+            ],
+        )
+
+    def test_lookup(self):
+        declared_envs = factor.collect_declared_envs(self.config)
+
+        self.assertIn('lint', declared_envs)
+        self.assertNotIn('py36', declared_envs)
+        self.assertEqual(declared_envs['lint'].source, factor.ENVLIST)
+
+    def test_interned(self):
+        declared_envs = list(factor.collect_declared_envs(self.config))
+
+        self.assertIs(declared_envs[0].factors[1], declared_envs[1].factors[1])
+
+    def test_match_envs(self):
+        declared_envs = factor.collect_declared_envs(self.config)
+
+        self.assertEqual(
+            factor.match_envs(declared_envs, ['django111-py37', 'isort']),
+            ['py37-django111', 'isort'],
+        )
+
+
 # match_envs ###################################################################
 class MatchEnvsTests(unittest.TestCase):
     testenvs = [
@@ -122,6 +539,167 @@ class MatchEnvsTests(unittest.TestCase):
             ['py36-django20', 'py37-django20', 'py37-django21'],
         )
 
+    def test_factor_index(self):
+        index = factor.FactorIndex(self.testenvs)
+
+        self.assertEqual(
+            factor.match_envs(index, ['py37', 'django20']),
+            ['py36-django20', 'py37-django20', 'py37-django21'],
+        )
+
+    def test_excluded_factor(self):
+        self.assertEqual(
+            factor.match_envs(self.testenvs, ['py37', 'django20', '!py36']),
+            ['py37-django20', 'py37-django21'],
+        )
+
+    def test_only_excluded_factors(self):
+        self.assertEqual(
+            factor.match_envs(self.testenvs, ['!py37-django21', '!foo']),
+            ['py36-django20', 'py36-django21', 'py37-django20'],
+        )
+
+
+# split_exclusions #############################################################
+class SplitExclusionsTests(unittest.TestCase):
+    def test_split(self):
+        self.assertEqual(
+            factor.split_exclusions(['py37', '!django21', 'lint', '!py36-redis']),
+            (['py37', 'lint'], ['django21', 'py36-redis']),
+        )
+
+    def test_empty(self):
+        self.assertEqual(factor.split_exclusions([]), ([], []))
+
+
+# match_many ###################################################################
+class MatchManyTests(unittest.TestCase):
+    testenvs = [
+        '-'.join(parts) for parts in itertools.product(
+            ['py27', 'py36', 'py37'],
+            ['django111', 'django20', 'django21'],
+            ['redis', 'memcached'],
+        )
+    ] + ['lint', 'isort']
+
+    queries = [
+        [],
+        ['py27'],
+        ['py36', 'py37'],
+        ['py37', '!redis'],
+        ['py3*-django2*', 'lint'],
+        ['!/py3[67]/', '!lint'],
+        ['py27'],
+        ['foo'],
+    ]
+
+    def test_equivalence(self):
+        self.assertEqual(
+            factor.match_many(self.testenvs, self.queries),
+            [factor.match_envs(self.testenvs, factors) for factors in self.queries],
+        )
+
+    def test_factor_index(self):
+        index = factor.FactorIndex(self.testenvs)
+
+        self.assertEqual(
+            factor.match_many(index, self.queries),
+            [index.match(factors) for factors in self.queries],
+        )
+
+    def test_no_queries(self):
+        self.assertEqual(factor.match_many(self.testenvs, []), [])
+
+
+# FactorIndex ##################################################################
+class FactorIndexTests(unittest.TestCase):
+    testenvs = [
+        '-'.join(parts) for parts in itertools.product(
+            ['py27', 'py36', 'py37'],
+            ['django111', 'django20', 'django21'],
+            ['redis', 'memcached'],
+        )
+    ] + ['lint', 'isort']
+
+    def brute_force(self, factors, testenvs=None):
+        includes, excludes = factor.split_exclusions(factors)
+
+        return [
+            name for name in testenvs or self.testenvs
+            if (any(factor.env_matches(name, f) for f in includes) or not includes)
+            and not any(factor.env_matches(name, f) for f in excludes)
+        ]
+
+    def test_positions(self):
+        index = factor.FactorIndex(['py37-redis', 'py36-redis', 'py37'])
+
+        self.assertEqual(index.positions('py37'), [0, 2])
+        self.assertEqual(index.positions('redis-py37'), [0])
+        self.assertEqual(index.positions('foo'), [])
+
+    def test_match_order(self):
+        index = factor.FactorIndex(self.testenvs)
+        queries = [
+            ['isort', 'py37'],
+            ['redis', 'django20-py27'],
+            ['memcached-py36', 'lint', 'django111'],
+            ['py3', 'foo-py37'],
+            ['py3*', 'lin?'],
+            ['/py3[67]/-django2*', '/d.*1/-memcached'],
+            ['/py2.*/-redis', 'py37-[rm]*', 'f*'],
+        ]
+
+        for factors in queries:
+            self.assertEqual(index.match(factors), self.brute_force(factors))
+
+    def test_match_exclusions(self):
+        index = factor.FactorIndex(self.testenvs)
+        queries = [
+            ['py37', '!redis'],
+            ['py3*', 'lint', '!django2*-memcached', '!lint'],
+            ['!py27', '!/.*1/-redis'],
+            ['!foo'],
+            ['redis', '!redis'],
+        ]
+
+        for factors in queries:
+            self.assertEqual(index.match(factors), self.brute_force(factors))
+
+    def test_match_exclusions_generated_matrix(self):
+        testenvs = [
+            '-'.join(parts) for parts in itertools.product(
+                ['py%d' % i for i in range(20)],
+                ['django%d' % i for i in range(20)],
+                ['db%d' % i for i in range(10)],
+                ['unit', 'cov'],
+            )
+        ]
+        index = factor.FactorIndex(testenvs)
+        queries = [
+            ['py1*', '!py1?', '!db3'],
+            ['db1', 'django7', '!py5-db1', '!cov'],
+            ['!django1*', '!/db[0-8]/'],
+            ['cov-py3', '!django19-cov', '!db9-py3'],
+        ]
+
+        for factors in queries:
+            self.assertEqual(
+                index.match(factors),
+                self.brute_force(factors, testenvs),
+            )
+
+    def test_defaults(self):
+        # Only excluded factors are applied to the default envlist.
+        index = factor.FactorIndex(['py37-redis', 'py37', 'lint'], defaults=2)
+
+        self.assertEqual(index.match(['!redis']), ['py37'])
+        self.assertEqual(index.match(['lint', 'py37', '!redis']), ['py37', 'lint'])
+
+    def test_duplicate_names(self):
+        index = factor.FactorIndex(['py37', 'lint', 'py37'])
+
+        self.assertEqual(index.match(['py37']), ['py37', 'py37'])
+
 
 # env_matches ##################################################################
 class EnvMatchesTests(unittest.TestCase):
@@ -147,3 +725,137 @@ class EnvMatchesTests(unittest.TestCase):
 
     def test_partial_factor_term_match(self):
         self.assertFalse(factor.env_matches('py37', 'py3'))
+
+    def test_glob_pattern(self):
+        self.assertTrue(factor.env_matches('py37-django21', 'django2*'))
+        self.assertTrue(factor.env_matches('py37-django21', 'py3?-django2*'))
+        self.assertFalse(factor.env_matches('py37-django111', 'django2*'))
+        self.assertFalse(factor.env_matches('py37-django21', 'py2*-django2*'))
+
+    def test_regex_pattern(self):
+        self.assertTrue(factor.env_matches('py37-django21', '/py3\\d/'))
+        self.assertFalse(factor.env_matches('py37-django21', '/py3/'))
+        self.assertFalse(factor.env_matches('py310-django21', '/py3\\d/'))
+
+
+# decompose ####################################################################
+class DecompositionCacheTests(unittest.TestCase):
+    def test_decompose(self):
+        cache = factor.DecompositionCache()
+
+        self.assertEqual(
+            cache.decompose('py37-django21'),
+            frozenset(['py37', 'django21']),
+        )
+        self.assertIs(cache.decompose('py37-django21'), cache.decompose('py37-django21'))
+
+    def test_interned(self):
+        cache = factor.DecompositionCache()
+        name = ''.join(['py', '37'])
+
+        self.assertIs(next(iter(cache.decompose(name))), intern('py37'))
+
+    def test_unicode(self):
+        # Names loaded from JSON are `unicode` on Python 2, which can't be interned.
+        cache = factor.DecompositionCache()
+        names = json.loads('["py37-django20"]')
+
+        self.assertEqual(cache.decompose(names[0]), frozenset(['py37', 'django20']))
+
+    def test_stats(self):
+        cache = factor.DecompositionCache(maxsize=10)
+        for name in ['py37', 'lint', 'py37', 'py37']:
+            cache.decompose(name)
+
+        self.assertEqual(cache.stats(), {
+            'hits': 2, 'misses': 2, 'size': 2, 'maxsize': 10,
+        })
+
+    def test_lru_eviction(self):
+        cache = factor.DecompositionCache(maxsize=2)
+        cache.decompose('a')
+        cache.decompose('b')
+        cache.decompose('a')  # 'b' is now the least recently used
+        cache.decompose('c')
+
+        self.assertEqual(list(cache.entries), ['a', 'c'])
+        self.assertEqual(len(cache), 2)
+
+    def test_clear(self):
+        cache = factor.DecompositionCache()
+        cache.decompose('py37')
+        cache.decompose('py37')
+        cache.clear()
+
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.stats()['hits'], 0)
+        self.assertEqual(cache.stats()['misses'], 0)
+
+    def test_shared_cache(self):
+        factor.clear_decompositions()
+        factor.env_matches('py37-django21', 'py37')
+        factor.env_matches('py37-django21', 'py37')
+
+        stats = factor.get_decomposition_stats()
+        self.assertEqual((stats['hits'], stats['misses']), (2, 2))
+
+        factor.clear_decompositions()
+        self.assertEqual(factor.get_decomposition_stats()['size'], 0)
+
+
+# is_pattern ###################################################################
+class IsPatternTests(unittest.TestCase):
+    def test_exact(self):
+        self.assertFalse(factor.is_pattern('py37'))
+        self.assertFalse(factor.is_pattern('/'))
+        self.assertFalse(factor.is_pattern('//'))
+
+    def test_glob(self):
+        self.assertTrue(factor.is_pattern('py3*'))
+        self.assertTrue(factor.is_pattern('py3?'))
+        self.assertTrue(factor.is_pattern('py3[67]'))
+
+    def test_regex(self):
+        self.assertTrue(factor.is_pattern('/py3\\d/'))
+
+
+# PatternMatcher ###############################################################
+class PatternMatcherTests(unittest.TestCase):
+    def test_expand(self):
+        matcher = factor.PatternMatcher(['py3*', '/py\\d7/', 'django2*'])
+
+        self.assertEqual(
+            matcher.expand(['py27', 'py37', 'py38', 'django20', 'django111']),
+            {
+                'py3*': ['py37', 'py38'],
+                '/py\\d7/': ['py27', 'py37'],
+                'django2*': ['django20'],
+            },
+        )
+
+    def test_empty(self):
+        self.assertEqual(factor.PatternMatcher([]).expand(['py37']), {})
+
+    def test_regex_groups(self):
+        # Regexes keep their meaning when combined with other patterns.
+        matcher = factor.PatternMatcher(['/(py3)\\1/', '/(p)y37/', 'py*'])
+
+        self.assertEqual(matcher.expand(['py3py3', 'py37']), {
+            '/(py3)\\1/': ['py3py3'],
+            '/(p)y37/': ['py37'],
+            'py*': ['py3py3', 'py37'],
+        })
+
+    def test_duplicate_group_names(self):
+        matcher = factor.PatternMatcher(['/(?P<v>py3)7/', '/(?P<v>py3)6/'])
+
+        self.assertEqual(matcher.expand(['py36', 'py37']), {
+            '/(?P<v>py3)7/': ['py37'],
+            '/(?P<v>py3)6/': ['py36'],
+        })
+
+    def test_match_envs(self):
+        self.assertEqual(
+            factor.match_envs(['py3py3'], ['/(py3)\\1/', '/(p)y37/']),
+            ['py3py3'],
+        )
@@ -0,0 +1,98 @@
+import errno
+import mock
+import os
+import shutil
+import sqlite3
+import tempfile
+from unittest import TestCase
+
+from tox_factor import history
+
+
+class RuntimeHistoryTests(TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = history.get_history_path(os.path.join(self.temp_dir, 'cache'))
+        self.history = history.RuntimeHistory(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_empty(self):
+        self.assertEqual(self.history.durations(), {})
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_record(self):
+        self.history.record('py37', 4.0)
+        self.history.record('lint', 1.0)
+
+        self.assertEqual(self.history.durations(), {'py37': 4.0, 'lint': 1.0})
+
+    def test_created_concurrently(self):
+        # Another env of a parallel run creates the cache dir first.
+        makedirs = os.makedirs
+
+        def create_concurrently(path, **kwargs):
+            makedirs(path, **kwargs)
+            if not kwargs.get('exist_ok'):
+                raise OSError(errno.EEXIST, 'File exists', path)
+
+        with mock.patch('os.makedirs', side_effect=create_concurrently):
+            self.history.record('py37', 4.0)
+
+        self.assertEqual(self.history.durations(), {'py37': 4.0})
+
+    def test_moving_average(self):
+        self.history.record('py37', 4.0)
+        self.history.record('py37', 2.0)
+
+        self.assertEqual(self.history.durations(), {'py37': 3.0})
+
+
+class RuntimeRecorderTests(TestCase):
+    def test_record(self):
+        recorder = history.RuntimeRecorder()
+        runtime_history = mock.Mock()
+
+        recorder.start('py37')
+        recorder.stop('py37', runtime_history)
+
+        runtime_history.record.assert_called_once_with('py37', mock.ANY)
+        self.assertEqual(recorder.started, {})
+
+    def test_not_started(self):
+        recorder = history.RuntimeRecorder()
+        runtime_history = mock.Mock()
+
+        recorder.stop('py37', runtime_history)
+
+        runtime_history.record.assert_not_called()
+
+    def test_errors_ignored(self):
+        recorder = history.RuntimeRecorder()
+        runtime_history = mock.Mock()
+        runtime_history.record.side_effect = sqlite3.OperationalError('locked')
+
+        recorder.start('py37')
+        recorder.stop('py37', runtime_history)
+
+
+class OrderLongestFirstTests(TestCase):
+    def test_no_durations(self):
+        self.assertEqual(
+            history.order_longest_first(['a', 'b', 'c'], {}),
+            ['a', 'b', 'c'],
+        )
+
+    def test_order(self):
+        self.assertEqual(
+            history.order_longest_first(['a', 'b', 'c'], {'a': 1, 'b': 3, 'c': 2}),
+            ['b', 'c', 'a'],
+        )
+
+    def test_unknown_durations(self):
+        # Unknown durations are weighted with the mean (2.0), and ties are stable.
+        self.assertEqual(
+            history.order_longest_first(['a', 'b', 'c', 'd'], {'a': 1, 'b': 3}),
+            ['b', 'c', 'd', 'a'],
+        )
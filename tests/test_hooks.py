@@ -1,8 +1,37 @@
+import argparse
 import mock
 from unittest import TestCase
 
+import tox
+
+from tox_factor import hooks
+from tox_factor.cache import get_cache_dir
 from tox_factor.compat import TOX_PARALLEL_ENV
-from tox_factor.hooks import normalize_factors, tox_configure
+from tox_factor.hooks import get_timing_format, normalize_factors, tox_configure
+
+
+def make_config(**options):
+    # The plugin's options, as parsed from an empty command line.
+    defaults = {
+        'env': None,
+        'factor': None,
+        'exclude_factor': None,
+        'factor_changed': None,
+        'factor_json': False,
+        'factor_matrix': None,
+        'factor_timing': None,
+        'factor_shard': None,
+        'factor_durations': None,
+        'factor_order': 'declared',
+        'factor_skip_verified': False,
+        'factor_wheelhouse': False,
+    }
+    defaults.update(options)
+
+    config = mock.Mock()
+    config.option = argparse.Namespace(**defaults)
+
+    return config
 
 
 class NormalizeFactorsTests(TestCase):
@@ -43,6 +72,35 @@ class NormalizeFactorsTests(TestCase):
             ['py37', 'isort', 'lint'],
         )
 
+    def test_patterns(self):
+        self.assertEqual(
+            normalize_factors(['django2*,/py3\\d/-redis']),
+            ['django2*', '/py3\\d/-redis'],
+        )
+
+    def test_invalid_pattern(self):
+        with self.assertRaises(tox.exception.ConfigError) as excinfo:
+            normalize_factors(['/py3(/'])
+
+        self.assertIn("invalid factor pattern '/py3(/'", str(excinfo.exception))
+
+    def test_split_pattern(self):
+        # Regex patterns may not contain the comma or dash delimiters.
+        for factors in [['/py3\\d{1,2}/'], ['!/py-3/'], ['py37-/py3\\d']]:
+            with self.assertRaises(tox.exception.ConfigError) as excinfo:
+                normalize_factors(factors)
+
+            self.assertIn('may not contain commas or dashes', str(excinfo.exception))
+
+    def test_excluded_factors(self):
+        self.assertEqual(
+            normalize_factors(['py37,!redis', '!/py3\\d/-cov']),
+            ['py37', '!redis', '!/py3\\d/-cov'],
+        )
+
+        with self.assertRaises(tox.exception.ConfigError):
+            normalize_factors(['!/py3(/'])
+
     def test_whitespace_stripping(self):
         self.assertEqual(
             normalize_factors([' ', 'isort , lint ']),
@@ -50,82 +108,315 @@ class NormalizeFactorsTests(TestCase):
         )
 
 
+class GetTimingFormatTests(TestCase):
+    def test_disabled(self):
+        config = make_config(factor_timing=None)
+
+        self.assertIsNone(get_timing_format(config))
+
+    def test_option(self):
+        config = make_config(factor_timing='json')
+
+        self.assertEqual(get_timing_format(config), 'json')
+
+    def test_envvar(self):
+        config = make_config(factor_timing=None)
+
+        for value, expected in [('1', 'text'), ('json', 'json'), ('0', None)]:
+            with mock.patch.dict('os.environ', {'TOXFACTOR_PROFILE': value}):
+                self.assertEqual(get_timing_format(config), expected)
+
+
 class ToxConfigureHookTests(TestCase):
 
-    @mock.patch('tox_factor.hooks.get_envlist')
+    @mock.patch('tox_factor.factor.get_envlist')
     def test_default_noop(self, get_envlist):
         # mimics: `tox`
-        config = mock.Mock()
-        config.option.env = []
-        config.option.factor = []
+        config = make_config(env=[], factor=[])
 
         tox_configure(config)
 
         get_envlist.assert_not_called()
 
-    @mock.patch('tox_factor.hooks.get_envlist')
+    @mock.patch('tox_factor.factor.get_envlist')
     def test_toxfactor_option(self, get_envlist):
         # mimics: `tox -f test`
-        config = mock.Mock()
-        config.option.env = []
-        config.option.factor = ['test']
+        config = make_config(env=[], factor=['test'])
+
+        tox_configure(config)
+
+        get_envlist.assert_called_once_with(
+            config._cfg, ['test'], cache_dir=None)
+
+    @mock.patch('tox_factor.factor.get_envlist')
+    def test_exclude_factor_option(self, get_envlist):
+        # mimics: `tox -f test -x redis`
+        config = make_config(env=[], factor=['test'], exclude_factor=['redis'])
+
+        tox_configure(config)
+
+        get_envlist.assert_called_once_with(
+            config._cfg, ['test', '!redis'], cache_dir=None)
+
+    @mock.patch('tox_factor.factor.get_envlist')
+    def test_exclude_factor_only(self, get_envlist):
+        # mimics: `tox -x redis`
+        config = make_config(env=[], factor=[], exclude_factor=['redis'])
+        config.envlist = ['test-redis', 'test', 'lint-redis', 'lint']
+
+        tox_configure(config)
+
+        get_envlist.assert_not_called()
+        self.assertEqual(config.envlist, ['test', 'lint'])
+        self.assertEqual(config.envlist_default, ['test', 'lint'])
+
+    @mock.patch('tox_factor.impact.get_changed_paths')
+    @mock.patch('tox_factor.impact.get_path_factors')
+    @mock.patch('tox_factor.factor.get_envlist')
+    def test_factor_changed_option(
+            self, get_envlist, get_path_factors, get_changed_paths):
+        # mimics: `tox --factor-changed master`
+        config = make_config(env=[], factor=[], factor_changed='master')
+        config.toxinidir, config.toxworkdir = '/project', '/project/.tox'
+        get_path_factors.return_value = [('src/*', ['redis']), ('docs/*', [])]
+        get_changed_paths.return_value = ['src/cache.py', 'docs/index.md']
+        get_envlist.return_value = ['test-redis']
 
         tox_configure(config)
 
-        get_envlist.assert_called_once_with(config._cfg, ['test'])
+        # The plugin's own files in the tox work dir aren't changes.
+        get_changed_paths.assert_called_once_with('master', '/project', '.tox')
+
+        get_envlist.assert_called_once_with(
+            config._cfg, ['redis'], cache_dir=None)
+        self.assertEqual(config.envlist, ['test-redis'])
+
+    @mock.patch('tox_factor.impact.get_changed_paths')
+    @mock.patch('tox_factor.impact.get_path_factors')
+    @mock.patch('tox_factor.factor.get_envlist')
+    def test_factor_changed_with_factors(
+            self, get_envlist, get_path_factors, get_changed_paths):
+        # mimics: `tox -f test --factor-changed master`
+        config = make_config(env=[], factor=['test'], factor_changed='master')
+        get_path_factors.return_value = [('src/*', ['redis'])]
+        get_changed_paths.return_value = ['src/cache.py']
+        get_envlist.side_effect = [['test-redis', 'test'], ['lint-redis', 'test-redis']]
+
+        tox_configure(config)
+
+        # The cached index is shared by both queries.
+        self.assertEqual(config.envlist, ['test-redis'])
+        get_envlist.assert_has_calls([
+            mock.call(config._cfg, ['test'], cache_dir=get_cache_dir(config)),
+            mock.call(config._cfg, ['redis'], cache_dir=get_cache_dir(config)),
+        ])
+
+    @mock.patch('tox_factor.impact.get_changed_paths')
+    @mock.patch('tox_factor.impact.get_path_factors')
+    @mock.patch('tox_factor.factor.get_envlist')
+    def test_factor_changed_unmapped(
+            self, get_envlist, get_path_factors, get_changed_paths):
+        # mimics: `tox --factor-changed master`, with a change to an unmapped path
+        config = make_config(env=[], factor=[], factor_changed='master')
+        config.envlist = ['test-redis', 'test']
+        get_path_factors.return_value = [('src/*', ['redis'])]
+        get_changed_paths.return_value = ['src/cache.py', 'setup.py']
+
+        tox_configure(config)
+
+        get_envlist.assert_not_called()
+        self.assertEqual(config.envlist, ['test-redis', 'test'])
 
-    @mock.patch('tox_factor.hooks.get_envlist')
+    @mock.patch('tox_factor.factor.get_envlist')
     @mock.patch.dict('os.environ', {'TOXFACTOR': 'test'})
     def test_toxfactor_envvar(self, get_envlist):
         # mimics: `TOXFACTOR=test tox`
-        config = mock.Mock()
-        config.option.env = []
-        config.option.factor = []
+        config = make_config(env=[], factor=[])
 
         tox_configure(config)
 
-        get_envlist.assert_called_once_with(config._cfg, ['test'])
+        get_envlist.assert_called_once_with(
+            config._cfg, ['test'], cache_dir=None)
 
-    @mock.patch('tox_factor.hooks.get_envlist')
+    @mock.patch('sys.stderr')
+    @mock.patch('tox_factor.factor.get_envlist')
+    def test_factor_timing_option(self, get_envlist, stderr):
+        # mimics: `tox -f test --factor-timing`
+        config = make_config(env=[], factor=['test'], factor_timing='text')
+        get_envlist.return_value = ['test']
+
+        tox_configure(config)
+
+        report = stderr.write.call_args[0][0]
+        self.assertIn('normalize_factors', report)
+        self.assertIn('matched_envs', report)
+
+    @mock.patch('tox_factor.factor.get_envlist')
+    def test_factor_shard_option(self, get_envlist):
+        # mimics: `tox -f test --factor-shard 2/2`
+        config = make_config(env=[], factor=['test'], factor_shard=(2, 2))
+        get_envlist.return_value = ['test-a', 'test-b', 'test-c']
+
+        tox_configure(config)
+
+        self.assertEqual(config.envlist, ['test-b'])
+        self.assertEqual(config.envlist_default, ['test-b'])
+
+    @mock.patch('tox_factor.hooks.get_history')
+    @mock.patch('tox_factor.factor.get_envlist')
+    def test_factor_order_option(self, get_envlist, get_history):
+        # mimics: `tox -f test --factor-order longest`
+        config = make_config(env=[], factor=['test'], factor_order='longest')
+        get_envlist.return_value = ['test-a', 'test-b', 'test-c']
+        get_history.return_value.durations.return_value = {'test-a': 1, 'test-c': 5}
+
+        tox_configure(config)
+
+        self.assertEqual(config.envlist, ['test-c', 'test-b', 'test-a'])
+        self.assertEqual(config.envlist_default, ['test-c', 'test-b', 'test-a'])
+
+    @mock.patch('sys.stderr')
+    @mock.patch('tox_factor.hooks.get_verified_runs')
+    @mock.patch('tox_factor.verified.get_fingerprints')
+    @mock.patch('tox_factor.factor.get_envlist')
+    def test_factor_skip_verified_option(
+            self, get_envlist, get_fingerprints, get_verified_runs, stderr):
+        # mimics: `tox -f test --factor-skip-verified`
+        config = make_config(env=[], factor=['test'], factor_skip_verified=True)
+        get_envlist.return_value = ['test-a', 'test-b', 'test-c']
+        get_fingerprints.return_value = {'test-a': 'a', 'test-b': 'b', 'test-c': 'c'}
+        get_verified_runs.return_value.fingerprints.return_value = {
+            'test-a': 'a', 'test-b': 'x',
+        }
+
+        tox_configure(config)
+
+        self.assertEqual(config.envlist, ['test-b', 'test-c'])
+        self.assertEqual(config.envlist_default, ['test-b', 'test-c'])
+        self.assertIn('test-a', stderr.write.call_args[0][0])
+
+    @mock.patch('sys.stdout')
+    @mock.patch('tox_factor.hooks.write_listing')
+    @mock.patch('tox_factor.factor.get_envlist')
+    def test_factor_json_with_toxenv(self, get_envlist, write_listing, stdout):
+        # mimics: `tox -e test -f test --factor-json`
+        config = make_config(env='test', factor='test', factor_json=True)
+
+        with self.assertRaises(SystemExit) as excinfo:
+            tox_configure(config)
+
+        self.assertEqual(excinfo.exception.code, 0)
+        get_envlist.assert_not_called()
+        write_listing.assert_called_once_with(config)
+
+    @mock.patch('sys.stdout')
+    @mock.patch('tox_factor.hooks.write_listing')
+    @mock.patch('tox_factor.factor.get_envlist')
+    @mock.patch.dict('os.environ', {'TOXENV': 'py37-django20'})
+    def test_factor_matrix_with_toxenv(self, get_envlist, write_listing, stdout):
+        # mimics: `TOXENV=py37-django20 tox --factor-matrix py`
+        config = make_config(factor_matrix='py')
+
+        with self.assertRaises(SystemExit) as excinfo:
+            tox_configure(config)
+
+        self.assertEqual(excinfo.exception.code, 0)
+        get_envlist.assert_not_called()
+        write_listing.assert_called_once_with(config)
+
+    @mock.patch('tox_factor.factor.get_envlist')
     def test_toxenv_option_supersedes_toxfactor(self, get_envlist):
         # mimics: `tox -e test -f test`
-        config = mock.Mock()
-        config.option.env = 'test'
-        config.option.factor = 'test'
+        config = make_config(env='test', factor='test')
 
         tox_configure(config)
 
         get_envlist.assert_not_called()
 
-    @mock.patch('tox_factor.hooks.get_envlist')
+    @mock.patch('tox_factor.factor.get_envlist')
     @mock.patch.dict('os.environ', {'TOXENV': 'test'})
     def test_toxenv_envvar_supersedes_toxfactor(self, get_envlist):
         # mimics: `TOXENV=test tox -f test`
-        config = mock.Mock()
-        config.option.factor = 'test'
+        config = make_config(factor='test')
 
         tox_configure(config)
 
         get_envlist.assert_not_called()
 
-    @mock.patch('tox_factor.hooks.get_envlist')
+    @mock.patch('tox_factor.factor.get_envlist')
     @mock.patch.dict('os.environ', {'TOXENV': 'test'})
     def test_toxenv_envvar_and_option_supersedes_toxfactor(self, get_envlist):
         # mimics: `TOXENV=test tox -e test -f test`
-        config = mock.Mock()
-        config.option.env = 'test'
-        config.option.factor = 'test'
+        config = make_config(env='test', factor='test')
 
         tox_configure(config)
 
         get_envlist.assert_not_called()
 
-    @mock.patch('tox_factor.hooks.get_envlist')
+    @mock.patch('tox_factor.factor.get_envlist')
     @mock.patch.dict('os.environ', {TOX_PARALLEL_ENV: 'test'})
     def test_tox_parallel_env_envvar_noop(self, get_envlist):
         # mimics: `TOX_PARALLEL_ENV=test tox`
-        config = mock.Mock()
+        config = make_config()
 
         tox_configure(config)
 
         get_envlist.assert_not_called()
+
+    @mock.patch('tox_factor.hooks.report_wheelhouse_groups')
+    @mock.patch.dict('os.environ', {'TOXENV': 'test'})
+    def test_factor_wheelhouse_with_toxenv(self, report_wheelhouse_groups):
+        # mimics: `TOXENV=test tox --factor-wheelhouse`
+        config = make_config(factor_wheelhouse=True)
+
+        tox_configure(config)
+
+        report_wheelhouse_groups.assert_called_once_with(config)
+
+    @mock.patch('tox_factor.hooks.report_wheelhouse_groups')
+    @mock.patch.dict('os.environ', {TOX_PARALLEL_ENV: 'test'})
+    def test_factor_wheelhouse_tox_parallel_env_noop(self, report_wheelhouse_groups):
+        # The subprocesses inherit the run id of the main process.
+        config = make_config(factor_wheelhouse=True)
+
+        tox_configure(config)
+
+        report_wheelhouse_groups.assert_not_called()
+
+
+class ToxRuntestHookTests(TestCase):
+    def make_venv(self, **options):
+        venv = mock.Mock(status=0)
+        venv.name = 'test'
+        venv.envconfig.config = make_config(**options)
+
+        return venv
+
+    @mock.patch('tox_factor.hooks.get_verified_runs')
+    @mock.patch('tox_factor.hooks.get_history')
+    def test_not_recorded(self, get_history, get_verified_runs):
+        # Runs are not recorded without the options that use the records.
+        venv = self.make_venv()
+
+        hooks.tox_runtest_pre(venv)
+        hooks.tox_runtest_post(venv)
+
+        get_history.assert_not_called()
+        get_verified_runs.assert_not_called()
+
+    @mock.patch.dict('sys.modules', {'sqlite3': None, 'tox_factor.verified': None})
+    def test_not_imported(self):
+        # Plain runs don't import the modules that record runs.
+        venv = self.make_venv()
+
+        hooks.tox_runtest_pre(venv)
+        hooks.tox_runtest_post(venv)
+
+    @mock.patch('tox_factor.hooks.get_history')
+    def test_factor_order_option(self, get_history):
+        venv = self.make_venv(factor_order='longest')
+
+        hooks.tox_runtest_pre(venv)
+        hooks.tox_runtest_post(venv)
+
+        get_history.return_value.record.assert_called_once_with('test', mock.ANY)
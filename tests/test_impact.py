@@ -0,0 +1,156 @@
+import os
+import shutil
+import subprocess
+import tempfile
+from unittest import TestCase
+
+import tox
+
+from tox_factor import impact
+from tox_factor.test import ToxTestCase
+
+
+class GetPathFactorsTests(ToxTestCase):
+    ini_contents = """
+    [tox]
+    envlist = py{36,37}-{redis,memcached}
+
+    [tox-factor]
+    paths =
+        src/cache/redis.py -> redis
+        src/cache/* -> redis, memcached  # comment
+        docs/* ->
+    """
+
+    def test_result(self):
+        self.assertEqual(impact.get_path_factors(self.config), [
+            ('src/cache/redis.py', ['redis']),
+            ('src/cache/*', ['redis', 'memcached']),
+            ('docs/*', []),
+        ])
+
+
+class GetPathFactorsMissingTests(ToxTestCase):
+    ini_contents = """
+    [tox]
+    envlist = py{36,37}
+    """
+
+    def test_result(self):
+        self.assertEqual(impact.get_path_factors(self.config), [])
+
+
+class GetPathFactorsInvalidTests(ToxTestCase):
+    ini_contents = """
+    [tox-factor]
+    paths =
+        src/cache/* redis
+    """
+
+    def test_result(self):
+        with self.assertRaises(tox.exception.ConfigError):
+            impact.get_path_factors(self.config)
+
+
+class GetAffectedFactorsTests(TestCase):
+    mapping = [
+        ('src/cache/redis.py', ['redis']),
+        ('src/cache/*', ['memcached', 'redis']),
+        ('src/*', ['py36', 'py37']),
+        ('docs/*', []),
+    ]
+
+    def test_single_path(self):
+        self.assertEqual(
+            impact.get_affected_factors(['src/cache/redis.py'], self.mapping),
+            ['redis', 'memcached', 'py36', 'py37'],
+        )
+
+    def test_nested_path(self):
+        self.assertEqual(
+            impact.get_affected_factors(['src/app/models.py'], self.mapping),
+            ['py36', 'py37'],
+        )
+
+    def test_unaffected(self):
+        self.assertEqual(impact.get_affected_factors(['docs/index.md'], self.mapping), [])
+        self.assertEqual(impact.get_affected_factors([], self.mapping), [])
+
+    def test_unmapped(self):
+        self.assertIsNone(
+            impact.get_affected_factors(['docs/index.md', 'setup.py'], self.mapping))
+
+
+class GetChangedPathsTests(TestCase):
+    def setUp(self):
+        self.repo = tempfile.mkdtemp()
+        self.git('init', '-q')
+        self.write('setup.py')
+        self.write('src/app.py')
+        self.git('add', '.')
+        self.git('commit', '-q', '-m', 'initial')
+        self.git('branch', 'base')
+
+    def tearDown(self):
+        shutil.rmtree(self.repo)
+
+    def git(self, *args):
+        subprocess.check_call(
+            ['git', '-c', 'user.name=test', '-c', 'user.email=test@example.com'] +
+            list(args), cwd=self.repo)
+
+    def write(self, path, contents=''):
+        path = os.path.join(self.repo, path)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as f:
+            f.write(contents)
+
+    def test_unchanged(self):
+        self.assertEqual(impact.get_changed_paths('base', self.repo), [])
+
+    def test_changes(self):
+        self.write('src/app.py', 'committed')
+        self.git('commit', '-q', '-am', 'change')
+        self.write('setup.py', 'modified')
+        self.write('docs/index.md', 'untracked')
+
+        self.assertEqual(
+            impact.get_changed_paths('base', self.repo),
+            ['docs/index.md', 'setup.py', 'src/app.py'],
+        )
+
+    def test_relative(self):
+        self.write('setup.py', 'modified')
+        self.write('src/app.py', 'modified')
+
+        self.assertEqual(
+            impact.get_changed_paths('base', os.path.join(self.repo, 'src')),
+            ['app.py'],
+        )
+
+    def test_renamed(self):
+        # Both the old and new paths of a renamed file are changed.
+        self.write('src/app.py', 'import os\n' * 10)
+        self.git('commit', '-q', '-am', 'change')
+        self.git('branch', '-f', 'base')
+        self.git('mv', 'src/app.py', 'src/moved.py')
+        self.git('commit', '-q', '-m', 'rename')
+
+        self.assertEqual(
+            impact.get_changed_paths('base', self.repo),
+            ['src/app.py', 'src/moved.py'],
+        )
+
+    def test_exclude(self):
+        self.write('.tox/.tox-factor/cache.json', 'untracked')
+        self.write('src/app.py', 'modified')
+
+        self.assertEqual(
+            impact.get_changed_paths('base', self.repo, exclude='.tox'),
+            ['src/app.py'],
+        )
+
+    def test_invalid_ref(self):
+        with self.assertRaises(tox.exception.ConfigError):
+            impact.get_changed_paths('missing', self.repo)
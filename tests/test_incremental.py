@@ -0,0 +1,101 @@
+import mock
+import random
+import unittest
+
+from py.iniconfig import IniConfig
+
+from tox_factor import incremental
+from tox_factor.factor import collect_declared_envs, expand_entry
+
+
+def make_config(entries, sections, commands='pytest'):
+    lines = ['[tox]', 'envlist =']
+    lines.extend('    ' + entry for entry in entries)
+
+    for section in sections:
+        lines.extend(['', '[testenv:{section}]'.format(section=section)])
+        lines.append('commands = {commands}'.format(commands=commands))
+
+    return IniConfig('tox.ini', data='\n'.join(lines) + '\n')
+
+
+class IncrementalIndexTests(unittest.TestCase):
+    entries = ['py{36,37}-django{20,21}', 'py38-django30', 'lint']
+    sections = ['docs', 'lint', 'py38-django30']
+
+    def assertRebuilt(self, index, ini):
+        expected = collect_declared_envs(ini).index()
+
+        self.assertEqual(index.env_names, expected.env_names)
+        self.assertEqual(index.postings, expected.postings)
+        self.assertEqual(index.defaults, expected.defaults)
+
+    def test_update(self):
+        ini = make_config(self.entries, self.sections)
+        index = incremental.IncrementalIndex().update(ini)
+
+        self.assertEqual(index.env_names, [
+            'py36-django20', 'py36-django21', 'py37-django20', 'py37-django21',
+            'py38-django30', 'lint', 'docs',
+        ])
+        self.assertRebuilt(index, ini)
+
+    def test_unchanged_declarations(self):
+        updater = incremental.IncrementalIndex()
+        index = updater.update(make_config(self.entries, self.sections))
+
+        ini = make_config(self.entries, self.sections, commands='pytest -x')
+
+        self.assertIs(updater.update(ini), index)
+
+    def test_changed_entry(self):
+        updater = incremental.IncrementalIndex()
+        updater.update(make_config(self.entries, self.sections))
+
+        entries = ['py{36,37}-django{20,21}', 'py{38,39}-django30', 'lint']
+        ini = make_config(entries, self.sections)
+
+        patch = mock.patch('tox_factor.incremental.expand_entry', wraps=expand_entry)
+        with patch as expand:
+            index = updater.update(ini)
+
+        expand.assert_called_once_with('py{38,39}-django30')
+        self.assertRebuilt(index, ini)
+
+    def test_changed_sections(self):
+        updater = incremental.IncrementalIndex()
+        updater.update(make_config(self.entries, self.sections))
+
+        ini = make_config(self.entries, ['isort', 'docs', 'py39'])
+
+        with mock.patch('tox_factor.incremental.expand_entry') as expand:
+            index = updater.update(ini)
+
+        expand.assert_not_called()
+        self.assertRebuilt(index, ini)
+
+    def test_random_edits(self):
+        rand = random.Random(0)
+        entry_choices = [
+            'py{36,37}-django{20,21}', 'py{37,38}-django30-{redis,memcached}',
+            'py38-django30', 'lint', 'py{27,36}', 'py37-django21',
+        ]
+        section_choices = ['docs', 'lint', 'isort', 'py38-django30', 'py39']
+
+        entries, sections = list(self.entries), list(self.sections)
+        updater = incremental.IncrementalIndex()
+
+        for _ in range(100):
+            target, choices = rand.choice([
+                (entries, entry_choices), (sections, section_choices),
+            ])
+            position = rand.randint(0, len(target))
+            choice = rand.choice(choices)
+
+            if target and rand.random() < 0.4:
+                del target[min(position, len(target) - 1)]
+            elif target is entries or choice not in sections:
+                target.insert(position, choice)
+
+            ini = make_config(entries, sections)
+            self.assertRebuilt(updater.update(ini), ini)
@@ -1,5 +1,10 @@
+import json
 import mock
+import os
+import subprocess
 
+from tox_factor import history
+from tox_factor.factor import get_envlist
 from tox_factor.test import ToxTestCase
 
 
@@ -53,6 +58,37 @@ class ToxFactorIntegrationTests(ToxTestCase):
             ],
         )
 
+    def test_patterns(self):
+        self.assertEqual(
+            self.tox_envlist(['-f', 'py3*-django21', '-f', '/l.*t/']),
+            [
+                'py36-django21', 'py37-django21', 'lint',
+            ],
+        )
+
+    def test_excluded_factors(self):
+        self.assertEqual(
+            self.tox_envlist(['-f', 'py37,lint', '-f', '!django21']),
+            [
+                'py37-django20', 'lint',
+            ],
+        )
+
+    def test_exclude_factor_option(self):
+        self.assertEqual(
+            self.tox_envlist(['-x', 'py37', '--exclude-factor', 'django20']),
+            [
+                'py36-django21',
+            ],
+        )
+
+    def test_only_excluded_factors(self):
+        # The other entry points apply exclusions to the same default envlist.
+        self.assertEqual(
+            self.tox_envlist(['-f', '!django21']),
+            get_envlist(self.config, ['!django21']),
+        )
+
     @mock.patch.dict('os.environ', {'TOXFACTOR': 'py37'})
     def test_environment_variable(self):
         self.assertEqual(
@@ -71,6 +107,117 @@ class ToxFactorIntegrationTests(ToxTestCase):
             ],
         )
 
+    def test_factor_shard(self):
+        shards = [
+            self.tox_envlist(['-f', 'py36,py37', '--factor-shard', shard])
+            for shard in ['1/2', '2/2']
+        ]
+
+        self.assertEqual(shards, [
+            ['py36-django20', 'py37-django20'],
+            ['py36-django21', 'py37-django21'],
+        ])
+
+    def test_factor_timing(self):
+        returncode, stdout, stderr = self.tox_call(
+            ['-l', '-f', 'py37', '--factor-timing', 'json'],
+        )
+        self.assertEqual(returncode, 0, stderr)
+
+        report = json.loads(stderr)
+        self.assertIn('match_envs', report['timings'])
+        self.assertEqual(report['counts']['envlist_templates'], 1)
+        self.assertEqual(report['counts']['matched_envs'], 2)
+
+    def test_factor_json(self):
+        returncode, stdout, stderr = self.tox_call(
+            ['-f', 'py37,lint', '-x', 'django21', '--factor-json'],
+        )
+        self.assertEqual(returncode, 0, stderr)
+
+        records = [json.loads(line) for line in stdout.splitlines()]
+        self.assertEqual(
+            [(r['env'], r['matched'], r['excluded'], r['selected']) for r in records],
+            [
+                ('py36-django20', [], [], False),
+                ('py36-django21', [], ['django21'], False),
+                ('py37-django20', ['py37'], [], True),
+                ('py37-django21', ['py37'], ['django21'], False),
+                ('lint', ['lint'], [], True),
+                ('isort', [], [], False),
+            ],
+        )
+
+    def test_factor_json_with_toxenv(self):
+        # The listing is written instead of running the given envs.
+        returncode, stdout, stderr = self.tox_call(
+            ['-e', 'py37-django20', '-f', 'py37', '--factor-json'],
+        )
+        self.assertEqual(returncode, 0, stderr)
+
+        records = [json.loads(line) for line in stdout.splitlines()]
+        self.assertEqual(
+            [(r['env'], r['matched'], r['selected']) for r in records],
+            [
+                ('py36-django20', [], False),
+                ('py36-django21', [], False),
+                ('py37-django20', ['py37'], True),
+                ('py37-django21', ['py37'], False),
+                ('lint', [], False),
+                ('isort', [], False),
+            ],
+        )
+
+        with mock.patch.dict('os.environ', {'TOXENV': 'lint'}):
+            returncode, stdout, stderr = self.tox_call(['--factor-json'])
+        self.assertEqual(returncode, 0, stderr)
+
+        records = [json.loads(line) for line in stdout.splitlines()]
+        self.assertEqual([r['env'] for r in records if r['selected']], ['lint'])
+
+    def test_factor_matrix(self):
+        returncode, stdout, stderr = self.tox_call(
+            ['-x', 'django20', '--factor-matrix', 'py'],
+        )
+        self.assertEqual(returncode, 0, stderr)
+
+        self.assertEqual(json.loads(stdout), {
+            'py36': ['py36-django21'],
+            'py37': ['py37-django21'],
+        })
+
+    def test_factor_matrix_ungrouped(self):
+        returncode, stdout, stderr = self.tox_call(
+            ['-e', 'py36-django20,lint', '--factor-matrix', 'py'],
+        )
+        self.assertEqual(returncode, 0, stderr)
+        self.assertEqual(json.loads(stdout), {'py36': ['py36-django20']})
+        self.assertIn(
+            "tox-factor: envs without a value for the 'py' axis are not in the "
+            'matrix: lint',
+            stderr,
+        )
+
+    def test_factor_matrix_with_toxenv(self):
+        # The matrix is written instead of running the given envs.
+        returncode, stdout, stderr = self.tox_call(
+            ['-e', 'py36-django20,py37-django21', '--factor-matrix', 'py'],
+        )
+        self.assertEqual(returncode, 0, stderr)
+        self.assertEqual(json.loads(stdout), {
+            'py36': ['py36-django20'],
+            'py37': ['py37-django21'],
+        })
+
+        with mock.patch.dict('os.environ', {'TOXENV': 'py37-django20'}):
+            returncode, stdout, stderr = self.tox_call(['--factor-matrix', 'py'])
+        self.assertEqual(returncode, 0, stderr)
+        self.assertEqual(json.loads(stdout), {'py37': ['py37-django20']})
+
+
+class ToxFactorInProcessIntegrationTests(ToxFactorIntegrationTests):
+    in_process = True
+
 
 class ToxParallelIntegrationTests(ToxTestCase):
     ini_contents = """
@@ -101,3 +248,69 @@ class ToxParallelIntegrationTests(ToxTestCase):
         self.assertEqual(returncode, 0, stderr)
         self.assertIn('lint: commands succeeded', stdout)
         self.assertIn('isort: commands succeeded', stdout)
+
+
+class ToxHistoryIntegrationTests(ToxTestCase):
+    ini_contents = """
+    [tox]
+    skipsdist = true
+
+    [testenv:lint]
+    commands = python -c "print('clean')"
+    """
+
+    def test_runtime_recorded(self):
+        cache_dir = os.path.join(self._temp_dir, '.tox', '.tox-factor')
+        history_path = history.get_history_path(cache_dir)
+
+        # Runtimes are only recorded with the option.
+        returncode, stdout, stderr = self.tox_call(['-f', 'lint'])
+        self.assertEqual(returncode, 0, stderr)
+        self.assertFalse(os.path.exists(history_path))
+
+        returncode, stdout, stderr = self.tox_call(
+            ['-f', 'lint', '--factor-order', 'longest'])
+        self.assertEqual(returncode, 0, stderr)
+
+        runtime_history = history.RuntimeHistory(history_path)
+        self.assertEqual(list(runtime_history.durations()), ['lint'])
+
+
+class ToxVerifiedIntegrationTests(ToxTestCase):
+    ini_contents = """
+    [tox]
+    skipsdist = true
+
+    [testenv:lint]
+    commands = python -c "print('clean')"
+
+    [testenv:fail]
+    commands = python -c "raise SystemExit(1)"
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super(ToxVerifiedIntegrationTests, cls).setUpClass()
+
+        for args in [['init', '-q'], ['add', 'tox.ini']]:
+            subprocess.check_call(['git'] + args, cwd=cls._temp_dir)
+
+    def test_skip_verified(self):
+        arguments = ['-f', 'lint,fail', '--factor-skip-verified']
+
+        returncode, stdout, stderr = self.tox_call(arguments)
+        self.assertEqual(returncode, 1, stderr)
+        self.assertIn('lint: commands succeeded', stdout)
+
+        returncode, stdout, stderr = self.tox_call(arguments)
+        self.assertEqual(returncode, 1, stderr)
+        self.assertNotIn('lint: commands succeeded', stdout)
+        self.assertIn('fail: commands failed', stdout)
+        self.assertIn('skipping 1 env(s) that passed with the same inputs: lint', stderr)
+
+        # Changing the sources invalidates the verified runs.
+        with open(os.path.join(self._temp_dir, 'app.py'), 'w') as source:
+            source.write('untracked')
+
+        returncode, stdout, stderr = self.tox_call(arguments)
+        self.assertIn('lint: commands succeeded', stdout)
@@ -0,0 +1,80 @@
+import json
+import mock
+from unittest import TestCase
+
+from tox_factor import listing
+from tox_factor.test import ToxTestCase
+
+
+class IterEnvRecordsTests(ToxTestCase):
+    ini_contents = """
+    [tox]
+    envlist =
+        py{36,37}-django{20,21}
+        py37-django20
+
+    [testenv:lint]
+    """
+
+    def test_records(self):
+        records = listing.iter_env_records(
+            self.config, ['py3*-django20', 'lint', '!py36'], ['py37-django20', 'lint'])
+
+        self.assertEqual(list(records), [{
+            'env': 'py36-django20',
+            'factors': ['py36', 'django20'],
+            'source': 'envlist',
+            'lineno': 3,
+            'matched': ['py3*-django20'],
+            'excluded': ['py36'],
+            'selected': False,
+        }, {
+            'env': 'py36-django21',
+            'factors': ['py36', 'django21'],
+            'source': 'envlist',
+            'lineno': 3,
+            'matched': [],
+            'excluded': ['py36'],
+            'selected': False,
+        }, {
+            'env': 'py37-django20',
+            'factors': ['py37', 'django20'],
+            'source': 'envlist',
+            'lineno': 3,
+            'matched': ['py3*-django20'],
+            'excluded': [],
+            'selected': True,
+        }, {
+            'env': 'py37-django21',
+            'factors': ['py37', 'django21'],
+            'source': 'envlist',
+            'lineno': 3,
+            'matched': [],
+            'excluded': [],
+            'selected': False,
+        }, {
+            'env': 'lint',
+            'factors': ['lint'],
+            'source': 'section',
+            'lineno': 7,
+            'matched': ['lint'],
+            'excluded': [],
+            'selected': True,
+        }])
+
+    def test_lazy(self):
+        records = listing.iter_env_records(self.config, [], [])
+
+        self.assertEqual(next(records)['env'], 'py36-django20')
+
+
+class WriteJsonLinesTests(TestCase):
+    def test_write(self):
+        stream = mock.Mock()
+        listing.write_json_lines(iter([{'env': 'lint'}, {'env': 'isort'}]), stream)
+
+        self.assertEqual(
+            [json.loads(call[0][0]) for call in stream.write.call_args_list],
+            [{'env': 'lint'}, {'env': 'isort'}],
+        )
+        stream.flush.assert_called_once_with()
@@ -0,0 +1,237 @@
+import itertools
+import unittest
+from collections import OrderedDict
+
+import tox
+
+from tox_factor import matrix
+from tox_factor.factor import EnvTemplate, env_matches
+from tox_factor.test import ToxTestCase
+
+
+class GetMatrixTests(ToxTestCase):
+    ini_contents = """
+    [tox]
+    envlist =
+        py{36,37}-django{20,21}-{redis,memcached}
+        py{37,38}-django30-{redis,memcached}
+        py37-django{31}-redis
+        lint
+
+    [testenv:docs]
+    [testenv:py38-coverage]
+    """
+
+    def test_axes(self):
+        self.assertEqual(matrix.get_matrix(self.config).axes, OrderedDict([
+            ('py', ('py36', 'py37', 'py38')),
+            ('django', ('django20', 'django21', 'django30', 'django31')),
+            ('axis2', ('redis', 'memcached')),
+        ]))
+
+    def test_rows(self):
+        env_matrix = matrix.get_matrix(self.config)
+
+        self.assertEqual(len(env_matrix), 16)
+        self.assertEqual(env_matrix.row('py37-django20-redis'), OrderedDict([
+            ('py', 'py37'), ('django', 'django20'), ('axis2', 'redis'),
+        ]))
+        self.assertEqual(env_matrix.row('py38-django30-memcached'), OrderedDict([
+            ('py', 'py38'), ('django', 'django30'), ('axis2', 'memcached'),
+        ]))
+        self.assertEqual(env_matrix.row('py38-coverage'), OrderedDict([('py', 'py38')]))
+        self.assertEqual(env_matrix.row('docs'), OrderedDict())
+
+    def test_job_matrix(self):
+        env_names = [
+            'py36-django20-redis', 'py38-coverage', 'py38-django30-redis', 'docs',
+        ]
+        groups = matrix.get_job_matrix(self.config, env_names, 'py')
+
+        self.assertEqual(groups, OrderedDict([
+            ('py36', ['py36-django20-redis']),
+            ('py38', ['py38-coverage', 'py38-django30-redis']),
+        ]))
+
+    def test_job_matrix_unknown_axis(self):
+        with self.assertRaises(tox.exception.ConfigError) as excinfo:
+            matrix.get_job_matrix(self.config, [], 'python')
+
+        self.assertEqual(
+            str(excinfo.exception),
+            "ConfigError: unknown factor axis 'python', "
+            'expected one of: py, django, axis2',
+        )
+
+
+class JobMatrixTests(ToxTestCase):
+    ini_contents = """
+    [tox]
+    envlist =
+        py{36,37}-django22
+        py38-django30
+        py3{8,9}-lint
+    """
+
+    def test_all_envs(self):
+        env_names = ['py36-django22', 'py37-django22', 'py38-django30', 'py39-lint']
+
+        groups = matrix.get_job_matrix(self.config, env_names, 'py')
+        self.assertEqual(groups, OrderedDict([
+            ('py36', ['py36-django22']),
+            ('py37', ['py37-django22']),
+            ('py38', ['py38-django30']),
+            ('py39', ['py39-lint']),
+        ]))
+
+        groups = matrix.get_job_matrix(self.config, env_names, 'django')
+        self.assertEqual(groups, OrderedDict([
+            ('django22', ['py36-django22', 'py37-django22']),
+            ('django30', ['py38-django30']),
+        ]))
+
+
+class InferAxesTests(unittest.TestCase):
+    def test_merged(self):
+        self.assertEqual(matrix.infer_axes([
+            EnvTemplate('py{36,37}-{redis,memcached}'),
+            EnvTemplate('py{37,38}-{redis,mysql}'),
+        ]), OrderedDict([
+            ('py', ['py36', 'py37', 'py38']),
+            ('axis1', ['redis', 'memcached', 'mysql']),
+        ]))
+
+    def test_positional_shapes(self):
+        # Positional axes are only merged across templates of the same shape.
+        self.assertEqual(matrix.infer_axes([
+            EnvTemplate('py{36,37}-{redis,memcached}'),
+            EnvTemplate('{mysql,postgres}-{fast,slow}'),
+            EnvTemplate('py37-{mysql}'),
+            EnvTemplate('{sqlite}-{fast,slow}'),
+        ]), OrderedDict([
+            ('py', ['py36', 'py37']),
+            ('axis1', ['redis', 'memcached', 'mysql']),
+            ('axis0', ['mysql', 'postgres', 'sqlite']),
+            ('axis1.1', ['fast', 'slow']),
+        ]))
+
+    def test_versioned_names(self):
+        # Slots are named without their version, and literal slots add their value.
+        self.assertEqual(matrix.infer_axes([
+            EnvTemplate('py{36,37}-django22'),
+            EnvTemplate('py38-django30'),
+            EnvTemplate('py3{8,9}-lint'),
+            EnvTemplate('docs'),
+        ]), OrderedDict([
+            ('py', ['py36', 'py37', 'py38', 'py39']),
+            ('django', ['django22', 'django30']),
+        ]))
+
+    def test_literal_before_group(self):
+        self.assertEqual(matrix.infer_axes([
+            EnvTemplate('py38-django30'),
+            EnvTemplate('py{36,37}-django{22}'),
+        ]), OrderedDict([
+            ('py', ['py38', 'py36', 'py37']),
+            ('django', ['django30', 'django22']),
+        ]))
+
+    def test_no_slots(self):
+        self.assertEqual(matrix.infer_axes([
+            EnvTemplate('py{36,37}{,-cov}'),
+            EnvTemplate('lint'),
+        ]), OrderedDict())
+
+    def test_max_axis_values(self):
+        axes = matrix.infer_axes([
+            EnvTemplate('a{1..255}-b{1..256}', extended=True),
+        ])
+
+        self.assertEqual([len(values) for values in axes.values()], [255, 256])
+        self.assertEqual(list(matrix.limit_axes(axes)), ['a'])
+
+
+class MaxAxisValuesTests(ToxTestCase):
+    ini_contents = """
+    [tox]
+    envlist = a{{{a_values}}}-b{{{b_values}}}
+    """.format(
+        a_values=','.join(map(str, range(255))),
+        b_values=','.join(map(str, range(256))),
+    )
+
+    def test_matrix(self):
+        self.assertEqual(list(matrix.get_matrix(self.config).axes), ['a'])
+
+    def test_job_matrix(self):
+        self.assertEqual(len(matrix.get_job_matrix(self.config, ['a0-b0'], 'a')), 1)
+
+        with self.assertRaises(tox.exception.ConfigError) as excinfo:
+            matrix.get_job_matrix(self.config, [], 'b')
+
+        self.assertEqual(
+            str(excinfo.exception),
+            "ConfigError: factor axis 'b' has 256 values, but at most 255 are supported",
+        )
+
+
+class FactorMatrixTests(unittest.TestCase):
+    axes = OrderedDict([
+        ('py', ['py27', 'py36', 'py37']),
+        ('django', ['django111', 'django20', 'django21']),
+        ('cache', ['redis', 'memcached']),
+    ])
+    env_names = [
+        '-'.join(parts) for parts in itertools.product(*axes.values())
+    ] + ['lint', 'py37-docs']
+
+    def setUp(self):
+        self.matrix = matrix.FactorMatrix(self.env_names, self.axes)
+
+    def brute_force(self, factors, exclude):
+        axes = [
+            [f for f in factors if f in values]
+            for values in self.axes.values()
+        ]
+
+        return [
+            name for name in self.env_names
+            if all(any(env_matches(name, f) for f in fs) for fs in axes if fs)
+            and not any(env_matches(name, f) for f in exclude)
+        ]
+
+    def test_columns(self):
+        column = self.matrix.columns['cache']
+
+        self.assertEqual(list(column[:4]) + list(column[-2:]), [1, 2, 1, 2, 0, 0])
+
+    def test_select(self):
+        queries = [
+            ([], []),
+            (['py37'], ['redis']),
+            (['py36', 'py37', 'redis'], []),
+            (['django20', 'django21'], ['py27', 'memcached']),
+            ([], ['py37']),
+        ]
+
+        for factors, exclude in queries:
+            self.assertEqual(
+                self.matrix.select(factors, exclude),
+                self.brute_force(factors, exclude),
+            )
+
+    def test_group_by(self):
+        self.assertEqual(self.matrix.group_by('django', ['py37', 'redis']), OrderedDict([
+            ('django111', ['py37-django111-redis']),
+            ('django20', ['py37-django20-redis']),
+            ('django21', ['py37-django21-redis']),
+        ]))
+
+    def test_unknown_factor(self):
+        with self.assertRaises(ValueError):
+            self.matrix.select(['py38'])
+
+    def test_empty(self):
+        env_matrix = matrix.FactorMatrix([], self.axes)
+
+        self.assertEqual(env_matrix.select(['py37']), [])
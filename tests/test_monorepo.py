@@ -0,0 +1,82 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from tox_factor import monorepo
+
+
+class MonorepoTestCase(unittest.TestCase):
+    files = {
+        'api/tox.ini': '[tox]\nenvlist = py{36,37}-django{20,21}\n',
+        'cli/setup.cfg': '[metadata]\nname = cli\n\n[tox:tox]\nenvlist = py{36,37}\n',
+        'docs/setup.cfg': '[metadata]\nname = docs\n',
+        'lib/tox.ini': '[tox]\nenvlist = py37\n',
+        'lib/setup.cfg': '[tox:tox]\nenvlist = py36\n',
+        'web/tox.ini': '[tox]\nenvlist = py37\n[tox]\n',
+        '.tox/tox.ini': '[tox]\nenvlist = py37\n',
+    }
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+        for name, contents in self.files.items():
+            path = os.path.join(self.root, name)
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+
+            with open(path, 'w') as config_file:
+                config_file.write(contents)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def path(self, name):
+        return os.path.join(self.root, name)
+
+
+class FindConfigsTests(MonorepoTestCase):
+    def test_result(self):
+        self.assertEqual(monorepo.find_configs(self.root), [
+            self.path('api/tox.ini'),
+            self.path('cli/setup.cfg'),
+            self.path('lib/tox.ini'),
+            self.path('web/tox.ini'),
+        ])
+
+
+class ResolveConfigsTests(MonorepoTestCase):
+    def expected(self):
+        return [
+            (self.path('api/tox.ini'), ['py37-django20', 'py37-django21']),
+            (self.path('cli/setup.cfg'), ['py37']),
+            (self.path('lib/tox.ini'), ['py37']),
+        ]
+
+    def test_in_process(self):
+        configs = monorepo.find_configs(self.root)[:3]
+        results = monorepo.resolve_configs(configs, ['py37'], processes=1)
+
+        self.assertEqual(
+            [(path, result['envs']) for path, result in results.items()],
+            self.expected(),
+        )
+
+    def test_pool(self):
+        configs = monorepo.find_configs(self.root)[:3]
+        results = monorepo.resolve_configs(configs, ['py37'], processes=2)
+
+        self.assertEqual(
+            [(path, result['envs']) for path, result in results.items()],
+            self.expected(),
+        )
+
+    def test_error(self):
+        results = monorepo.resolve_configs([self.path('web/tox.ini')], ['py37'])
+
+        self.assertIn('duplicate section', results[self.path('web/tox.ini')]['error'])
+
+    def test_cache(self):
+        monorepo.resolve_configs([self.path('api/tox.ini')], ['py37'])
+
+        self.assertTrue(os.listdir(self.path('api/.tox/.tox-factor')))
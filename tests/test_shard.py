@@ -0,0 +1,109 @@
+import argparse
+import json
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+import tox
+
+from tox_factor import shard
+
+
+class ParseShardTests(TestCase):
+    def test_valid(self):
+        self.assertEqual(shard.parse_shard('1/1'), (1, 1))
+        self.assertEqual(shard.parse_shard('2/3'), (2, 3))
+
+    def test_invalid(self):
+        for spec in ['', '1', '0/2', '3/2', 'a/b', '1/2/3']:
+            with self.assertRaises(argparse.ArgumentTypeError):
+                shard.parse_shard(spec)
+
+
+class LoadDurationsTests(TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, 'durations.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_load(self):
+        with open(self.path, 'w') as durations_file:
+            json.dump({'py37': 1.5}, durations_file)
+
+        self.assertEqual(shard.load_durations(self.path), {'py37': 1.5})
+
+    def assertInvalid(self, contents, message):
+        with open(self.path, 'w') as durations_file:
+            durations_file.write(contents)
+
+        with self.assertRaises(tox.exception.ConfigError) as excinfo:
+            shard.load_durations(self.path)
+
+        self.assertIn(message, str(excinfo.exception))
+
+    def test_missing(self):
+        with self.assertRaises(tox.exception.ConfigError) as excinfo:
+            shard.load_durations(os.path.join(self.temp_dir, 'missing.json'))
+
+        self.assertIn('could not load the durations', str(excinfo.exception))
+
+    def test_invalid_json(self):
+        self.assertInvalid('{"py37": ', 'could not load the durations')
+
+    def test_not_an_object(self):
+        self.assertInvalid('[]', 'to be a JSON object, got list')
+
+    def test_invalid_durations(self):
+        for duration in ['"1.5"', 'null', 'true', '-1']:
+            self.assertInvalid(
+                '{"py36": 1, "py37": %s}' % duration,
+                "expected the duration of 'py37'",
+            )
+
+
+class AssignShardsTests(TestCase):
+    envs = ['py{v}-django{d}'.format(v=v, d=d) for v in range(35, 39) for d in range(5)]
+
+    def test_exactly_one_shard(self):
+        for count in range(1, 6):
+            shards = [
+                shard.select_shard(self.envs, i, count) for i in range(1, count + 1)
+            ]
+
+            self.assertEqual(sorted(sum(shards, [])), sorted(self.envs))
+
+    def test_balanced_by_count(self):
+        sizes = [len(shard.select_shard(self.envs, i, 3)) for i in range(1, 4)]
+
+        self.assertEqual(sizes, [7, 7, 6])
+
+    def test_stable(self):
+        self.assertEqual(
+            shard.assign_shards(self.envs, 3),
+            shard.assign_shards(list(reversed(self.envs)), 3),
+        )
+
+    def test_order(self):
+        envs = shard.select_shard(self.envs, 1, 3)
+
+        self.assertEqual(envs, [env for env in self.envs if env in envs])
+
+    def test_balanced_by_duration(self):
+        durations = {'a': 10, 'b': 6, 'c': 5, 'd': 4, 'e': 1}
+
+        self.assertEqual(
+            shard.assign_shards(['a', 'b', 'c', 'd', 'e'], 2, durations),
+            {'a': 1, 'b': 2, 'c': 2, 'd': 1, 'e': 2},
+        )
+
+    def test_unknown_durations(self):
+        # Unknown durations are weighted with the mean (4.0) of the known ones.
+        durations = {'a': 7, 'b': 1}
+
+        self.assertEqual(
+            shard.assign_shards(['a', 'b', 'c', 'd'], 2, durations),
+            {'a': 1, 'c': 2, 'd': 2, 'b': 1},
+        )
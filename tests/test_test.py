@@ -42,6 +42,58 @@ class ToxTestCaseTests(unittest.TestCase):
         # by default, tox does not list testenvs not present in `envlist`.
         self.assertEqual(envlist, ['py27', 'py37'])
 
+    def test_tox_envlist_in_process(self):
+        class Dummy(ToxTestCase):
+            ini_contents = """
+            [tox]
+            envlist = py27,py37
+
+            [testenv:lint]
+            """
+
+            in_process = True
+
+            def runTest(self):
+                # fixes a Python 2 compatibility issue when instantiating a
+                # test case outside of a test suite
+                pass
+
+        testcase = Dummy()
+
+        try:
+            testcase.setUpClass()
+            envlist = testcase.tox_envlist()
+            factor_envlist = testcase.tox_envlist(['-f', 'py37,lint'])
+        finally:
+            testcase.tearDownClass()
+
+        self.assertEqual(envlist, ['py27', 'py37'])
+        self.assertEqual(factor_envlist, ['py37', 'lint'])
+
+    def test_tox_envlist_without_workers(self):
+        class Dummy(ToxTestCase):
+            ini_contents = """
+            [tox]
+            envlist = py27,py37
+            """
+
+            use_workers = False
+
+            def runTest(self):
+                # fixes a Python 2 compatibility issue when instantiating a
+                # test case outside of a test suite
+                pass
+
+        testcase = Dummy()
+
+        try:
+            testcase.setUpClass()
+            envlist = testcase.tox_envlist(['-f', 'py37'])
+        finally:
+            testcase.tearDownClass()
+
+        self.assertEqual(envlist, ['py37'])
+
     def test_tox_call(self):
         class Dummy(ToxTestCase):
             ini_contents = """
@@ -0,0 +1,58 @@
+import json
+from unittest import TestCase
+
+from tox_factor import timing
+
+
+class TimerTests(TestCase):
+    def test_time(self):
+        timer = timing.Timer()
+
+        with timer.time('a'):
+            pass
+        with timer.time('a'):
+            pass
+
+        self.assertEqual(list(timer.timings), ['a'])
+        self.assertGreaterEqual(timer.timings['a'], 0)
+
+    def test_text_report(self):
+        timer = timing.Timer()
+        timer.timings['match_envs'] = 0.0015
+        timer.count('matched_envs', 3)
+
+        self.assertEqual(
+            timer.report('text'),
+            'tox-factor timing:\n'
+            '  match_envs    1.500ms\n'
+            '  matched_envs  3\n',
+        )
+
+    def test_json_report(self):
+        timer = timing.Timer()
+        timer.timings['match_envs'] = 0.0015
+        timer.count('matched_envs', 3)
+
+        self.assertEqual(json.loads(timer.report('json')), {
+            'timings': {'match_envs': 0.0015},
+            'counts': {'matched_envs': 3},
+        })
+
+
+class ProfileTests(TestCase):
+    def test_disabled(self):
+        with timing.profile(enabled=False) as timer:
+            with timing.timed('a'):
+                timing.record('b', 1)
+
+        self.assertIsNone(timer)
+        self.assertIsNone(timing.active_timer)
+
+    def test_enabled(self):
+        with timing.profile() as timer:
+            with timing.timed('a'):
+                timing.record('b', 1)
+
+        self.assertEqual(list(timer.timings), ['a'])
+        self.assertEqual(timer.counts, {'b': 1})
+        self.assertIsNone(timing.active_timer)
@@ -0,0 +1,206 @@
+import mock
+import os
+import shutil
+import subprocess
+import tempfile
+from unittest import TestCase
+
+from tox_factor import verified
+from tox_factor.test import ToxTestCase
+
+
+class GetSourceDigestTests(TestCase):
+    def setUp(self):
+        self.repo = tempfile.mkdtemp()
+        self.git('init', '-q')
+        self.write('.gitignore', 'build/\n')
+        self.write('setup.py')
+        self.write('src/app.py')
+        self.git('add', '.')
+        self.git('commit', '-q', '-m', 'initial')
+
+        self.addCleanup(verified.source_digests.clear)
+
+    def tearDown(self):
+        shutil.rmtree(self.repo)
+
+    def git(self, *args):
+        subprocess.check_call(
+            ['git', '-c', 'user.name=test', '-c', 'user.email=test@example.com'] +
+            list(args), cwd=self.repo)
+
+    def write(self, path, contents=''):
+        path = os.path.join(self.repo, path)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as f:
+            f.write(contents)
+
+    def digest(self, exclude=None):
+        verified.source_digests.clear()
+
+        return verified.get_source_digest(self.repo, exclude)
+
+    def test_unchanged(self):
+        digest = self.digest()
+        self.write('build/app.py', 'ignored')
+        self.write('.tox/log.txt', 'excluded')
+
+        self.assertEqual(self.digest('.tox'), digest)
+
+    def test_staged(self):
+        # Staging a change doesn't change the digest of the sources.
+        self.write('src/app.py', 'modified')
+        digest = self.digest()
+        self.git('add', 'src/app.py')
+
+        self.assertEqual(self.digest(), digest)
+
+    def test_changes(self):
+        digests = [self.digest()]
+
+        self.write('src/app.py', 'modified')
+        digests.append(self.digest())
+
+        self.write('src/new.py', 'untracked')
+        digests.append(self.digest())
+
+        os.remove(os.path.join(self.repo, 'setup.py'))
+        digests.append(self.digest())
+
+        self.assertEqual(len(set(digests)), 4)
+
+    def test_memoized(self):
+        digest = verified.get_source_digest(self.repo)
+        self.write('src/app.py', 'modified')
+
+        self.assertEqual(verified.get_source_digest(self.repo), digest)
+
+    def test_not_memoized(self):
+        digest = verified.get_source_digest(self.repo)
+        self.write('src/app.py', 'modified')
+
+        changed = verified.get_source_digest(self.repo, memoized=False)
+        self.assertNotEqual(changed, digest)
+        self.assertEqual(verified.get_source_digest(self.repo), changed)
+
+    def test_not_a_repository(self):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+
+        self.assertIsNone(verified.get_source_digest(temp_dir))
+
+
+class GetEnvFingerprintTests(ToxTestCase):
+    ini_contents = """
+    [tox]
+    envlist = py37-{unit,lint}
+
+    [testenv]
+    setenv =
+        DJANGO_SETTINGS_MODULE = settings
+    commands =
+        unit: pytest
+        lint: flake8
+    """
+
+    def fingerprint(self, env_name, source_digest='sources', arguments=None):
+        config = self.tox_config(arguments)
+
+        return verified.get_env_fingerprint(config.envconfigs[env_name], source_digest)
+
+    def test_stable(self):
+        # The random PYTHONHASHSEED of each run is ignored.
+        self.assertEqual(self.fingerprint('py37-unit'), self.fingerprint('py37-unit'))
+
+    def test_env_config(self):
+        self.assertNotEqual(self.fingerprint('py37-unit'), self.fingerprint('py37-lint'))
+
+    def test_sources(self):
+        self.assertNotEqual(
+            self.fingerprint('py37-unit', 'before'),
+            self.fingerprint('py37-unit', 'after'),
+        )
+
+
+class VerifiedRunsTests(TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.runs = verified.VerifiedRuns(verified.get_verified_path(self.cache_dir))
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_empty(self):
+        self.assertEqual(self.runs.fingerprints(), {})
+
+        self.runs.forget('lint')
+        self.assertFalse(os.path.exists(self.runs.path))
+
+    def test_record(self):
+        self.runs.record('lint', 'a')
+        self.runs.record('py37', 'b')
+        self.runs.record('lint', 'c')
+
+        self.assertEqual(self.runs.fingerprints(), {'lint': 'c', 'py37': 'b'})
+
+    def test_forget(self):
+        self.runs.record('lint', 'a')
+        self.runs.record('py37', 'b')
+        self.runs.forget('lint')
+
+        self.assertEqual(self.runs.fingerprints(), {'py37': 'b'})
+
+
+class VerifiedRecorderTests(TestCase):
+    def setUp(self):
+        self.recorder = verified.VerifiedRecorder()
+        self.runs = mock.Mock()
+
+    @mock.patch('tox_factor.verified.get_fingerprints')
+    def test_passed(self, get_fingerprints):
+        get_fingerprints.return_value = {'lint': 'a'}
+
+        self.recorder.start(mock.Mock(), 'lint')
+        self.recorder.stop('lint', True, self.runs)
+
+        self.runs.record.assert_called_once_with('lint', 'a')
+
+    @mock.patch('tox_factor.verified.get_source_digest')
+    def test_sources_hashed_per_env(self, get_source_digest):
+        # Earlier envs of a sequential run may have changed the sources.
+        config = mock.Mock(toxinidir='/project', toxworkdir='/project/.tox')
+        config.envconfigs = {}
+
+        self.recorder.start(config, 'lint')
+
+        get_source_digest.assert_called_once_with(
+            '/project', exclude='.tox', memoized=False)
+
+    def test_failed(self):
+        # Failed runs are forgotten, even if they weren't started.
+        self.recorder.stop('lint', False, self.runs)
+
+        self.runs.forget.assert_called_once_with('lint')
+        self.runs.record.assert_not_called()
+
+    @mock.patch('tox_factor.verified.get_fingerprints')
+    def test_not_fingerprinted(self, get_fingerprints):
+        get_fingerprints.return_value = None
+
+        self.recorder.start(mock.Mock(), 'lint')
+        self.recorder.stop('lint', True, self.runs)
+
+        self.runs.record.assert_not_called()
+
+
+class SplitVerifiedTests(TestCase):
+    def test_result(self):
+        self.assertEqual(
+            verified.split_verified(
+                ['py36', 'py37', 'py38', 'lint'],
+                {'py36': 'a', 'py37': 'b', 'py38': 'c'},
+                {'py36': 'a', 'py37': 'x', 'lint': None},
+            ),
+            (['py37', 'py38', 'lint'], ['py36']),
+        )
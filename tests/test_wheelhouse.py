@@ -0,0 +1,205 @@
+import errno
+import mock
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+import tox
+from tox.config import DepConfig, IndexServerConfig
+
+from tox_factor import wheelhouse
+
+
+def make_envconfig(deps, basepython='python3.7', pip_pre=False, toxinidir='.'):
+    envconfig = mock.Mock(recreate=False)
+    envconfig.deps = [DepConfig(dep) for dep in deps]
+    envconfig.basepython = basepython
+    envconfig.pip_pre = pip_pre
+    envconfig.config.toxinidir = toxinidir
+    envconfig.config.indexserver = {'default': IndexServerConfig('default')}
+
+    return envconfig
+
+
+class GetInstallFingerprintTests(TestCase):
+    def test_no_deps(self):
+        self.assertIsNone(wheelhouse.get_install_fingerprint(make_envconfig([])))
+
+    def test_custom_indexserver(self):
+        envconfig = make_envconfig(['six==1.12.0'])
+        envconfig.deps.append(DepConfig('django==2.2', IndexServerConfig('dev', 'url')))
+
+        self.assertIsNone(wheelhouse.get_install_fingerprint(envconfig))
+
+    def test_identical(self):
+        deps = ['six==1.12.0', 'mock==3.0.5']
+
+        self.assertEqual(
+            wheelhouse.get_install_fingerprint(make_envconfig(deps)),
+            wheelhouse.get_install_fingerprint(make_envconfig(list(reversed(deps)))),
+        )
+
+    def test_not_pinned(self):
+        # Wheels of unpinned, local, or VCS dependencies could become stale.
+        for deps in [
+            ['six==1.12.0', 'mock'],
+            ['six==1.12.0', 'mock>=3'],
+            ['six==1.*'],
+            ['six==1.12.0', '../lib'],
+            ['-e../lib'],
+            ['git+https://github.com/benjaminp/six@master'],
+            ['six @ https://example.com/six-1.12.0.tar.gz'],
+        ]:
+            self.assertIsNone(wheelhouse.get_install_fingerprint(make_envconfig(deps)))
+
+    def test_different(self):
+        fingerprint = wheelhouse.get_install_fingerprint(make_envconfig(['six==1.12.0']))
+
+        for envconfig in [
+            make_envconfig(['six==1.12.0', 'mock==3.0.5']),
+            make_envconfig(['six==1.12.0'], basepython='python3.6'),
+            make_envconfig(['six==1.12.0'], pip_pre=True),
+        ]:
+            self.assertNotEqual(
+                wheelhouse.get_install_fingerprint(envconfig), fingerprint)
+
+    def test_requirements_file(self):
+        temp_dir = tempfile.mkdtemp()
+        path = os.path.join(temp_dir, 'requirements.txt')
+        envconfig = make_envconfig(['-rrequirements.txt'], toxinidir=temp_dir)
+
+        try:
+            self.assertIsNone(wheelhouse.get_install_fingerprint(envconfig))
+
+            with open(path, 'w') as requirements_file:
+                requirements_file.write('six==1.12.0  # comment\n')
+            fingerprint = wheelhouse.get_install_fingerprint(envconfig)
+
+            with open(path, 'w') as requirements_file:
+                requirements_file.write('mock==3.0.5\n')
+            self.assertNotEqual(
+                wheelhouse.get_install_fingerprint(envconfig), fingerprint)
+
+            with open(path, 'w') as requirements_file:
+                requirements_file.write('six==1.12.0\n-e ../lib\n')
+            self.assertIsNone(wheelhouse.get_install_fingerprint(envconfig))
+        finally:
+            shutil.rmtree(temp_dir)
+
+
+class IsPinnedTests(TestCase):
+    def test_pinned(self):
+        for requirement in ['six==1.12', 'six===1.12', 'six[x]==1.12; os_name=="nt"']:
+            self.assertTrue(wheelhouse.is_pinned(requirement))
+
+    def test_not_pinned(self):
+        for requirement in ['six', 'six>=1', 'six==1.*', 'six==1,!=1.1', '-rreqs.txt']:
+            self.assertFalse(wheelhouse.is_pinned(requirement))
+
+
+class GroupEnvsTests(TestCase):
+    def test_groups(self):
+        config = mock.Mock()
+        config.envconfigs = {
+            'py37-a': make_envconfig(['six==1.12.0']),
+            'py37-b': make_envconfig(['six==1.12.0']),
+            'py36-a': make_envconfig(['six==1.12.0'], basepython='python3.6'),
+            'lint': make_envconfig([]),
+        }
+
+        groups = wheelhouse.group_envs(config, ['py37-a', 'py36-a', 'lint', 'py37-b'])
+
+        self.assertEqual(list(groups.values()), [['py37-a', 'py37-b'], ['py36-a']])
+
+
+class InstallDepsTests(TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+
+        patcher = mock.patch.dict('os.environ', {wheelhouse.RUN_ID_ENV: 'run'})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.venv = mock.Mock()
+        self.venv.envconfig = make_envconfig(['six==1.12.0'])
+        self.venv.get_resolved_dependencies.return_value = self.venv.envconfig.deps
+        self.venv._installopts.return_value = []
+
+        fingerprint = wheelhouse.get_install_fingerprint(self.venv.envconfig)
+        self.wheelhouse_dir = wheelhouse.get_wheelhouse_dir(self.cache_dir, fingerprint)
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_unsupported(self):
+        self.venv.envconfig = make_envconfig([])
+        action = mock.Mock()
+
+        self.assertIsNone(wheelhouse.install_deps(self.venv, action, self.cache_dir))
+        action.popen.assert_not_called()
+
+    def test_built_once(self):
+        action = mock.Mock()
+
+        self.assertTrue(wheelhouse.install_deps(self.venv, action, self.cache_dir))
+        self.assertTrue(wheelhouse.install_deps(self.venv, action, self.cache_dir))
+
+        action.popen.assert_called_once_with(
+            [mock.ANY, '-m', 'pip', 'wheel', '-w', self.wheelhouse_dir, 'six==1.12.0'],
+            cwd='.',
+        )
+        self.venv._install.assert_called_with(
+            self.venv.envconfig.deps,
+            extraopts=['--no-index', '--find-links', self.wheelhouse_dir],
+            action=action,
+        )
+
+    def test_created_concurrently(self):
+        # Another env of a parallel run creates the wheelhouse dir first.
+        makedirs = os.makedirs
+
+        def create_concurrently(path, **kwargs):
+            makedirs(path, **kwargs)
+            if not kwargs.get('exist_ok'):
+                raise OSError(errno.EEXIST, 'File exists', path)
+
+        action = mock.Mock()
+        with mock.patch('os.makedirs', side_effect=create_concurrently):
+            self.assertTrue(wheelhouse.install_deps(self.venv, action, self.cache_dir))
+
+    def test_build_failure(self):
+        action = mock.Mock()
+        action.popen.side_effect = tox.exception.InvocationError('pip wheel')
+
+        self.assertIsNone(wheelhouse.install_deps(self.venv, action, self.cache_dir))
+        self.assertIsNone(wheelhouse.install_deps(self.venv, action, self.cache_dir))
+
+        action.popen.assert_called_once()
+        self.venv._install.assert_not_called()
+
+        # A failed build is retried by the next run.
+        action.popen.side_effect = None
+        with mock.patch.dict('os.environ', {wheelhouse.RUN_ID_ENV: 'next'}):
+            self.assertTrue(wheelhouse.install_deps(self.venv, action, self.cache_dir))
+
+        self.assertEqual(action.popen.call_count, 2)
+
+    def test_recreate(self):
+        action = mock.Mock()
+        wheel = os.path.join(self.wheelhouse_dir, 'six-1.12.0-py2.py3-none-any.whl')
+
+        self.assertTrue(wheelhouse.install_deps(self.venv, action, self.cache_dir))
+        open(wheel, 'w').close()
+
+        # Complete wheelhouses are reused by later runs, unless recreating.
+        with mock.patch.dict('os.environ', {wheelhouse.RUN_ID_ENV: 'next'}):
+            self.assertTrue(wheelhouse.install_deps(self.venv, action, self.cache_dir))
+            self.assertEqual(action.popen.call_count, 1)
+
+            self.venv.envconfig.recreate = True
+            self.assertTrue(wheelhouse.install_deps(self.venv, action, self.cache_dir))
+            self.assertTrue(wheelhouse.install_deps(self.venv, action, self.cache_dir))
+            self.assertEqual(action.popen.call_count, 2)
+
+        self.assertFalse(os.path.exists(wheel))
@@ -0,0 +1,68 @@
+import os
+import threading
+import unittest
+
+from tox_factor import worker
+from tox_factor.test import ToxTestCase
+
+
+@unittest.skipUnless(worker.FORK_AVAILABLE, 'requires os.fork')
+class WorkerPoolTests(ToxTestCase):
+    ini_contents = """
+    [tox]
+    envlist = py{36,37}-django{20,21}
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super(WorkerPoolTests, cls).setUpClass()
+        cls.pool = worker.WorkerPool()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.pool.close()
+        super(WorkerPoolTests, cls).tearDownClass()
+
+    def call(self, arguments, **env):
+        environ = os.environ.copy()
+        environ.update(env)
+
+        return self.pool.call(['-c', self.ini_filepath] + arguments, environ)
+
+    def test_call(self):
+        returncode, stdout, stderr = self.call(['-l', '-f', 'py37'])
+
+        self.assertEqual(returncode, 0, stderr)
+        self.assertEqual(stdout.splitlines(), ['py37-django20', 'py37-django21'])
+
+    def test_environment_isolation(self):
+        _, with_envvar, _ = self.call(['-l'], TOXFACTOR='django20')
+        _, without_envvar, _ = self.call(['-l'])
+
+        self.assertEqual(with_envvar.splitlines(), ['py36-django20', 'py37-django20'])
+        self.assertEqual(len(without_envvar.splitlines()), 4)
+
+    def test_returncode(self):
+        returncode, stdout, stderr = self.call(['--factor-shard', '3/2'])
+
+        self.assertEqual(returncode, 2)
+        self.assertIn('invalid shard', stderr)
+
+    def test_concurrent_calls(self):
+        results = {}
+
+        def call(factor):
+            results[factor] = self.call(['-l', '-f', factor])[1].splitlines()
+
+        threads = [
+            threading.Thread(target=call, args=(factor, ))
+            for factor in ['py36', 'py37', 'django20', 'django21']
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results['py36'], ['py36-django20', 'py36-django21'])
+        self.assertEqual(results['django21'], ['py36-django21', 'py37-django21'])
+        self.assertGreaterEqual(len(self.pool.workers), 2)